@@ -0,0 +1,281 @@
+"""
+Benchmarks for the hot paths of make_gpx, multipart_decoder and shift_purple_pen. Everything runs locally on
+synthetic inputs, without network access.
+
+    python benchmark.py                    # run and compare against benchmark_baseline.json
+    python benchmark.py --save-baseline    # run and store the results as the new baseline
+    python benchmark.py --quick            # fewer and smaller cases, for a fast check
+
+Each case reports the best time over repeated runs, a throughput and the peak memory allocated while running
+it once under tracemalloc. A case is a regression if its time is more than ``--tolerance`` slower than the
+baseline, and the exit status is then 1.
+
+The import time of the router, which every cold start pays, and of each tool module, which the first request to
+the tool pays, is also measured in fresh interpreters with ``-X importtime`` and must stay within
+``IMPORT_TIME_BUDGETS``, which are relative to the time a bare interpreter takes to start, or the exit status is 1.
+The same check runs in the tests.
+"""
+from __future__ import annotations
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import make_gpx
+import shift_purple_pen
+from multipart_decoder import MultipartDecoder, StreamingMultipartDecoder
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+START_TIME = datetime.datetime(2020, 1, 1, 12, 0, 0)
+
+# The DrongO shape needs more trackpoints than it has vertices, so the shortest track it can be drawn in, at one
+# point per second, is about nine minutes. The API accepts durations from 10 seconds, but anything shorter than that
+# is rejected for having too few points, whatever the interval. The shortest case is the smallest request that is
+# drawn, where the time spent on each request rather than each point matters most.
+SHORTEST_GPX_DURATION = make_gpx.get_shape_geometry().min_points
+GPX_DURATIONS = [SHORTEST_GPX_DURATION, 600, 3600, 6 * 3600, 24 * 3600, 48 * 3600]
+MULTIPART_SIZES = [10 * 1024, 100 * 1024, 1024 * 1024, 8 * 1024 * 1024]
+PPEN_CONTROLS = [100, 1000, 5000]
+# Big enough for tens of thousands of locations, as on course maps with many special objects
+PPEN_REWRITE_CONTROLS = 20000
+
+# Most that importing the Lambda's router, and each tool module it imports on the first request for it, may take,
+# including compiling it, as the deployment package holds no bytecode, and every module it imports which the
+# interpreter has not already loaded at start up. Budgets are multiples of the time a bare interpreter takes to
+# start on the same machine, so that they hold on slower machines too.
+IMPORT_TIME_BUDGETS = {"router": 2.5, "make_gpx": 4, "shift_purple_pen": 4.5}
+IMPORT_TIME_RUNS = 5
+
+
+def measure(fn, repeats: int, min_total_seconds: float = 0.2):
+    """
+    Peak traced memory of one run of ``fn``, which also warms up any lazily loaded state, and the best wall-clock
+    time over at least ``repeats`` further runs, repeating fast cases until ``min_total_seconds`` have been spent
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    times = []
+    while len(times) < repeats or sum(times) < min_total_seconds:
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return min(times), peak
+
+
+def make_multipart_body(size: int):
+    boundary = "----BenchmarkBoundary7MA4YWxkTrZu0gW"
+    file_content = ("<location x=\"1.000000\" y=\"2.000000\" />\r\n" * (size // 40 + 1))[:size]
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"controlcode\"\r\n\r\n31\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"originalfile\"; filename=\"a.ppen\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n{file_content}\r\n"
+        f"--{boundary}--\r\n"
+    )
+    return body.encode('utf8'), f"multipart/form-data; boundary={boundary}"
+
+
+def make_ppen(num_controls: int, x_shift: float = 0.0, y_shift: float = 0.0) -> str:
+    """A synthetic PurplePen event with ``num_controls`` controls, one course using them all and some text"""
+    lines = ['<course-scribe-event>',
+             '  <event id="1">',
+             '    <title>Benchmark</title>',
+             f'    <print-area automatic="false" restrict-to-page-size="true" left="{-74.15886 + x_shift:.6f}" '
+             f'top="{195.8901 + y_shift:.6f}" right="{127.771149 + x_shift:.6f}" bottom="{-92.9079 + y_shift:.6f}" '
+             f'page-width="827" page-height="1169" page-margins="16" page-landscape="false" />',
+             '  </event>']
+    for i in range(num_controls):
+        x = (i * 7.31) % 200 - 100 + x_shift
+        y = (i * 3.17) % 280 - 90 + y_shift
+        lines += [f'  <control id="{i + 1}" kind="normal">',
+                  f'    <code>{i + 31}</code>',
+                  f'    <location x="{x:.6f}" y="{y:.6f}" />',
+                  '    <description box="D" iof-2004-ref="5.2" />',
+                  '  </control>']
+    for i in range(num_controls):
+        lines += [f'  <course-control id="{i + 1}" control="{i + 1}">',
+                  f'    <next course-control="{i + 2}" />' if i + 1 < num_controls else '',
+                  '  </course-control>']
+    for i in range(num_controls // 10):
+        lines += [f'  <special-object id="{i + 1}" kind="text">',
+                  '    <text>$(CourseName)</text>',
+                  f'    <location x="{i + x_shift:.6f}" y="{i + y_shift:.6f}" />',
+                  f'    <location x="{i + 50 + x_shift:.6f}" y="{i - 20 + y_shift:.6f}" />',
+                  '  </special-object>']
+    lines.append('</course-scribe-event>')
+    return '\n'.join(lines)
+
+
+def benchmark_cases(quick: bool):
+    """Yield ``(name, fn, work, unit, repeats)`` for each benchmark case"""
+    durations = GPX_DURATIONS[:3] if quick else GPX_DURATIONS
+    for seconds in durations:
+        duration = datetime.timedelta(seconds=seconds)
+        # As on a cold Lambda, with nothing cached from the previous run
+        yield (f"make_gpx/{seconds}s",
+               lambda d=duration: (make_gpx.RESAMPLED_XY_CACHE.clear(),
+                                   make_gpx.make_gpx(10000, START_TIME, d, 51.2, -1.3)),
+               seconds, "points", 1 if seconds > 3600 else 5)
+
+    backends = ["python"] if make_gpx.np is None else ["python", "numpy"]
+    geometry = make_gpx.get_shape_geometry()
+    for backend in backends:
+        for seconds in durations:
+            duration = datetime.timedelta(seconds=seconds)
+            yield (f"calculate_coordinates[{backend}]/{seconds}s",
+                   lambda d=duration, b=backend: make_gpx.calculate_coordinates(10000, geometry, 51.2, -1.3, d,
+                                                                                backend=b, cache=False),
+                   seconds, "points", 3 if seconds > 3600 else 10)
+            # The same length and duration as a previous request, so only the anchoring is done
+            yield (f"calculate_coordinates[{backend},cached]/{seconds}s",
+                   lambda d=duration, b=backend: make_gpx.calculate_coordinates(10000, geometry, 51.2, -1.3, d,
+                                                                                backend=b),
+                   seconds, "points", 3 if seconds > 3600 else 10)
+
+    for size in (MULTIPART_SIZES[:2] if quick else MULTIPART_SIZES):
+        body, content_type = make_multipart_body(size)
+        yield (f"MultipartDecoder/{size // 1024}KiB",
+               lambda b=body, c=content_type: MultipartDecoder(b, c),
+               len(body) / 1e6, "MB", 10)
+        yield (f"StreamingMultipartDecoder/{size // 1024}KiB",
+               lambda b=body, c=content_type: StreamingMultipartDecoder(b, c).get_fields(('controlcode',
+                                                                                          'originalfile')),
+               len(body) / 1e6, "MB", 10)
+
+    for num_controls in (PPEN_CONTROLS[:1] if quick else PPEN_CONTROLS):
+        original = make_ppen(num_controls)
+        shifted = make_ppen(num_controls, 1.234567, -7.654321)
+        yield (f"shift_ppen_from_files/{num_controls}controls",
+               lambda o=original, s=shifted: shift_purple_pen.shift_ppen_from_files(o, s, '31'),
+               len(original) / 1e6, "MB", 5)
+
+    # The quick case is also in a full run, so that a baseline saved from a full run covers it
+    for num_controls in (PPEN_CONTROLS[:1] if quick else [PPEN_CONTROLS[0], PPEN_REWRITE_CONTROLS]):
+        original = make_ppen(num_controls)
+        yield (f"shift_ppen/{original.count('<location ')}locations",
+               lambda o=original: shift_purple_pen.shift_ppen(o, 1.234567, -7.654321),
+               len(original) / 1e6, "MB", 5)
+
+
+def run(quick: bool):
+    results = {}
+    for name, fn, work, unit, repeats in benchmark_cases(quick):
+        seconds, peak = measure(fn, repeats)
+        results[name] = {
+            "seconds": seconds,
+            "throughput": work / seconds,
+            "unit": f"{unit}/s",
+            "peak_memory_bytes": peak,
+        }
+        print(f"{name:50s} {seconds * 1000:10.2f} ms {work / seconds:14,.0f} {unit}/s "
+              f"{peak / 1024 / 1024:9.2f} MiB peak", flush=True)
+    return results
+
+
+def measure_import_time(module: str, runs: int = IMPORT_TIME_RUNS) -> tuple[float, float]:
+    """
+    Best cumulative import time of ``module`` in milliseconds, from ``-X importtime`` in ``runs`` fresh
+    interpreters, and the best time in milliseconds for a fresh interpreter to start and exit without importing it,
+    measured alongside each run so that both see the same load on the machine. The modules are imported from a copy
+    of the sources without any cached bytecode, so that every run compiles them as on a cold Lambda, and numpy is
+    hidden as it is not deployed.
+    """
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    startup_code = "import sys; sys.modules['numpy'] = None"
+    best = best_startup = None
+    with tempfile.TemporaryDirectory() as package_dir:
+        for name in os.listdir(source_dir):
+            if name.endswith('.py'):
+                shutil.copy(os.path.join(source_dir, name), package_dir)
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-B", "-c", startup_code], cwd=package_dir, check=True)
+            startup_ms = (time.perf_counter() - start) * 1000
+            best_startup = startup_ms if best_startup is None else min(best_startup, startup_ms)
+
+            code = f"{startup_code}; import {module}"
+            result = subprocess.run([sys.executable, "-B", "-X", "importtime", "-c", code], cwd=package_dir,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                                    check=True)
+            # Lines are "import time: <self us> | <cumulative us> | <indented module name>"
+            for line in result.stderr.splitlines():
+                fields = line.split('|')
+                if len(fields) == 3 and fields[2].strip() == module:
+                    ms = int(fields[1]) / 1000
+                    best = ms if best is None else min(best, ms)
+    return best, best_startup
+
+
+def import_time_budget_ms(module: str, startup_ms: float) -> float:
+    return IMPORT_TIME_BUDGETS[module] * startup_ms
+
+
+def check_import_times():
+    """Print the import time of each handler module and return the names of those over budget"""
+    over_budget = []
+    print()
+    for module in IMPORT_TIME_BUDGETS:
+        ms, startup_ms = measure_import_time(module)
+        budget_ms = import_time_budget_ms(module, startup_ms)
+        if ms > budget_ms:
+            over_budget.append(f"import {module}")
+        print(f"{'import ' + module:50s} {ms:10.2f} ms {budget_ms:10.2f} ms budget"
+              f"{'  OVER BUDGET' if ms > budget_ms else ''}", flush=True)
+    return over_budget
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Print the change against ``baseline`` for each case and return the names of the regressed cases"""
+    regressions = []
+    print()
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:50s} (not in baseline)")
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        regressed = ratio > 1 + tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:50s} {ratio:6.2f}x baseline time{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="run fewer and smaller cases")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline file to compare against or save to")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fractional slowdown against the baseline allowed before a case is a regression")
+    args = parser.parse_args()
+
+    results = run(args.quick)
+    regressions = check_import_times()
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.baseline}")
+    elif not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+    else:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions += compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import base64
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Content codings we can produce, in order of preference when the client accepts several equally
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def get_header(event, name: str):
+    """Case-insensitive lookup of a request header in an API Gateway proxy event"""
+    name = name.lower()
+    for k, v in (event.get('headers') or {}).items():
+        if k.lower() == name:
+            return v
+    return None
+
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the content coding to use for a response from the value of an ``Accept-Encoding`` request header, or
+    ``None`` to send the body uncompressed.
+    """
+    if not accept_encoding:
+        return None
+    q_values = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [p.strip() for p in item.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        q_values[coding.lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = q_values.get(encoding, q_values.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _compressor(encoding: str):
+    if encoding == 'gzip':
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if encoding == 'br':
+        return brotli.Compressor(quality=BROTLI_QUALITY)
+    raise ValueError(f"Unsupported encoding {encoding}")
+
+
+def iter_compressed(chunks, encoding: str, text_encoding: str = 'utf8'):
+    """
+    Compress an iterable of string or bytes chunks incrementally, yielding compressed bytes as they become
+    available
+    """
+    compressor = _compressor(encoding)
+    compress = compressor.compress if encoding == 'gzip' else compressor.process
+    for chunk in chunks:
+        data = compress(chunk if isinstance(chunk, bytes) else chunk.encode(text_encoding))
+        if data:
+            yield data
+    yield compressor.flush() if encoding == 'gzip' else compressor.finish()
+
+
+def make_response(event, chunks, headers: dict, status_code: int = 200, binary: bool = False) -> dict:
+    """
+    Build an API Gateway proxy response from an iterable of string ``chunks``, or of bytes chunks if ``binary``.
+    If the request's ``Accept-Encoding`` allows it the body is compressed as it is generated and returned base64
+    encoded, so the uncompressed body is never held in memory as a whole.
+
+    If the event has ``streamBody`` set, which only the local server does as API Gateway cannot stream, the body is
+    not generated here: the response has ``bodyChunks`` instead of ``body``, an iterator of bytes which generates
+    and compresses the body as it is sent.
+    """
+    headers = dict(headers, Vary='Accept-Encoding')
+    encoding = choose_encoding(get_header(event, 'accept-encoding'))
+    if event.get('streamBody'):
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+            chunks = iter_compressed(chunks, encoding)
+        elif not binary:
+            chunks = (chunk.encode('utf8') for chunk in chunks)
+        return {
+            'statusCode': status_code,
+            'bodyChunks': chunks,
+            'headers': headers
+        }
+    if encoding is None and binary:
+        return {
+            'statusCode': status_code,
+            'body': base64.b64encode(b''.join(chunks)).decode('ascii'),
+            'isBase64Encoded': True,
+            'headers': headers
+        }
+    if encoding is None:
+        return {
+            'statusCode': status_code,
+            'body': ''.join(chunks),
+            'headers': headers
+        }
+
+    headers['Content-Encoding'] = encoding
+    return {
+        'statusCode': status_code,
+        'body': base64.b64encode(b''.join(iter_compressed(chunks, encoding))).decode('ascii'),
+        'isBase64Encoded': True,
+        'headers': headers
+    }
+
+
+def join_body(response: dict) -> dict:
+    """A response with a streamed body as the same response with the whole body, base64 encoded"""
+    response = dict(response, body=base64.b64encode(b''.join(response['bodyChunks'])).decode('ascii'),
+                    isBase64Encoded=True)
+    del response['bodyChunks']
+    return response
@@ -2,24 +2,16 @@ module api {
   source = "./api"
 
   deployment_name = local.deployment_name
-  lambda_arns = [aws_lambda_function.lambda_make_gpx.arn, aws_lambda_function.lambda_shift_purple_pen.arn]
+  lambda_arns = [aws_lambda_function.lambda_drongo.arn]
   layers = []
-  lambda_make_gpx_arn = aws_lambda_function.lambda_make_gpx.invoke_arn
-  lambda_shift_purple_pen_arn = aws_lambda_function.lambda_shift_purple_pen.invoke_arn
+  lambda_router_arn = aws_lambda_function.lambda_drongo.invoke_arn
 }
 
 /* Permission on lambda's end to allow API gateway to invoke it */
 resource "aws_lambda_permission" "allow_api_gateway" {
-    statement_id   = "${aws_lambda_function.lambda_make_gpx.function_name}-allow-api-gateway"
+    statement_id   = "${aws_lambda_function.lambda_drongo.function_name}-allow-api-gateway"
     action         = "lambda:InvokeFunction"
-    function_name  = aws_lambda_function.lambda_make_gpx.function_name
-    principal      = "apigateway.amazonaws.com"
-    source_arn     = module.api.execution_arn
-}
-resource "aws_lambda_permission" "allow_api_gateway_ppen" {
-    statement_id   = "${aws_lambda_function.lambda_shift_purple_pen.function_name}-allow-api-gateway"
-    action         = "lambda:InvokeFunction"
-    function_name  = aws_lambda_function.lambda_shift_purple_pen.function_name
+    function_name  = aws_lambda_function.lambda_drongo.function_name
     principal      = "apigateway.amazonaws.com"
     source_arn     = module.api.execution_arn
 }
@@ -3,12 +3,9 @@ variable "deployment_name" {
     type = string
 }
 
-variable "lambda_make_gpx_arn" {
-  type = string
-}
-
-variable "lambda_shift_purple_pen_arn" {
+variable "lambda_router_arn" {
   type = string
+  description = "Invoke ARN of the Lambda which serves every route of the API"
 }
 
 variable "lambda_arns" {
@@ -1,53 +1,53 @@
-data "archive_file" "lambda_function_make_gpx" {
-    type        = "zip"
-    output_path = "artifacts/lambda_make_gpx.zip"
-
-    source {
-      content = file("../make_gpx.py")
-      filename = "make_gpx.py"
-    }
+locals {
+  # Everything the handlers load. Only these are packaged, so nothing else added to the repository is deployed.
+  lambda_modules = [
+    "router.py",
+    "make_gpx.py",
+    "shift_purple_pen.py",
+    "track_formats.py",
+    "shapes.py",
+    "parameters.py",
+    "multipart_decoder.py",
+    "compression.py",
+    "request_log.py",
+    "response_cache.py",
+    "responses.py",
+  ]
+  lambda_files = concat(local.lambda_modules,
+                        [for f in fileset("${path.module}/../shapes", "*.f64") : "shapes/${f}"])
+  lambda_build_dir = "${path.module}/artifacts/lambda_drongo"
 }
 
-resource "aws_lambda_function" "lambda_make_gpx" {
-  filename      = data.archive_file.lambda_function_make_gpx.output_path
-  function_name = "${local.deployment_name}-make-gpx"
-  role          = aws_iam_role.iam_for_lambda.arn
-  handler       = "make_gpx.handler"
-
-  source_code_hash = data.archive_file.lambda_function_make_gpx.output_base64sha256
-
-  runtime = "python3.7"
-  timeout = 15
-  memory_size = 512
-  description = "Make a DrongO GPX"
+# The shape store holds binary files, which cannot be read with file(), so copy the package into a build directory
+resource "local_file" "lambda_package" {
+  for_each = toset(local.lambda_files)
+  source   = "${path.module}/../${each.value}"
+  filename = "${local.lambda_build_dir}/${each.value}"
 }
 
-
-data "archive_file" "lambda_function_shift_purple_pen" {
+data "archive_file" "lambda_function_drongo" {
     type        = "zip"
-    output_path = "artifacts/lambda_shift_purple_pen.zip"
-
-    source {
-      content = file("../shift_purple_pen.py")
-      filename = "shift_purple_pen.py"
-    }
+    output_path = "${path.module}/artifacts/lambda_drongo.zip"
+    source_dir  = local.lambda_build_dir
 
-  source {
-    content = file("../multipart_decoder.py")
-    filename = "multipart_decoder.py"
-  }
+    depends_on  = [local_file.lambda_package]
 }
 
-resource "aws_lambda_function" "lambda_shift_purple_pen" {
-  filename      = data.archive_file.lambda_function_shift_purple_pen.output_path
-  function_name = "${local.deployment_name}-shift-purple-pen"
+/* One function serves every route of the API through router.handler, so whichever tool a request is for, it is
+   more likely to find a warm instance. Each tool's module is only imported when it is first used. */
+resource "aws_lambda_function" "lambda_drongo" {
+  filename      = data.archive_file.lambda_function_drongo.output_path
+  function_name = "${local.deployment_name}-drongo"
   role          = aws_iam_role.iam_for_lambda.arn
-  handler       = "shift_purple_pen.handler"
+  handler       = "router.handler"
 
-  source_code_hash = data.archive_file.lambda_function_shift_purple_pen.output_base64sha256
+  source_code_hash = data.archive_file.lambda_function_drongo.output_base64sha256
 
-  runtime = "python3.7"
-  timeout = 15
-  memory_size = 512
-  description = "Shift a PurplePen file"
+  runtime = "python3.12"
+  # API Gateway gives up on a request after 29 seconds, so a function still running then would only be billed for a
+  # response nobody receives. The largest batches take a few seconds, helped by the CPU that comes with the larger
+  # memory size.
+  timeout = 29
+  memory_size = 1024
+  description = "Make DrongO GPXs and shift PurplePen files"
 }
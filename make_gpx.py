@@ -1,172 +1,481 @@
-import re
 import json
 import datetime
 import math
-from functools import reduce
-from itertools import accumulate
+import io
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import accumulate, chain
+import shapes
+import compression
+import parameters
+import request_log
+import response_cache
+import responses
+from parameters import Parameter, at_least, at_most, greater_than, one_of
+from responses import make_bad_request_response
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the pure Python engine is used without it
+    np = None
+
+
+@request_log.logged('make_gpx')
+def handler(event, context):
+    query = event.get("queryStringParameters", {})
 
+    with request_log.stage('validation'):
+        params, errors = parse_gpx_parameters(query)
+    if errors:
+        return make_bad_request_response("; ".join(errors), errors)
 
-def handler(event, context):
-    print(json.dumps(event))
+    # The validated parameters are normalised, so equivalent query strings share an ETag and cached response
+    return response_cache.respond(event, ['gpx', params], lambda: make_track_response(event, params),
+                                  cache_control=GPX_CACHE_CONTROL)
 
-    query = event.get("queryStringParameters", {})
 
-    # parameter: lat
-    if "lat" not in query:
-        return make_bad_request_response("Missing required parameter lat")
-    try:
-        lat = float(query["lat"])
-    except ValueError:
-        return make_bad_request_response("lat must be a number")
-    if lat < -90:
-        return make_bad_request_response("lat must be >= -90")
-    if lat > 90:
-        return make_bad_request_response("lat must be <= 90")
-
-    # parameter: lon
-    if "lon" not in query:
-        return make_bad_request_response("Missing required parameter lon")
-    try:
-        lon = float(query["lon"])
-    except ValueError:
-        return make_bad_request_response("lon must be a number")
-    if lon > 180:
-        return make_bad_request_response("lon must be <= 180")
-    if lon < -180:
-        return make_bad_request_response("lon must be >= -180")
-
-    # parameter: start_time
-    if "start_time" not in query:
-        return make_bad_request_response("Missing required parameter start_time")
-    date_format = re.compile(r'^\d{4}\d{2}\d{2}\d{2}\d{2}(\d{2})?$')
-    if not date_format.match(query["start_time"]):
-        return make_bad_request_response("start_time format does not match YYYYMMDDHHMM or YYYYMMDDHHSS")
-    try:
-        start_time = datetime.datetime.strptime(query["start_time"], '%Y%m%d%H%M')
-    except ValueError:
-        try:
-            start_time = datetime.datetime.strptime(query["start_time"], '%Y%m%d%H%M%S')
-        except ValueError:
-            return make_bad_request_response("start_time format does not match YYYYMMDDHHMM or YYYYMMDDHHSS")
-
-    # parameter: length
-    try:
-        length_metres = int(query.get("length", "10000"))
-    except ValueError:
-        return make_bad_request_response("length must be an integer")
-    if length_metres <= 0:
-        return make_bad_request_response("length must be > 0")
-    if length_metres > 1000000:
-        return make_bad_request_response("length must be < 1000000")
-
-    # parameter: hours
-    try:
-        hours = int(query.get("hours", "0"))
-    except ValueError:
-        return make_bad_request_response("hours must be an integer")
-    if hours < 0:
-        return make_bad_request_response("hours must be >= 0")
+# A track only depends on its parameters, so browsers and CDNs can keep it for as long as they like
+GPX_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
-    # parameter: minutes
-    try:
-        minutes = int(query.get("minutes", "0"))
-    except ValueError:
-        return make_bad_request_response("minutes must be an integer")
-    if minutes < 0:
-        return make_bad_request_response("minutes must be >= 0")
-    if minutes > 60:
-        return make_bad_request_response("minutes must be <= 60")
-
-    # parameter: seconds
-    try:
-        seconds = int(query.get("seconds", "0"))
-    except ValueError:
-        return make_bad_request_response("seconds must be an integer")
-    if seconds < 0:
-        return make_bad_request_response("seconds must be >= 0")
-    if seconds > 60:
-        return make_bad_request_response("seconds must be <= 60")
-
-    duration = datetime.timedelta(hours=hours) + datetime.timedelta(minutes=minutes) + datetime.timedelta(seconds=seconds)
-    if duration < datetime.timedelta(seconds=10):
-        return make_bad_request_response("Total duration (hours+minutes+seconds) must be at least 10 seconds")
-    if duration > datetime.timedelta(days=2):
-        return make_bad_request_response("Total activity duration should be <= 48 hours")
-
-    gpx_string = make_gpx(length_metres, start_time, duration, lat, lon)
 
-    return {
-        'statusCode': 200,
-        'body': gpx_string,
-        'headers': {
-            'Content-Type': 'application/gpx+xml',
-            'Content-Disposition': "attachment; filename=whos-an-awesome-drongo.gpx"
-        }
-    }
+def make_track_response(event, params: dict) -> dict:
+    content_type, extension, binary = OUTPUT_FORMATS[params['output_format']]
+    track_chunks = iter_track(**params)
 
+    with request_log.stage('serialization'):
+        return compression.make_response(event, track_chunks, {
+            'Content-Type': content_type,
+            'Content-Disposition': "attachment; filename=whos-an-awesome-drongo." + extension
+        }, binary=binary)
 
-def make_bad_request_response(message: str) -> dict:
-    return {
-        'statusCode': 400,
-        'body': json.dumps({"message": message}),
-        'headers': {
-            'Content-Type': 'application/json'
-        }
-    }
 
+MAX_BATCH_TRACKS = 50
+# The ZIP is returned base64 encoded in the Lambda response, which must fit in 6MB. A GPX trackpoint takes up to
+# about 21 bytes of that when tracks are long and spread out, so the limit leaves room for the worst case.
+MAX_BATCH_POINTS = 250000
 
-def make_gpx(length_metres: int, start_time: datetime.datetime, duration: datetime.timedelta, lat: float, lon: float):
-    lat_lon_scaled = calculate_coordinates(length_metres, example_lat_lons, lat, lon, duration)
-    timestamps = [start_time + datetime.timedelta(seconds=x) for x in range(0, round(duration.total_seconds()))]
-    assert len(timestamps) == len(lat_lon_scaled)
 
-    s = XMLBuilder()
-    s.add("""
+@request_log.logged('make_gpx_batch')
+def batch_handler(event, context):
+    try:
+        queries = json.loads(responses.get_body(event))
+    except (TypeError, ValueError):
+        return make_bad_request_response("Request body must be a JSON list of track parameters")
+    if not isinstance(queries, list) or not all(isinstance(q, dict) for q in queries):
+        return make_bad_request_response("Request body must be a JSON list of track parameters")
+    if len(queries) == 0:
+        return make_bad_request_response("At least one track is required")
+    if len(queries) > MAX_BATCH_TRACKS:
+        return make_bad_request_response(f"At most {MAX_BATCH_TRACKS} tracks can be made at once")
+
+    tracks = []
+    total_points = 0
+    with request_log.stage('validation'):
+        for i, query in enumerate(queries):
+            # Parameters are validated exactly as query strings would be, so JSON numbers are accepted too
+            params, errors = parse_gpx_parameters({k: str(v) for k, v in query.items()})
+            if errors:
+                errors = [f"Track {i + 1}: {error}" for error in errors]
+                return make_bad_request_response("; ".join(errors), errors)
+            total_points += len(sample_offsets(params['duration'], params['interval'], params['max_points']))
+            tracks.append(params)
+    if total_points > MAX_BATCH_POINTS:
+        return make_bad_request_response(
+            f"Batch would have {total_points} trackpoints but the limit is {MAX_BATCH_POINTS}: "
+            f"use interval or max_points to reduce them")
+
+    sink = io.BytesIO()
+    with request_log.stage('serialization'):
+        write_gpx_zip(sink, tracks)
+
+    return responses.make_zip_response(sink.getvalue(), "a-flock-of-drongos.zip")
+
+
+def _check_duration(values: dict):
+    total_seconds = values['hours'] * 3600 + values['minutes'] * 60 + values['seconds']
+    if total_seconds < 10:
+        return "Total duration (hours+minutes+seconds) must be at least 10 seconds"
+    if total_seconds > 2 * 24 * 3600:
+        return "Total activity duration should be <= 48 hours"
+    values['duration'] = datetime.timedelta(seconds=total_seconds)
+
+
+def _check_fit_time(values: dict):
+    if values['format'] != 'fit':
+        return
+    # Imported only for the formats that need it, as most requests are for GPX
+    import track_formats
+    if not (track_formats.FIT_EPOCH <= values['start_time'] and
+            values['start_time'] + values['duration'] <= track_formats.FIT_LATEST):
+        return (f"FIT activities must be between {track_formats.FIT_EPOCH:%Y-%m-%d} and "
+                f"{track_formats.FIT_LATEST:%Y-%m-%d}: change start_time or the format")
+
+
+def _check_points(values: dict):
+    shape = values['shape']
+    min_points = get_shape_geometry(shape).min_points
+    num_points = len(sample_offsets(values['duration'], values['interval'], values['max_points']))
+    if num_points >= min_points:
+        return
+    if values['max_points'] is not None:
+        # Points are a whole number of seconds apart, so there can be well under max_points of them
+        smallest = smallest_max_points(values['duration'], values['interval'], min_points)
+        if smallest is not None:
+            return f"max_points must be >= {smallest} for the {shape} shape, which needs at least {min_points} points"
+        if values['max_points'] < min_points:
+            return f"max_points must be >= {min_points}"
+    return (f"Track would only have {num_points} points but the {shape} shape needs at least {min_points}: "
+            f"increase the duration or reduce the interval")
+
+
+GPX_PARAMETERS = parameters.compile_schema([
+    Parameter('lat', float, "must be a number", required=True, checks=[at_least(-90), at_most(90)]),
+    Parameter('lon', float, "must be a number", required=True, checks=[at_least(-180), at_most(180)]),
+    Parameter('start_time', parameters.parse_timestamp, "format does not match YYYYMMDDHHMM or YYYYMMDDHHSS",
+              required=True),
+    Parameter('length', int, "must be an integer", default=10000,
+              checks=[greater_than(0), at_most(1000000)]),
+    Parameter('hours', int, "must be an integer", default=0, checks=[at_least(0)]),
+    Parameter('minutes', int, "must be an integer", default=0, checks=[at_least(0), at_most(60)]),
+    Parameter('seconds', int, "must be an integer", default=0, checks=[at_least(0), at_most(60)]),
+    Parameter('shape', default=shapes.DEFAULT_SHAPE, checks=[one_of(shapes.available_shapes, sort=True)]),
+    Parameter('interval', int, "must be an integer", default=1, checks=[at_least(1)]),
+    Parameter('max_points', int, "must be an integer"),
+    Parameter('format', default='gpx', checks=[one_of(lambda: OUTPUT_FORMATS)]),
+], rules=[_check_duration, _check_fit_time, _check_points])
+
+
+def parse_gpx_parameters(query: dict):
+    """
+    Validate the query parameters of a GPX request. Returns ``(params, [])`` where ``params`` are the keyword
+    arguments for ``iter_track``, or ``(None, errors)`` with a message for each invalid parameter.
+    """
+    values, errors = GPX_PARAMETERS(query)
+    if errors:
+        return None, errors
+    return {
+        'length_metres': values['length'],
+        'start_time': values['start_time'],
+        'duration': values['duration'],
+        'lat': values['lat'],
+        'lon': values['lon'],
+        'shape': values['shape'],
+        'interval': values['interval'],
+        'max_points': values['max_points'],
+        'output_format': values['format'],
+    }, []
+
+
+def make_gpx(length_metres: int, start_time: datetime.datetime, duration: datetime.timedelta, lat: float, lon: float,
+             shape: str = shapes.DEFAULT_SHAPE, interval: int = 1, max_points: int = None):
+    sink = io.StringIO()
+    write_gpx(sink, length_metres, start_time, duration, lat, lon, shape, interval, max_points)
+    return sink.getvalue()
+
+
+def write_gpx(sink, length_metres: int, start_time: datetime.datetime, duration: datetime.timedelta, lat: float,
+              lon: float, shape: str = shapes.DEFAULT_SHAPE, interval: int = 1, max_points: int = None):
+    """Write the GPX document to any file-like ``sink`` with a ``write`` method, one chunk at a time"""
+    for chunk in iter_gpx(length_metres, start_time, duration, lat, lon, shape, interval, max_points):
+        sink.write(chunk)
+
+
+def write_gpx_zip(sink, tracks, max_workers: int = responses.BATCH_WORKERS, executor_class=None):
+    """
+    Write a ZIP archive to ``sink`` with one file for each entry of ``tracks``, which are keyword arguments for
+    ``iter_track``, rendering them in a pool of workers as ``responses.write_zip`` does
+    """
+    responses.write_zip(sink, ((track_zip_name(i, params), (params,)) for i, params in enumerate(tracks)),
+                        render_track, max_workers, executor_class)
+
+
+def render_track(params: dict) -> bytes:
+    chunks = iter_track(**params)
+    if OUTPUT_FORMATS[params.get('output_format', 'gpx')][2]:
+        return b''.join(chunks)
+    return ''.join(chunks).encode('utf8')
+
+
+def track_zip_name(index: int, params: dict) -> str:
+    extension = OUTPUT_FORMATS[params.get('output_format', 'gpx')][1]
+    return "{0:03d}-{1}-{2:%Y%m%d%H%M}.{3}".format(index + 1, params['shape'], params['start_time'], extension)
+
+
+# format: (content type, file extension, whether the chunks are bytes rather than strings)
+OUTPUT_FORMATS = {
+    'gpx': ('application/gpx+xml', 'gpx', False),
+    'fit': ('application/vnd.ant.fit', 'fit', True),
+    'geojson': ('application/geo+json', 'geojson', False),
+    'csv': ('text/csv', 'csv', False),
+}
+
+
+def iter_track(length_metres: int, start_time: datetime.datetime, duration: datetime.timedelta, lat: float,
+               lon: float, shape: str = shapes.DEFAULT_SHAPE, interval: int = 1, max_points: int = None,
+               output_format: str = 'gpx'):
+    """Generate the track in any of the ``OUTPUT_FORMATS`` as a sequence of chunks"""
+    if output_format == 'gpx':
+        yield from iter_gpx(length_metres, start_time, duration, lat, lon, shape, interval, max_points)
+        return
+
+    with request_log.stage('coordinates'):
+        lat_lon_scaled = calculate_coordinates(length_metres, get_shape_geometry(shape), lat, lon, duration,
+                                               interval=interval, max_points=max_points)
+    offsets = sample_offsets(duration, interval, max_points)
+    request_log.count('points', len(offsets))
+    import track_formats
+    if output_format == 'fit':
+        yield from track_formats.iter_fit(lat_lon_scaled, start_time, offsets)
+    elif output_format == 'geojson':
+        yield from track_formats.iter_geojson(lat_lon_scaled, iter_timestamps(start_time, offsets))
+    elif output_format == 'csv':
+        yield from track_formats.iter_csv(lat_lon_scaled, iter_timestamps(start_time, offsets))
+    else:
+        raise ValueError(f"Unknown output format {output_format}")
+
+
+GPX_HEADER = """
 <?xml version="1.0" encoding="UTF-8"?>
 <gpx creator="StravaGPX" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd" version="1.1" xmlns="http://www.topografix.com/GPX/1/1">
-""")
-    s.open_tag("metadata")
-    s.open_tag("time")
-    s.add(format_date(start_time))
-    s.close_tag("time")
-    s.close_tag("metadata")
-    s.open_tag("trk")
-    s.open_tag("trkseg")
-    for ts, lat_lon in zip(timestamps, lat_lon_scaled):
-        lat, lon = lat_lon
-        s.open_tag("trkpt", {'lat': "{0:.7f}".format(lat), 'lon': "{0:.7f}".format(lon)})
-        s.open_tag("time")
-        s.add(format_date(ts))
-        s.close_tag("time")
-        s.close_tag("trkpt")
-    s.close_tag("trkseg")
-    s.close_tag("trk")
-    s.add("""
+"""
+GPX_FOOTER = """
     </gpx>
-    """)
-
-    return s.to_string()
+    """
+TRKPT_FORMAT = '<trkpt lat="{0:.7f}" lon="{1:.7f}"><time>{2}</time></trkpt>'
+
+
+def iter_gpx(length_metres: int, start_time: datetime.datetime, duration: datetime.timedelta, lat: float, lon: float,
+             shape: str = shapes.DEFAULT_SHAPE, interval: int = 1, max_points: int = None):
+    """Generate the GPX document as a sequence of string chunks, one per trackpoint"""
+    with request_log.stage('coordinates'):
+        lat_lon_scaled = calculate_coordinates(length_metres, get_shape_geometry(shape), lat, lon, duration,
+                                               interval=interval, max_points=max_points)
+    offsets = sample_offsets(duration, interval, max_points)
+    request_log.count('points', len(offsets))
+    assert len(offsets) == len(lat_lon_scaled)
+    timestamps = iter_timestamps(start_time, offsets)
+
+    yield GPX_HEADER + "<metadata><time>" + format_date(start_time) + "</time></metadata><trk><trkseg>"
+    for ts, lat_lon in zip(timestamps, lat_lon_scaled):
+        yield TRKPT_FORMAT.format(lat_lon[0], lat_lon[1], ts)
+    yield "</trkseg></trk>" + GPX_FOOTER
 
 
 def format_date(d):
     return d.replace(microsecond=0, tzinfo=datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
 
 
-def calculate_coordinates(length_metres: int, lat_lon, lat, lon, duration: datetime.timedelta):
-    xy = lat_lon_to_xy(lat_lon)
-    diffs = [math.sqrt((xy1[0] - xy2[0]) ** 2 + (xy1[1] - xy2[1]) ** 2) for xy1, xy2 in zip(xy[1:], xy[:-1])]
-    total_length = sum(diffs)
-    scale_factor = length_metres / total_length
-    xy_scaled = [[x * scale_factor, y * scale_factor] for x, y in xy]
-    xy_scaled = interpolate_coordinates(xy_scaled, diffs, round(duration.total_seconds()))
-    lat_lon_scaled = xy_to_lat_lon(xy_scaled, lat, lon)
-    return lat_lon_scaled
-
-
-def interpolate_coordinates(xy, xy_diffs, num_points):
+_SECONDS_SUFFIXES = ['{0:02d}Z'.format(s) for s in range(60)]
+
+
+def iter_timestamps(start_time: datetime.datetime, offsets):
+    """
+    Generate ``format_date`` strings for each of the increasing whole-second ``offsets`` from ``start_time``. Only
+    the ``YYYY-MM-DDTHH:MM:`` prefix goes through ``strftime``, once per minute; the seconds are carried by hand.
+    """
+    start_minute = start_time.replace(second=0, microsecond=0, tzinfo=None)
+    minutes = 0
+    prefix = start_minute.strftime('%Y-%m-%dT%H:%M:')
+    for offset in offsets:
+        offset_minutes, second = divmod(start_time.second + offset, 60)
+        if offset_minutes != minutes:
+            minutes = offset_minutes
+            prefix = (start_minute + datetime.timedelta(minutes=minutes)).strftime('%Y-%m-%dT%H:%M:')
+        yield prefix + _SECONDS_SUFFIXES[second]
+
+
+def sample_offsets(duration: datetime.timedelta, interval: int = 1, max_points: int = None):
+    """
+    Whole-second offsets from the start of the activity at which trackpoints are recorded: every ``interval``
+    seconds, widened if necessary to stay within ``max_points``. The final point is always at the same offset as
+    with one point per second, so the elapsed time of the activity does not depend on the sampling.
+    """
+    last_offset = round(duration.total_seconds()) - 1
+    if max_points is not None and max_points > 1:
+        interval = max(interval, math.ceil(last_offset / (max_points - 1)))
+    offsets = range(0, last_offset + 1, interval)
+    if offsets[-1] != last_offset:
+        offsets = list(offsets) + [last_offset]
+    return offsets
+
+
+def smallest_max_points(duration: datetime.timedelta, interval: int, min_points: int):
+    """
+    The smallest ``max_points`` for which ``sample_offsets`` gives at least ``min_points``, or ``None`` if it gives
+    fewer however large ``max_points`` is. The number of points only grows with ``max_points``, so it is found by
+    bisection.
+    """
+    if len(sample_offsets(duration, interval)) < min_points:
+        return None
+    low, high = min_points, round(duration.total_seconds())
+    while low < high:
+        middle = (low + high) // 2
+        if len(sample_offsets(duration, interval, middle)) >= min_points:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def calculate_coordinates(length_metres: int, lat_lon, lat, lon, duration: datetime.timedelta, backend=None,
+                          interval: int = 1, max_points: int = None, cache: bool = True):
+    """
+    Scale the ``lat_lon`` shape to ``length_metres``, resample it to one point per ``interval`` seconds of
+    ``duration`` (see ``sample_offsets``) and anchor it at ``lat``, ``lon``. ``lat_lon`` is either a list of
+    ``[lat, lon]`` pairs or a precomputed ``ShapeGeometry``. ``backend`` is ``"python"`` or ``"numpy"``; by default
+    numpy is used when it is installed. Both backends return a list of ``[lat, lon]`` pairs which agree to the 7
+    decimal places written out, though not bit for bit, as ``np.cos`` and ``math.cos`` can round differently.
+
+    The scaled and resampled shape does not depend on where or when the track is, so for a ``ShapeGeometry`` it
+    is kept in ``RESAMPLED_XY_CACHE`` unless ``cache`` is false, and a repeated length and duration only needs
+    anchoring. The python backend keeps it packed into one ``array('d')`` of interleaved x and y coordinates,
+    which takes an eighth of the memory of a list of pairs; only a cache hit reads the pairs back out of it.
+    """
+    if backend is None:
+        backend = "python" if np is None else "numpy"
+    if backend not in ("python", "numpy"):
+        raise ValueError(f"Unknown coordinate backend {backend}")
+    num_points = len(sample_offsets(duration, interval, max_points))
+    if isinstance(lat_lon, ShapeGeometry) and cache:
+        xy_scaled = RESAMPLED_XY_CACHE.get_or_compute(
+            (lat_lon, backend, length_metres, num_points),
+            lambda: resample_xy(length_metres, lat_lon, num_points, backend),
+            pack=_pack_xy if backend == "python" else None)
+    else:
+        geometry = lat_lon if isinstance(lat_lon, ShapeGeometry) else ShapeGeometry(lat_lon)
+        xy_scaled = resample_xy(length_metres, geometry, num_points, backend)
+
+    if backend == "numpy":
+        return xy_to_lat_lon_np(xy_scaled, lat, lon).tolist()
+    if isinstance(xy_scaled, array):
+        coordinates = iter(xy_scaled)
+        xy_scaled = zip(coordinates, coordinates)
+    return xy_to_lat_lon(xy_scaled, lat, lon)
+
+
+def resample_xy(length_metres: int, geometry: 'ShapeGeometry', num_points: int, backend: str):
+    """
+    The shape scaled to ``length_metres`` and resampled to ``num_points``, in local XY metres: an ``(n, 2)`` array
+    for the numpy backend, or a list of ``[x, y]`` pairs for the python backend
+    """
+    if backend == "numpy":
+        xy, cumulative_length = geometry.arrays()
+        xy_scaled = interpolate_coordinates_np(xy * (length_metres / geometry.total_length), cumulative_length,
+                                               num_points, geometry.total_length)
+        xy_scaled.flags.writeable = False
+        return xy_scaled
+    scale_factor = length_metres / geometry.total_length
+    xy_scaled = [[x * scale_factor, y * scale_factor] for x, y in geometry.xy]
+    return interpolate_coordinates(xy_scaled, geometry.diffs, num_points, geometry.cumulative_length,
+                                   geometry.total_length)
+
+
+def _pack_xy(xy_scaled) -> array:
+    return array('d', chain.from_iterable(xy_scaled))
+
+
+def _resampled_xy_size(xy_scaled) -> int:
+    if isinstance(xy_scaled, array):
+        return xy_scaled.itemsize * len(xy_scaled)
+    return xy_scaled.nbytes
+
+
+class ResampledXYCache:
+    """
+    A least recently used cache of resampled shapes, bounded by the total size of the cached coordinates rather
+    than the number of entries, as a 48 hour track has thousands of times more points than a 10 minute one.
+    ``hits`` and ``misses`` count lookups over the life of the process, and each lookup is also counted in the
+    request log. ``pack``, if given, converts a computed value into the more compact form which is cached: a miss
+    returns the value as computed, and a hit the packed value.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute, pack=None):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if value is not None:
+            request_log.count('xy_cache_hits')
+            return value
+
+        value = compute()
+        packed = value if pack is None else pack(value)
+        size = _resampled_xy_size(packed)
+        with self._lock:
+            self.misses += 1
+            if size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = packed
+                self.size_bytes += size
+                while self.size_bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size_bytes -= _resampled_xy_size(evicted)
+        request_log.count('xy_cache_misses')
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+
+XY_CACHE_MAX_BYTES = int(os.environ.get("XY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESAMPLED_XY_CACHE = ResampledXYCache(XY_CACHE_MAX_BYTES)
+
+
+class ShapeGeometry:
+    """
+    The request-independent part of a track shape: the template projected to local XY metres, with its segment
+    lengths and cumulative lengths. Build it once per shape and reuse it; only scaling, resampling and anchoring
+    depend on the request.
+    """
+    def __init__(self, lat_lons):
+        self.xy = lat_lon_to_xy(lat_lons)
+        self.diffs = [math.sqrt((xy1[0] - xy2[0]) ** 2 + (xy1[1] - xy2[1]) ** 2)
+                      for xy1, xy2 in zip(self.xy[1:], self.xy[:-1])]
+        self.cumulative_length = list(accumulate(self.diffs))
+        # The end of the last segment, rather than sum(), which is compensated from Python 3.12 and can differ from
+        # it in the last bits; resampling scans up to it and both backends must agree on it
+        self.total_length = self.cumulative_length[-1]
+        # Resampling keeps every vertex and needs at least two interpolated points besides
+        self.min_points = len(self.xy) + 2
+        self._arrays = None
+
+    def arrays(self):
+        """The XY vertices and cumulative lengths as numpy arrays, converted on first use"""
+        if self._arrays is None:
+            self._arrays = (np.array(self.xy), np.array(self.cumulative_length))
+        return self._arrays
+
+
+_shape_geometries = {}
+
+
+def get_shape_geometry(shape: str = shapes.DEFAULT_SHAPE) -> ShapeGeometry:
+    """
+    The geometry of the named shape, loaded from the shape store on first use and kept for the lifetime of the
+    process. Shapes which are never requested are never loaded.
+    """
+    if shape not in _shape_geometries:
+        _shape_geometries[shape] = ShapeGeometry(shapes.load_lat_lons(shape))
+    return _shape_geometries[shape]
+
+
+def interpolate_coordinates(xy, xy_diffs, num_points, cumulative_length=None, total_length=None):
     num_new_points = num_points - len(xy)
-    total_length = sum(xy_diffs)
-    cumulative_length = list(accumulate(xy_diffs))
+    if cumulative_length is None:
+        cumulative_length = list(accumulate(xy_diffs))
+    if total_length is None:
+        total_length = cumulative_length[-1]
     distances = [i / (num_new_points - 1) * total_length for i in range(num_new_points)]
 
     current_segment = 0
@@ -209,568 +518,43 @@ def lat_lon_to_xy(lat_lons):
     ]
 
 
-class XMLBuilder:
-    def __init__(self):
-        self.string = ""
-
-    def add(self, s):
-        self.string += s
-
-    def open_tag(self, tag_name, attributes=None):
-        if attributes is None:
-            attributes = {}
-        self.string += "<" + tag_name + reduce(lambda a, b: a + b,
-                                               [" " + k + "=\"" + v + "\"" for k, v in attributes.items()], "") + ">"
-
-    def close_tag(self, tag_name):
-        self.string += "</" + tag_name + ">"
-
-    def to_string(self):
-        return self.string
-
-
-example_lat_lons = [
-    [50.6093190, -1.1961680],
-    [50.6093030, -1.1963440],
-    [50.6092870, -1.1965210],
-    [50.6092700, -1.1966970],
-    [50.6092540, -1.1968740],
-    [50.6092380, -1.1970500],
-    [50.6092220, -1.1972270],
-    [50.6092060, -1.1974030],
-    [50.6091900, -1.1975790],
-    [50.6091740, -1.1977560],
-    [50.6091570, -1.1979320],
-    [50.6091410, -1.1981090],
-    [50.6091710, -1.1982760],
-    [50.6092550, -1.1984320],
-    [50.6093380, -1.1985890],
-    [50.6094210, -1.1987450],
-    [50.6095040, -1.1989020],
-    [50.6095880, -1.1990580],
-    [50.6096710, -1.1992140],
-    [50.6097540, -1.1993710],
-    [50.6098370, -1.1995270],
-    [50.6099200, -1.1996840],
-    [50.6100040, -1.1998400],
-    [50.6100870, -1.1999960],
-    [50.6101700, -1.2001530],
-    [50.6101990, -1.2003230],
-    [50.6102010, -1.2005000],
-    [50.6102020, -1.2006770],
-    [50.6102430, -1.2008440],
-    [50.6103300, -1.2009980],
-    [50.6104170, -1.2011520],
-    [50.6105040, -1.2013070],
-    [50.6105910, -1.2014610],
-    [50.6106780, -1.2016160],
-    [50.6107650, -1.2017700],
-    [50.6108520, -1.2019240],
-    [50.6109060, -1.2020850],
-    [50.6108860, -1.2022610],
-    [50.6108650, -1.2024370],
-    [50.6107860, -1.2025930],
-    [50.6106940, -1.2027440],
-    [50.6106010, -1.2028950],
-    [50.6105090, -1.2030460],
-    [50.6104160, -1.2031970],
-    [50.6103230, -1.2033480],
-    [50.6102310, -1.2034990],
-    [50.6101380, -1.2036500],
-    [50.6100460, -1.2038010],
-    [50.6099530, -1.2039520],
-    [50.6098600, -1.2041040],
-    [50.6097680, -1.2042550],
-    [50.6096750, -1.2044060],
-    [50.6095830, -1.2045570],
-    [50.6094900, -1.2047080],
-    [50.6093970, -1.2048590],
-    [50.6093050, -1.2050100],
-    [50.6092120, -1.2051610],
-    [50.6090880, -1.2052830],
-    [50.6089470, -1.2053910],
-    [50.6088070, -1.2054990],
-    [50.6086660, -1.2056070],
-    [50.6085030, -1.2055590],
-    [50.6083380, -1.2054960],
-    [50.6081730, -1.2054320],
-    [50.6080070, -1.2053680],
-    [50.6078420, -1.2053040],
-    [50.6076770, -1.2052400],
-    [50.6075000, -1.2052300],
-    [50.6073230, -1.2052210],
-    [50.6071460, -1.2052130],
-    [50.6069690, -1.2052040],
-    [50.6067920, -1.2051960],
-    [50.6066150, -1.2051880],
-    [50.6064380, -1.2051790],
-    [50.6062610, -1.2051710],
-    [50.6060840, -1.2051620],
-    [50.6059070, -1.2051540],
-    [50.6057300, -1.2051450],
-    [50.6055530, -1.2051370],
-    [50.6053760, -1.2051290],
-    [50.6051990, -1.2051200],
-    [50.6050220, -1.2051120],
-    [50.6048460, -1.2051030],
-    [50.6046690, -1.2050950],
-    [50.6044920, -1.2050860],
-    [50.6043150, -1.2050780],
-    [50.6041380, -1.2050750],
-    [50.6039630, -1.2051040],
-    [50.6037880, -1.2051330],
-    [50.6036140, -1.2051610],
-    [50.6034540, -1.2052210],
-    [50.6033250, -1.2053430],
-    [50.6031960, -1.2054640],
-    [50.6030670, -1.2055860],
-    [50.6029060, -1.2056290],
-    [50.6027290, -1.2056320],
-    [50.6025520, -1.2056350],
-    [50.6023750, -1.2056380],
-    [50.6023630, -1.2054780],
-    [50.6023680, -1.2053010],
-    [50.6023730, -1.2051230],
-    [50.6023780, -1.2049460],
-    [50.6023830, -1.2047690],
-    [50.6023890, -1.2045920],
-    [50.6023940, -1.2044150],
-    [50.6023990, -1.2042380],
-    [50.6024760, -1.2041140],
-    [50.6026430, -1.2040550],
-    [50.6028110, -1.2039970],
-    [50.6029780, -1.2039390],
-    [50.6031450, -1.2038800],
-    [50.6033120, -1.2038220],
-    [50.6034800, -1.2037640],
-    [50.6036500, -1.2037250],
-    [50.6038270, -1.2037290],
-    [50.6040040, -1.2037340],
-    [50.6041820, -1.2037380],
-    [50.6043590, -1.2037420],
-    [50.6045360, -1.2037470],
-    [50.6047130, -1.2037510],
-    [50.6048900, -1.2037550],
-    [50.6050670, -1.2037600],
-    [50.6052440, -1.2037640],
-    [50.6054210, -1.2037680],
-    [50.6055990, -1.2037730],
-    [50.6057760, -1.2037770],
-    [50.6059530, -1.2037810],
-    [50.6061250, -1.2038200],
-    [50.6062960, -1.2038670],
-    [50.6064670, -1.2039130],
-    [50.6066380, -1.2039600],
-    [50.6067850, -1.2040480],
-    [50.6069110, -1.2041730],
-    [50.6070370, -1.2042970],
-    [50.6071630, -1.2044210],
-    [50.6071000, -1.2043680],
-    [50.6069680, -1.2042490],
-    [50.6068360, -1.2041310],
-    [50.6067020, -1.2040170],
-    [50.6065410, -1.2039420],
-    [50.6063810, -1.2038670],
-    [50.6062200, -1.2037920],
-    [50.6060600, -1.2037170],
-    [50.6058900, -1.2036850],
-    [50.6057130, -1.2036880],
-    [50.6055360, -1.2036910],
-    [50.6053580, -1.2036940],
-    [50.6051810, -1.2036970],
-    [50.6050040, -1.2037000],
-    [50.6048270, -1.2037030],
-    [50.6046500, -1.2037060],
-    [50.6044730, -1.2037090],
-    [50.6042960, -1.2037120],
-    [50.6041180, -1.2037150],
-    [50.6039410, -1.2037180],
-    [50.6037640, -1.2037210],
-    [50.6035870, -1.2037240],
-    [50.6034150, -1.2037650],
-    [50.6032440, -1.2038120],
-    [50.6030730, -1.2038580],
-    [50.6029020, -1.2039040],
-    [50.6027310, -1.2039500],
-    [50.6025600, -1.2039970],
-    [50.6025830, -1.2039110],
-    [50.6026900, -1.2037700],
-    [50.6027960, -1.2036280],
-    [50.6028420, -1.2035590],
-    [50.6027230, -1.2036890],
-    [50.6026030, -1.2038200],
-    [50.6024840, -1.2039510],
-    [50.6023350, -1.2040290],
-    [50.6021610, -1.2040610],
-    [50.6019870, -1.2040940],
-    [50.6018120, -1.2041260],
-    [50.6016380, -1.2041580],
-    [50.6014640, -1.2041900],
-    [50.6012910, -1.2042280],
-    [50.6011180, -1.2042680],
-    [50.6009460, -1.2043080],
-    [50.6007730, -1.2043480],
-    [50.6006000, -1.2043870],
-    [50.6006110, -1.2042700],
-    [50.6006770, -1.2041060],
-    [50.6007430, -1.2039420],
-    [50.6008420, -1.2037960],
-    [50.6009490, -1.2036550],
-    [50.6010560, -1.2035130],
-    [50.6011620, -1.2033720],
-    [50.6012690, -1.2032300],
-    [50.6013760, -1.2030890],
-    [50.6014830, -1.2029470],
-    [50.6015890, -1.2028060],
-    [50.6016960, -1.2026640],
-    [50.6018450, -1.2025800],
-    [50.6020110, -1.2025170],
-    [50.6021770, -1.2024550],
-    [50.6023420, -1.2023920],
-    [50.6025090, -1.2023310],
-    [50.6026760, -1.2022740],
-    [50.6028440, -1.2022170],
-    [50.6030120, -1.2021610],
-    [50.6031800, -1.2021040],
-    [50.6033480, -1.2020480],
-    [50.6035160, -1.2019910],
-    [50.6036920, -1.2019840],
-    [50.6038690, -1.2019810],
-    [50.6040470, -1.2019780],
-    [50.6042240, -1.2019750],
-    [50.6044010, -1.2019720],
-    [50.6045640, -1.2020230],
-    [50.6047180, -1.2021110],
-    [50.6048710, -1.2021990],
-    [50.6050250, -1.2022880],
-    [50.6051790, -1.2023760],
-    [50.6053390, -1.2024470],
-    [50.6055130, -1.2024790],
-    [50.6056870, -1.2025120],
-    [50.6058610, -1.2025440],
-    [50.6060350, -1.2025770],
-    [50.6062090, -1.2026090],
-    [50.6063830, -1.2026430],
-    [50.6065570, -1.2026760],
-    [50.6067310, -1.2027100],
-    [50.6069050, -1.2027430],
-    [50.6070820, -1.2027460],
-    [50.6072590, -1.2027430],
-    [50.6074360, -1.2027400],
-    [50.6073150, -1.2027420],
-    [50.6071380, -1.2027450],
-    [50.6069610, -1.2027480],
-    [50.6067830, -1.2027510],
-    [50.6066060, -1.2027540],
-    [50.6064290, -1.2027570],
-    [50.6062520, -1.2027600],
-    [50.6060790, -1.2027280],
-    [50.6059070, -1.2026840],
-    [50.6057360, -1.2026390],
-    [50.6055640, -1.2025940],
-    [50.6053930, -1.2025500],
-    [50.6052280, -1.2024890],
-    [50.6050750, -1.2024010],
-    [50.6049210, -1.2023120],
-    [50.6047670, -1.2022240],
-    [50.6046140, -1.2021360],
-    [50.6044580, -1.2020560],
-    [50.6042810, -1.2020590],
-    [50.6041040, -1.2020620],
-    [50.6039270, -1.2020650],
-    [50.6037490, -1.2020680],
-    [50.6035720, -1.2020710],
-    [50.6033950, -1.2020740],
-    [50.6032230, -1.2021100],
-    [50.6030550, -1.2021640],
-    [50.6028860, -1.2022180],
-    [50.6027170, -1.2022720],
-    [50.6025490, -1.2023270],
-    [50.6023740, -1.2023450],
-    [50.6023560, -1.2021800],
-    [50.6023490, -1.2020030],
-    [50.6023420, -1.2018260],
-    [50.6023350, -1.2016490],
-    [50.6023280, -1.2014720],
-    [50.6023210, -1.2012950],
-    [50.6023140, -1.2011180],
-    [50.6023070, -1.2009410],
-    [50.6023000, -1.2007640],
-    [50.6022930, -1.2005870],
-    [50.6022860, -1.2004100],
-    [50.6022790, -1.2002330],
-    [50.6022720, -1.2000560],
-    [50.6022650, -1.1998790],
-    [50.6022580, -1.1997010],
-    [50.6022580, -1.1995250],
-    [50.6022680, -1.1993480],
-    [50.6022780, -1.1991710],
-    [50.6022890, -1.1989940],
-    [50.6022990, -1.1988170],
-    [50.6023090, -1.1986400],
-    [50.6023390, -1.1984660],
-    [50.6023700, -1.1982910],
-    [50.6024010, -1.1981170],
-    [50.6024320, -1.1979420],
-    [50.6024630, -1.1977680],
-    [50.6023790, -1.1976170],
-    [50.6022820, -1.1974680],
-    [50.6021850, -1.1973200],
-    [50.6020890, -1.1971710],
-    [50.6021310, -1.1970080],
-    [50.6022200, -1.1968860],
-    [50.6023940, -1.1969140],
-    [50.6025690, -1.1969420],
-    [50.6027200, -1.1970180],
-    [50.6028450, -1.1971430],
-    [50.6029710, -1.1972690],
-    [50.6030480, -1.1974140],
-    [50.6030490, -1.1975910],
-    [50.6030510, -1.1977680],
-    [50.6030520, -1.1979450],
-    [50.6030530, -1.1981220],
-    [50.6030540, -1.1983000],
-    [50.6030550, -1.1984770],
-    [50.6030570, -1.1986540],
-    [50.6030580, -1.1988310],
-    [50.6030590, -1.1990080],
-    [50.6030600, -1.1991850],
-    [50.6030610, -1.1993630],
-    [50.6030630, -1.1995400],
-    [50.6030640, -1.1997170],
-    [50.6030650, -1.1998940],
-    [50.6030660, -1.2000710],
-    [50.6030680, -1.2002490],
-    [50.6030690, -1.2004260],
-    [50.6030700, -1.2006030],
-    [50.6030710, -1.2007800],
-    [50.6030720, -1.2009570],
-    [50.6030740, -1.2011340],
-    [50.6031040, -1.2011860],
-    [50.6031830, -1.2010270],
-    [50.6032610, -1.2008680],
-    [50.6033400, -1.2007100],
-    [50.6034190, -1.2005510],
-    [50.6034980, -1.2003920],
-    [50.6035760, -1.2002340],
-    [50.6036990, -1.2001110],
-    [50.6038390, -1.2000010],
-    [50.6039780, -1.1998920],
-    [50.6041170, -1.1997820],
-    [50.6042560, -1.1996730],
-    [50.6044230, -1.1996400],
-    [50.6046000, -1.1996370],
-    [50.6047730, -1.1996440],
-    [50.6048990, -1.1997680],
-    [50.6050260, -1.1998920],
-    [50.6051520, -1.2000170],
-    [50.6052790, -1.2001400],
-    [50.6054080, -1.2002620],
-    [50.6055370, -1.2003830],
-    [50.6056660, -1.2005040],
-    [50.6057950, -1.2006260],
-    [50.6059030, -1.2007660],
-    [50.6060090, -1.2009080],
-    [50.6061150, -1.2010500],
-    [50.6062210, -1.2011920],
-    [50.6063930, -1.2012350],
-    [50.6065650, -1.2012780],
-    [50.6067240, -1.2013410],
-    [50.6068380, -1.2014770],
-    [50.6069510, -1.2016130],
-    [50.6070650, -1.2017490],
-    [50.6071780, -1.2018850],
-    [50.6072920, -1.2020210],
-    [50.6074520, -1.2020170],
-    [50.6076240, -1.2019770],
-    [50.6077970, -1.2019360],
-    [50.6079690, -1.2018950],
-    [50.6081410, -1.2018540],
-    [50.6083040, -1.2017840],
-    [50.6084660, -1.2017130],
-    [50.6086290, -1.2016420],
-    [50.6086700, -1.2014810],
-    [50.6086900, -1.2013050],
-    [50.6087100, -1.2011290],
-    [50.6087270, -1.2009530],
-    [50.6087010, -1.2007780],
-    [50.6086750, -1.2006030],
-    [50.6086500, -1.2004280],
-    [50.6086240, -1.2002520],
-    [50.6085980, -1.2000770],
-    [50.6085210, -1.1999240],
-    [50.6084110, -1.1997850],
-    [50.6083010, -1.1996460],
-    [50.6081910, -1.1995070],
-    [50.6080810, -1.1993680],
-    [50.6080230, -1.1992010],
-    [50.6079650, -1.1990340],
-    [50.6079070, -1.1988660],
-    [50.6078490, -1.1986990],
-    [50.6078220, -1.1985260],
-    [50.6078210, -1.1983490],
-    [50.6078200, -1.1981710],
-    [50.6078180, -1.1979940],
-    [50.6078170, -1.1978170],
-    [50.6078160, -1.1976400],
-    [50.6078150, -1.1974630],
-    [50.6078130, -1.1972860],
-    [50.6078120, -1.1971080],
-    [50.6078110, -1.1969310],
-    [50.6078100, -1.1967540],
-    [50.6078090, -1.1965770],
-    [50.6078070, -1.1964000],
-    [50.6078060, -1.1962230],
-    [50.6078050, -1.1960450],
-    [50.6078040, -1.1958680],
-    [50.6078030, -1.1956910],
-    [50.6078010, -1.1955140],
-    [50.6078000, -1.1953370],
-    [50.6077990, -1.1951600],
-    [50.6077980, -1.1949820],
-    [50.6077170, -1.1948460],
-    [50.6075740, -1.1947410],
-    [50.6074310, -1.1946370],
-    [50.6072760, -1.1946490],
-    [50.6071140, -1.1947220],
-    [50.6069540, -1.1947970],
-    [50.6068190, -1.1949110],
-    [50.6066840, -1.1950260],
-    [50.6065490, -1.1951400],
-    [50.6064320, -1.1952140],
-    [50.6064310, -1.1950370],
-    [50.6064300, -1.1948590],
-    [50.6064290, -1.1946820],
-    [50.6064270, -1.1945050],
-    [50.6064720, -1.1943370],
-    [50.6065380, -1.1941720],
-    [50.6066040, -1.1940080],
-    [50.6066700, -1.1938430],
-    [50.6067360, -1.1936790],
-    [50.6068020, -1.1935150],
-    [50.6069550, -1.1934620],
-    [50.6071300, -1.1934400],
-    [50.6073060, -1.1934190],
-    [50.6074820, -1.1933970],
-    [50.6076580, -1.1933750],
-    [50.6078010, -1.1932900],
-    [50.6079210, -1.1931600],
-    [50.6080370, -1.1930260],
-    [50.6081440, -1.1928840],
-    [50.6082500, -1.1927420],
-    [50.6083560, -1.1926010],
-    [50.6084620, -1.1924590],
-    [50.6085690, -1.1923170],
-    [50.6086940, -1.1922360],
-    [50.6088630, -1.1922900],
-    [50.6090320, -1.1923440],
-    [50.6091340, -1.1923250],
-    [50.6090940, -1.1921520],
-    [50.6090550, -1.1919790],
-    [50.6090150, -1.1918070],
-    [50.6088970, -1.1917340],
-    [50.6087200, -1.1917370],
-    [50.6086990, -1.1919130],
-    [50.6086780, -1.1920890],
-    [50.6086580, -1.1922650],
-    [50.6086950, -1.1923930],
-    [50.6088720, -1.1924080],
-    [50.6090480, -1.1924220],
-    [50.6091880, -1.1925260],
-    [50.6093240, -1.1926400],
-    [50.6094600, -1.1927540],
-    [50.6095960, -1.1928670],
-    [50.6097320, -1.1929810],
-    [50.6098680, -1.1930950],
-    [50.6100040, -1.1932080],
-    [50.6100680, -1.1933650],
-    [50.6100810, -1.1935330],
-    [50.6099750, -1.1936750],
-    [50.6099390, -1.1938400],
-    [50.6099400, -1.1940170],
-    [50.6099410, -1.1941940],
-    [50.6099430, -1.1943710],
-    [50.6099440, -1.1945480],
-    [50.6099820, -1.1947210],
-    [50.6100220, -1.1948940],
-    [50.6100390, -1.1950620],
-    [50.6099450, -1.1952130],
-    [50.6098510, -1.1953630],
-    [50.6097510, -1.1954490],
-    [50.6096280, -1.1953210],
-    [50.6095050, -1.1951940],
-    [50.6093930, -1.1950570],
-    [50.6092930, -1.1949110],
-    [50.6092400, -1.1947440],
-    [50.6092000, -1.1945710],
-    [50.6091610, -1.1943990],
-    [50.6091850, -1.1942230],
-    [50.6091610, -1.1940480],
-    [50.6091350, -1.1938730],
-    [50.6091290, -1.1936960],
-    [50.6091270, -1.1935190],
-    [50.6091260, -1.1933420],
-    [50.6092470, -1.1932120],
-    [50.6091700, -1.1931490],
-    [50.6089950, -1.1931180],
-    [50.6088210, -1.1930880],
-    [50.6086460, -1.1930580],
-    [50.6085470, -1.1931860],
-    [50.6084790, -1.1933450],
-    [50.6084800, -1.1935220],
-    [50.6084810, -1.1936990],
-    [50.6086330, -1.1937840],
-    [50.6087900, -1.1938660],
-    [50.6088230, -1.1937450],
-    [50.6088180, -1.1935760],
-    [50.6086700, -1.1936730],
-    [50.6087330, -1.1937620],
-    [50.6088890, -1.1938470],
-    [50.6090440, -1.1939320],
-    [50.6090900, -1.1940730],
-    [50.6090340, -1.1942350],
-    [50.6089290, -1.1943770],
-    [50.6088230, -1.1945200],
-    [50.6087180, -1.1946620],
-    [50.6086120, -1.1948040],
-    [50.6085450, -1.1949650],
-    [50.6084950, -1.1951350],
-    [50.6085580, -1.1952980],
-    [50.6086410, -1.1953740],
-    [50.6087350, -1.1952370],
-    [50.6085770, -1.1951580],
-    [50.6085700, -1.1952970],
-    [50.6086360, -1.1954400],
-    [50.6087960, -1.1955180],
-    [50.6089570, -1.1954840],
-    [50.6091200, -1.1954140],
-    [50.6092510, -1.1952960],
-    [50.6093770, -1.1951720],
-    [50.6093560, -1.1952350],
-    [50.6092660, -1.1953870],
-    [50.6091750, -1.1955400],
-    [50.6090850, -1.1956920],
-    [50.6089950, -1.1958450],
-    [50.6089050, -1.1959970],
-    [50.6087400, -1.1960340],
-    [50.6085630, -1.1960530],
-    [50.6084390, -1.1961230],
-    [50.6084260, -1.1963000],
-    [50.6084130, -1.1964760],
-    [50.6084000, -1.1966530],
-    [50.6084930, -1.1967300],
-    [50.6086630, -1.1967110],
-    [50.6087930, -1.1965900],
-    [50.6089220, -1.1964690],
-    [50.6090520, -1.1963480],
-    [50.6091810, -1.1962270],
-    [50.6093100, -1.1961060],
-    [50.6094310, -1.1959770],
-    [50.6095450, -1.1958420],
-    [50.6096590, -1.1957060],
-    [50.6097730, -1.1955700],
-    [50.6098870, -1.1954340],
-]
+def interpolate_coordinates_np(xy, cumulative_length, num_points, total_length=None):
+    """
+    Array-backed equivalent of ``interpolate_coordinates``. Takes the cumulative segment lengths rather than the
+    segment lengths themselves, and keeps every vertex of ``xy`` in the output in the same position.
+    """
+    num_new_points = num_points - len(xy)
+    if total_length is None:
+        total_length = cumulative_length[-1]
+    distances = np.arange(num_new_points) / (num_new_points - 1) * total_length
+
+    # Index of the segment each distance falls in, matching the "advance while d > end of segment" scan
+    segments = np.searchsorted(cumulative_length, distances, side='left')
+    segment_starts = np.concatenate(([0.0], cumulative_length[:-1]))[segments]
+    segment_ends = cumulative_length[segments]
+    p = ((distances - segment_starts) / (segment_ends - segment_starts))[:, np.newaxis]
+    interpolated = xy[segments] * (1 - p) + xy[segments + 1] * p
+
+    # Vertex k is emitted just before the first interpolated point lying in segment k or later
+    xy_interp = np.empty((num_points, 2))
+    vertex_indices = np.arange(len(xy))
+    xy_interp[vertex_indices + np.searchsorted(segments, vertex_indices, side='left')] = xy
+    xy_interp[np.arange(num_new_points) + 1 + segments] = interpolated
+    return xy_interp
+
+
+def xy_to_lat_lon_np(xy, lat0, lon0):
+    lat = xy[:, 1] * 360 / EARTH_CIRCUM_M + lat0
+    lon = xy[:, 0] * 360 / EARTH_CIRCUM_M / np.cos(0.5 * (lat + lat0) * math.pi / 180) + lon0
+    return np.column_stack((lat, lon))
+
+
+def __getattr__(name):
+    # The DrongO vertices used to be a literal in this module; they now live in the shape store
+    if name == "example_lat_lons":
+        return shapes.load_lat_lons(shapes.DEFAULT_SHAPE)
+    raise AttributeError(f"module {__name__} has no attribute {name}")
+
 
 if __name__ == "__main__":
     print(make_gpx(10000, datetime.datetime.utcnow() - datetime.timedelta(days=1), datetime.timedelta(hours=1), 51, 0))
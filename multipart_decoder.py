@@ -1,6 +1,6 @@
+from __future__ import annotations
+import re
 import sys
-import email.parser
-from typing import Tuple
 
 
 def encode_with(string, encoding):
@@ -29,6 +29,8 @@ class NonMultipartContentTypeException(Exception):
 
 
 def _header_parser(string, encoding):
+    # Only the buffering decoder parses headers in full, so the email package is not loaded for streaming requests
+    import email.parser
     major = sys.version_info[0]
     if major == 3:
         string = string.decode(encoding)
@@ -39,6 +41,23 @@ def _header_parser(string, encoding):
     )
 
 
+def _find_boundary(content_type, encoding):
+    ct_info = tuple(x.strip() for x in content_type.split(';'))
+    mimetype = ct_info[0]
+    if mimetype.split('/')[0].lower() != 'multipart':
+        raise NonMultipartContentTypeException(
+            "Unexpected mimetype in content-type: '{}'".format(mimetype)
+        )
+    for item in ct_info[1:]:
+        attr, value = _split_on_find(
+            item,
+            '='
+        )
+        if attr.lower() == 'boundary':
+            return encode_with(value.strip('"'), encoding)
+    return None
+
+
 class BodyPart(object):
     """
 
@@ -107,24 +126,12 @@ class MultipartDecoder(object):
         #: Response body encoding
         self.encoding = encoding
         #: Parsed parts of the multipart response body
-        self.parts: Tuple[BodyPart] = tuple()
+        self.parts: tuple[BodyPart, ...] = tuple()
         self._find_boundary()
         self._parse_body(content)
 
     def _find_boundary(self):
-        ct_info = tuple(x.strip() for x in self.content_type.split(';'))
-        mimetype = ct_info[0]
-        if mimetype.split('/')[0].lower() != 'multipart':
-            raise NonMultipartContentTypeException(
-                "Unexpected mimetype in content-type: '{}'".format(mimetype)
-            )
-        for item in ct_info[1:]:
-            attr, value = _split_on_find(
-                item,
-                '='
-            )
-            if attr.lower() == 'boundary':
-                self.boundary = encode_with(value.strip('"'), self.encoding)
+        self.boundary = _find_boundary(self.content_type, self.encoding)
 
     @staticmethod
     def _fix_first_part(part, boundary_marker):
@@ -149,3 +156,130 @@ class MultipartDecoder(object):
 
         parts = content.split(b''.join((b'\r\n', boundary)))
         self.parts = tuple(body_part(x) for x in parts if test_part(x))
+
+
+_field_name_re = re.compile(br'\bname="([^"]*)"')
+_file_name_re = re.compile(br'\bfilename="([^"]*)"')
+
+
+class StreamingBodyPart(object):
+    """
+
+    A lazily decoded subpart of a multipart body, created by
+    ``StreamingMultipartDecoder``. ``content`` is a ``memoryview`` into the
+    original body, so no bytes are copied until ``text`` is read, and
+    ``headers`` are only parsed on first access.
+
+    """
+
+    def __init__(self, raw_headers, content, encoding):
+        self.encoding = encoding
+        self.raw_headers = raw_headers
+        self.content = content
+        self._headers = None
+
+    @property
+    def name(self):
+        """
+        The form field name from the ``Content-Disposition`` header, as
+        ``str``. Bytes which are not in ``encoding`` are replaced, so a
+        malformed name matches no field rather than failing.
+        """
+        match = _field_name_re.search(self.raw_headers)
+        return match.group(1).decode(self.encoding, 'replace') if match else None
+
+    @property
+    def filename(self):
+        """
+        The uploaded file name from the ``Content-Disposition`` header, as
+        ``str``, with bytes which are not in ``encoding`` replaced.
+        """
+        match = _file_name_re.search(self.raw_headers)
+        return match.group(1).decode(self.encoding, 'replace') if match else None
+
+    @property
+    def headers(self):
+        """Parsed headers, as ``(name, value)`` bytes pairs."""
+        if self._headers is None:
+            self._headers = tuple(_header_parser(self.raw_headers, self.encoding)) if self.raw_headers else ()
+        return self._headers
+
+    @property
+    def text(self):
+        """Content of the ``StreamingBodyPart`` in unicode."""
+        return str(self.content, self.encoding)
+
+
+class StreamingMultipartDecoder(object):
+    """
+
+    The ``StreamingMultipartDecoder`` walks a multipart body with ``find``
+    offsets instead of splitting it, and yields ``StreamingBodyPart`` objects
+    as it goes. Part contents are ``memoryview`` slices of the original body,
+    so each upload is held in memory once, and only the fields that are asked
+    for are decoded::
+
+        decoder = StreamingMultipartDecoder(content, content_type)
+        fields = decoder.get_fields(('controlcode', 'originalfile'))
+
+    """
+    def __init__(self, content, content_type, encoding='utf-8'):
+        #: Original Content-Type header
+        self.content_type = content_type
+        #: Response body encoding
+        self.encoding = encoding
+        #: Multipart body, as bytes
+        self.content = content
+        self.boundary = _find_boundary(content_type, encoding)
+
+    def iter_parts(self):
+        """Yield each part of the body in order, without copying its content."""
+        content = self.content
+        view = memoryview(content)
+        delimiter = b''.join((b'--', self.boundary))
+        next_delimiter = b''.join((b'\r\n', delimiter))
+
+        position = content.find(delimiter)
+        if position < 0:
+            return
+        position += len(delimiter)
+        while content[position:position + 2] != b'--':
+            end = content.find(next_delimiter, position)
+            if end < 0:
+                end = len(content)
+            header_end = content.find(b'\r\n\r\n', position, end)
+            if header_end < 0:
+                raise ImproperBodyPartContentException(
+                    'content does not contain CR-LF-CR-LF'
+                )
+            yield StreamingBodyPart(
+                content[position:header_end].lstrip(),
+                view[header_end + 4:end],
+                self.encoding
+            )
+            if end == len(content):
+                return
+            position = end + len(next_delimiter)
+
+    def get_parts(self, names):
+        """
+        Return a dict of the first part of each form field in ``names``
+        which is present in the body, without decoding their content.
+        Parsing stops once all of them have been found.
+        """
+        wanted = set(names)
+        parts = {}
+        for part in self.iter_parts():
+            name = part.name
+            if name in wanted and name not in parts:
+                parts[name] = part
+                if len(parts) == len(wanted):
+                    break
+        return parts
+
+    def get_fields(self, names):
+        """
+        Return a dict of the text of each form field in ``names`` which is
+        present in the body. Parsing stops once all of them have been found.
+        """
+        return {name: part.text for name, part in self.get_parts(names).items()}
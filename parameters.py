@@ -0,0 +1,114 @@
+import datetime
+import re
+
+
+class Parameter:
+    """
+    One request parameter: how to parse it from its string value, and the checks the parsed value must pass. Each
+    check is a ``(predicate, description)`` pair, and a failed check is reported as "<name> must be
+    <description>". A missing parameter takes ``default``, which is not checked, unless it is ``required``.
+    """
+    def __init__(self, name: str, parse=str, type_description: str = None, default=None, required: bool = False,
+                 checks=(), missing_message: str = None):
+        self.name = name
+        self.parse = parse
+        self.type_description = type_description
+        self.default = default
+        self.required = required
+        self.checks = tuple(checks)
+        self.missing_message = missing_message or f"Missing required parameter {name}"
+
+
+def at_least(bound):
+    return lambda v: v >= bound, f">= {bound}"
+
+
+def at_most(bound):
+    return lambda v: v <= bound, f"<= {bound}"
+
+
+def greater_than(bound):
+    return lambda v: v > bound, f"> {bound}"
+
+
+def one_of(choices, sort: bool = False):
+    """
+    Check that a value is one of ``choices``, which may be a function returning them if they are only known when
+    a request is handled
+    """
+    get_choices = choices if callable(choices) else lambda: choices
+
+    def description():
+        values = get_choices()
+        return "one of " + ", ".join(sorted(values) if sort else values)
+    return lambda v: v in get_choices(), description
+
+
+_TIMESTAMP_RE = re.compile(r'^(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})(\d{2})?$')
+
+
+def parse_timestamp(value: str) -> datetime.datetime:
+    """Parse ``YYYYMMDDHHMM`` or ``YYYYMMDDHHMMSS`` with one regex match, raising ``ValueError`` if it is invalid"""
+    match = _TIMESTAMP_RE.match(value)
+    if match is None:
+        raise ValueError(value)
+    return datetime.datetime(*[int(g) for g in match.groups() if g is not None])
+
+
+def compile_schema(parameters, rules=()):
+    """
+    Compile a list of ``Parameter`` into a function taking a dict of string values, such as query parameters or
+    form fields, and returning ``(values, errors)``: the parsed values by parameter name, and a list of every
+    invalid parameter.
+
+    ``rules`` are checks across several parameters, only run once every parameter is valid so that a rejected
+    request never pays for them. Each is called in turn with the dict of parsed values, may add derived values to
+    it, and returns an error message, which stops the remaining rules, or ``None``.
+    """
+    validators = tuple(_compile_parameter(p) for p in parameters)
+    rules = tuple(rules)
+
+    def validate(query):
+        query = query or {}
+        values = {}
+        errors = []
+        for validator in validators:
+            validator(query, values, errors)
+        if not errors:
+            for check in rules:
+                error = check(values)
+                if error is not None:
+                    errors.append(error)
+                    break
+        return values, errors
+    return validate
+
+
+def _compile_parameter(parameter: Parameter):
+    name = parameter.name
+    parse = parameter.parse
+    default = parameter.default
+    required = parameter.required
+    missing_message = parameter.missing_message
+    type_message = f"{name} {parameter.type_description}"
+    checks = parameter.checks
+
+    def validate(query, values, errors):
+        raw = query.get(name)
+        if raw is None:
+            if required:
+                errors.append(missing_message)
+            else:
+                values[name] = default
+            return
+        try:
+            value = parse(raw)
+        except ValueError:
+            errors.append(type_message)
+            return
+        for predicate, description in checks:
+            if not predicate(value):
+                errors.append(f"{name} must be {description() if callable(description) else description}")
+                return
+        values[name] = value
+    return validate
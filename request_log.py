@@ -0,0 +1,327 @@
+import functools
+import io
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+import compression
+
+# Fraction of successful requests which are logged; failed requests are always logged
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1"))
+# Longest query parameter or header value logged, and longest log line, in characters
+LOG_MAX_VALUE_LENGTH = int(os.environ.get("LOG_MAX_VALUE_LENGTH", "200"))
+LOG_MAX_LINE_LENGTH = int(os.environ.get("LOG_MAX_LINE_LENGTH", "4096"))
+
+REDACTED_HEADERS = frozenset(('authorization', 'cookie', 'x-api-key'))
+
+# Where stage timings and counters are sent, any of "headers" (Server-Timing and X-Metrics response headers) and
+# "emf" (a CloudWatch embedded metric format log line); a request can also ask for headers with METRICS_HEADER
+METRICS = frozenset(m.strip() for m in os.environ.get("METRICS", "").split(',') if m.strip())
+METRICS_HEADER = 'x-drongo-metrics'
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "DrongoGPX")
+
+# Profile every request with "cpu" (cProfile) or "memory" (tracemalloc). With ALLOW_PROFILE_HEADER set, a request
+# can also ask to be profiled with PROFILE_HEADER, which is off by default as profiling slows the request down.
+PROFILE = os.environ.get("PROFILE", "")
+ALLOW_PROFILE_HEADER = os.environ.get("ALLOW_PROFILE_HEADER", "") == "1"
+PROFILE_HEADER = 'x-drongo-profile'
+PROFILE_MODES = ('cpu', 'memory')
+PROFILE_TOP = 25
+# tracemalloc traces the whole process, so memory-profiled requests handled at once by the local server take turns
+_memory_profile_lock = threading.Lock()
+
+# The log of the request being handled by each thread, and the stack of stages it is inside. Lambda handles one
+# request at a time in each process, but the local server handles many at once, and the worker threads of a batch
+# time stages for the request which started them (see ``bind``).
+_threads = threading.local()
+
+
+class RequestLog:
+    """
+    One structured log line for a request: a redacted summary of the event, the response status and size, the
+    time spent in each stage of handling it and any counters. Stages and counters may be added to from several
+    threads at once, by the workers of a batch.
+    """
+    def __init__(self, handler_name: str, event: dict, context=None):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self.handler_name = handler_name
+        self.fields = {'handler': handler_name}
+        request_id = getattr(context, 'aws_request_id', None)
+        if request_id is not None:
+            self.fields['request_id'] = request_id
+        self.fields['request'] = summarise_event(event)
+
+    def finish(self, response=None, error: Exception = None, body_length: int = None):
+        self.fields['duration_ms'] = round((time.perf_counter() - self.start) * 1000, 3)
+        self.fields['stages_ms'] = self.stages_ms()
+        if self.counters:
+            self.fields['counters'] = self.counters
+        if response is not None:
+            if body_length is None:
+                body_length = len(response.get('body') or '')
+            self.fields['response'] = {'status': response.get('statusCode'), 'body_length': body_length}
+        if error is not None:
+            self.fields['error'] = truncate(f"{type(error).__name__}: {error}")
+
+        failed = error is not None or response is None or response.get('statusCode', 200) >= 400
+        if failed or random.random() < LOG_SAMPLE_RATE:
+            print(format_line(self.fields))
+        if 'emf' in METRICS:
+            print(json.dumps(self.emf(), separators=(',', ':')))
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def stages_ms(self) -> dict:
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+    def metric_headers(self) -> dict:
+        """Stage timings as a standard ``Server-Timing`` header, shown by browser developer tools, and counters"""
+        headers = {
+            'Server-Timing': ', '.join(f"{name};dur={ms}" for name, ms in self.stages_ms().items()),
+            'X-Metrics': ', '.join(f"{name}={value}" for name, value in self.counters.items()),
+        }
+        return {k: v for k, v in headers.items() if v}
+
+    def emf(self) -> dict:
+        """Stage timings and counters as a CloudWatch embedded metric format document, with a handler dimension"""
+        metrics = [{'Name': f"{name}_ms", 'Unit': 'Milliseconds'} for name in self.stages]
+        metrics.append({'Name': 'duration_ms', 'Unit': 'Milliseconds'})
+        metrics += [{'Name': name, 'Unit': 'Bytes' if name.endswith('bytes') else 'Count'} for name in self.counters]
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{'Namespace': METRICS_NAMESPACE, 'Dimensions': [['handler']],
+                                       'Metrics': metrics}],
+            },
+            'handler': self.handler_name,
+            'duration_ms': self.fields.get('duration_ms'),
+        }
+        document.update((f"{name}_ms", ms) for name, ms in self.stages_ms().items())
+        document.update(self.counters)
+        return document
+
+
+def summarise_event(event: dict) -> dict:
+    """The parts of an API Gateway proxy event worth logging, with the body replaced by its size"""
+    headers = {}
+    for k, v in (event.get('headers') or {}).items():
+        headers[k] = '[redacted]' if k.lower() in REDACTED_HEADERS else truncate(v)
+    return {
+        'method': event.get('httpMethod'),
+        'path': event.get('path'),
+        'query': {k: truncate(v) for k, v in (event.get('queryStringParameters') or {}).items()},
+        'headers': headers,
+        'body_length': len(event.get('body') or ''),
+        'base64': bool(event.get('isBase64Encoded')),
+    }
+
+
+def truncate(value, max_length: int = None):
+    max_length = max_length or LOG_MAX_VALUE_LENGTH
+    value = str(value)
+    return value if len(value) <= max_length else value[:max_length] + '...'
+
+
+def format_line(fields: dict) -> str:
+    """Serialise a log line, dropping the request headers and then the query if it is still too long"""
+    line = json.dumps(fields, separators=(',', ':'), default=str)
+    for key in ('headers', 'query'):
+        if len(line) <= LOG_MAX_LINE_LENGTH:
+            break
+        request = dict(fields['request'])
+        request[key] = '[truncated]'
+        fields = dict(fields, request=request)
+        line = json.dumps(fields, separators=(',', ':'), default=str)
+    return line
+
+
+def logged(handler_name: str):
+    """
+    Decorate a Lambda handler to log each request it handles, with the stages timed by ``stage`` and the counters
+    added by ``count``, and to add metrics and profiles as configured.
+
+    A response with a streamed body (see ``compression.make_response``) is logged once the body has been sent,
+    with the time spent generating it as a ``streaming`` stage, but its metric headers only have the stages before
+    it. A profiled request is not streamed, so that the profile covers generating the body.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            log = _threads.log = RequestLog(handler_name, event, context)
+            profile = Profile(profile_mode(event))
+            try:
+                with profile:
+                    response = handler(event, context)
+                    if profile.mode is not None and 'bodyChunks' in response:
+                        response = compression.join_body(response)
+            except Exception as e:
+                log.finish(error=e)
+                raise
+            finally:
+                _threads.log = None
+            if profile.peak_memory_bytes is not None:
+                log.counters['peak_memory_bytes'] = profile.peak_memory_bytes
+            if profile.report is not None:
+                print(json.dumps({'handler': handler_name, 'request_id': log.fields.get('request_id'),
+                                  'profile': profile.mode, 'report': profile.report}))
+            if 'headers' in METRICS or compression.get_header(event, METRICS_HEADER):
+                response = dict(response, headers=dict(response.get('headers') or {}, **log.metric_headers()))
+            if 'bodyChunks' in response:
+                return dict(response, bodyChunks=_logged_chunks(log, response))
+            if isinstance(response.get('body'), str):
+                log.counters['response_bytes'] = len(response['body'])
+            log.finish(response)
+            return response
+        return wrapper
+    return decorator
+
+
+def _logged_chunks(log: RequestLog, response: dict):
+    """Generate a streamed body in the request's log, which is finished once the body is sent or abandoned"""
+    sent = 0
+    error = None
+    chunks = iter(response['bodyChunks'])
+    try:
+        while True:
+            _threads.log = log
+            try:
+                with stage('streaming'):
+                    chunk = next(chunks, None)
+            finally:
+                _threads.log = None
+            if chunk is None:
+                break
+            sent += len(chunk)
+            yield chunk
+    except GeneratorExit:
+        # The client went away, or did not want the body, before all of it was sent
+        log.fields['body_incomplete'] = True
+        raise
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        log.counters['response_bytes'] = sent
+        log.finish(response, error, body_length=sent)
+
+
+def profile_mode(event: dict):
+    mode = PROFILE
+    if ALLOW_PROFILE_HEADER:
+        mode = compression.get_header(event, PROFILE_HEADER) or mode
+    return mode if mode in PROFILE_MODES else None
+
+
+class Profile:
+    """
+    Profile the code run inside it with cProfile (``mode="cpu"``) or tracemalloc (``mode="memory"``), or do
+    nothing if ``mode`` is ``None``. The profilers are only imported when they are used. As tracemalloc traces
+    every thread, only one memory profile runs at a time and others wait for it, though its peak can still
+    include allocations made by requests which are not profiled.
+    """
+    def __init__(self, mode):
+        self.mode = mode
+        self.report = None
+        self.peak_memory_bytes = None
+        self._profiler = None
+
+    def __enter__(self):
+        if self.mode == 'cpu':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.mode == 'memory':
+            import tracemalloc
+            _memory_profile_lock.acquire()
+            try:
+                tracemalloc.start()
+            except BaseException:
+                _memory_profile_lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.mode == 'cpu':
+            import pstats
+            self._profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            self.report = stream.getvalue()
+        elif self.mode == 'memory':
+            import tracemalloc
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                self.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+                _memory_profile_lock.release()
+            self.report = '\n'.join(str(s) for s in snapshot.statistics('lineno')[:PROFILE_TOP])
+        return False
+
+
+def current():
+    """The log of the request being handled by this thread, or ``None`` outside a logged handler"""
+    return getattr(_threads, 'log', None)
+
+
+def bind(fn):
+    """
+    ``fn`` wrapped to run in the log of the current request, to time the stages and counters of work handed to
+    another thread, such as the workers of a batch. The stage times of workers running at once are summed, so
+    like CPU time they can add up to more than the request's ``duration_ms``.
+    """
+    log = current()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        previous = current()
+        _threads.log = log
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _threads.log = previous
+    return run
+
+
+def count(name: str, value: int = 1):
+    """Add to a counter of the current request, such as the number of trackpoints. Outside a logged handler this
+    does nothing."""
+    log = current()
+    if log is not None:
+        log.add_count(name, value)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a stage of handling the current request. Time spent in a stage nested inside another, for example
+    computing coordinates while a lazily generated response is serialised, only counts towards the inner stage.
+    The same stage timed by several threads, such as the workers of a batch, is their total time (see ``bind``).
+    Outside a logged handler this does nothing.
+    """
+    log = current()
+    if log is None:
+        yield
+        return
+    stack = _threads.__dict__.setdefault('stack', [])
+    stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = stack.pop()
+        log.add_stage(name, elapsed - nested)
+        if stack:
+            stack[-1] += elapsed
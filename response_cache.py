@@ -0,0 +1,204 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import compression
+import request_log
+
+# Bump when a change to the code changes the response to the same request, so that old ETags stop matching
+RESPONSE_VERSION = "1"
+
+# Where whole responses are kept between requests to a warm Lambda: "memory", "disk" (RESPONSE_CACHE_DIR, which
+# on Lambda must be under /tmp) or "off". ETags and If-None-Match are handled whichever is chosen.
+RESPONSE_CACHE = os.environ.get("RESPONSE_CACHE", "memory")
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_DIR = os.environ.get("RESPONSE_CACHE_DIR", "/tmp/drongo-response-cache")
+
+
+def make_etag(key_parts, encoding=None) -> str:
+    """
+    A strong ETag for the response to a request, from the normalised parts of the request which determine it
+    and the content coding of the body, as a compressed body is a different representation. Parts which are
+    ``bytes`` or a ``memoryview`` of bytes are hashed as they are, and any others as JSON.
+    """
+    digest = hashlib.sha256()
+    for part in (RESPONSE_VERSION, os.environ.get("AWS_LAMBDA_FUNCTION_VERSION", ""), encoding or "identity",
+                 *key_parts):
+        if isinstance(part, (bytes, memoryview)):
+            data = part
+        else:
+            data = json.dumps(part, sort_keys=True, default=str).encode('utf8')
+        # Length prefixed, so that no two different lists of parts hash the same bytes
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return '"' + digest.hexdigest()[:40] + '"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Whether an ``If-None-Match`` header value matches ``etag``, using the weak comparison it calls for"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or (tag[2:] if tag.startswith('W/') else tag) == etag:
+            return True
+    return False
+
+
+def respond(event, key_parts, build, cache_control: str = None) -> dict:
+    """
+    Return the response ``build()`` makes for a request, identified by ``key_parts``, with an ``ETag`` and, if
+    given, ``Cache-Control`` header. A GET whose ``If-None-Match`` already has the ETag gets an empty 304 response,
+    and a successful response already in the cache is returned without calling ``build``. A streamed body is
+    cached once it has all been sent.
+    """
+    encoding = compression.choose_encoding(compression.get_header(event, 'accept-encoding'))
+    etag = make_etag(key_parts, encoding)
+    headers = {'ETag': etag}
+    if cache_control is not None:
+        headers['Cache-Control'] = cache_control
+
+    # A conditional request with another method is a precondition rather than revalidation, which is not supported
+    if event.get('httpMethod', 'GET') in ('GET', 'HEAD') and \
+            etag_matches(compression.get_header(event, 'if-none-match'), etag):
+        request_log.count('not_modified')
+        return {'statusCode': 304, 'body': '', 'headers': dict(headers, Vary='Accept-Encoding')}
+
+    response = _cache.get(etag) if _cache is not None else None
+    if response is not None:
+        request_log.count('response_cache_hits')
+    else:
+        response = build()
+        if response['statusCode'] != 200:
+            return response
+        if _cache is not None:
+            request_log.count('response_cache_misses')
+            if 'bodyChunks' in response:
+                response = dict(response, bodyChunks=_cache_streamed(etag, response))
+            else:
+                _cache.put(etag, response)
+    return dict(response, headers=dict(response.get('headers') or {}, **headers))
+
+
+def _cache_streamed(etag: str, response: dict):
+    """
+    Pass on the chunks of a streamed body, keeping a copy to cache as a whole response once the body is complete,
+    unless it grows too big to cache
+    """
+    kept = []
+    size = 0
+    for chunk in response['bodyChunks']:
+        if kept is not None:
+            size += len(chunk)
+            if size <= _cache.max_bytes:
+                kept.append(chunk)
+            else:
+                kept = None
+        yield chunk
+    if kept is not None:
+        _cache.put(etag, {'statusCode': response['statusCode'], 'headers': response['headers'],
+                          'body': base64.b64encode(b''.join(kept)).decode('ascii'), 'isBase64Encoded': True})
+
+
+def _response_size(response: dict) -> int:
+    return len(response.get('body') or '') + sum(len(k) + len(v) for k, v in response.get('headers', {}).items())
+
+
+class MemoryResponseCache:
+    """Least recently used responses held in the process, up to a total size"""
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str):
+        with self._lock:
+            response = self._entries.get(etag)
+            if response is not None:
+                self._entries.move_to_end(etag)
+            return response
+
+    def put(self, etag: str, response: dict):
+        size = _response_size(response)
+        with self._lock:
+            if size > self.max_bytes or etag in self._entries:
+                return
+            self._entries[etag] = response
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= _response_size(evicted)
+
+
+class DiskResponseCache:
+    """
+    Responses kept as files in a directory, such as Lambda's ``/tmp`` which outlives the process while its
+    execution environment is reused. Reading a response marks it as used, and the least recently used files are
+    deleted when the directory grows beyond its size limit.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+        if self.size_bytes > max_bytes:
+            self._evict()
+
+    def _path(self, etag: str) -> str:
+        return os.path.join(self.directory, etag.strip('"') + '.json')
+
+    def get(self, etag: str):
+        path = self._path(etag)
+        try:
+            with open(path, 'r') as f:
+                response = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return response
+
+    def put(self, etag: str, response: dict):
+        data = json.dumps(response, separators=(',', ':'))
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(etag)
+        with self._lock:
+            # A response is only ever cached under the ETag of its own content, so one already written is the same
+            if os.path.exists(path):
+                return
+            # Write then rename, so a reader never sees a partly written file
+            with open(path + '.partial', 'w') as f:
+                f.write(data)
+            os.replace(path + '.partial', path)
+            self.size_bytes += len(data)
+            if self.size_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted((e for e in os.scandir(self.directory) if e.is_file() and e.name.endswith('.json')),
+                         key=lambda e: e.stat().st_mtime)
+        self.size_bytes = sum(e.stat().st_size for e in entries)
+        for entry in entries:
+            if self.size_bytes <= self.max_bytes:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self.size_bytes -= size
+
+
+def _make_cache():
+    if RESPONSE_CACHE == "memory":
+        return MemoryResponseCache(RESPONSE_CACHE_MAX_BYTES)
+    if RESPONSE_CACHE == "disk":
+        return DiskResponseCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_BYTES)
+    return None
+
+
+_cache = _make_cache()
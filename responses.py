@@ -0,0 +1,76 @@
+import base64
+import json
+import os
+from collections import deque
+import request_log
+
+# Threads rendering the files of a batch ZIP, or by default as many as ThreadPoolExecutor chooses
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "0")) or None
+
+
+def get_body(event) -> bytes:
+    """The body of an API Gateway proxy event as bytes, decoding it if API Gateway base64 encoded it"""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        return base64.b64decode(body)
+    return body.encode('utf8')
+
+
+def make_error_response(status_code: int, message: str, errors=None, headers: dict = None) -> dict:
+    """
+    A JSON error response with a ``message`` and, if given, the list of ``errors`` it summarises, the shape every
+    error response of the API has
+    """
+    body = {"message": message}
+    if errors is not None:
+        body["errors"] = errors
+    return {
+        'statusCode': status_code,
+        'body': json.dumps(body),
+        'headers': dict(headers or {}, **{'Content-Type': 'application/json'})
+    }
+
+
+def make_bad_request_response(message: str, errors=None) -> dict:
+    return make_error_response(400, message, errors)
+
+
+def make_zip_response(data: bytes, filename: str) -> dict:
+    """A response downloading the ZIP archive ``data`` as ``filename``"""
+    return {
+        'statusCode': 200,
+        'body': base64.b64encode(data).decode('ascii'),
+        'isBase64Encoded': True,
+        'headers': {
+            'Content-Type': 'application/zip',
+            'Content-Disposition': "attachment; filename=" + filename
+        }
+    }
+
+
+def write_zip(sink, files, render, max_workers: int = BATCH_WORKERS, executor_class=None):
+    """
+    Write a ZIP archive to ``sink`` with a file for each ``(name, args)`` of ``files``, holding the bytes returned
+    by ``render(*args)``. Files are rendered in a pool of workers; only a few files per worker are rendered ahead
+    of the one being added to the archive, so memory stays bounded however many there are.
+
+    ``executor_class`` defaults to ``ThreadPoolExecutor``, whose workers render in the log of the current request.
+    With ``ProcessPoolExecutor`` the worker processes cannot add to that log, so their stages and counters are
+    not recorded, and ``render`` and its arguments must be picklable.
+    """
+    import zipfile
+    from concurrent.futures import ThreadPoolExecutor
+    if executor_class is None:
+        executor_class = ThreadPoolExecutor
+    window = 2 * (max_workers or os.cpu_count() or 1)
+    if issubclass(executor_class, ThreadPoolExecutor):
+        render = request_log.bind(render)
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive, executor_class(max_workers) as executor:
+        pending = deque()
+        for name, args in files:
+            pending.append((name, executor.submit(render, *args)))
+            if len(pending) >= window:
+                name, future = pending.popleft()
+                archive.writestr(name, future.result())
+        for name, future in pending:
+            archive.writestr(name, future.result())
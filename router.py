@@ -0,0 +1,72 @@
+import importlib
+import request_log
+import responses
+
+# The handler for each resource and method of the API, as (module, function). A module is only imported when a
+# request for one of its routes first arrives, so a warm function only pays for loading the tools it has used.
+ROUTES = {
+    '/gpx': {'GET': ('make_gpx', 'handler')},
+    '/gpx/batch': {'POST': ('make_gpx', 'batch_handler')},
+    '/shiftpurplepen': {'POST': ('shift_purple_pen', 'handler')},
+    '/shiftpurplepen/batch': {'POST': ('shift_purple_pen', 'batch_handler')},
+}
+
+_handlers = {}
+
+
+def handler(event, context):
+    """
+    The one Lambda handler for the whole API, which passes each API Gateway proxy event to the handler for its
+    resource and method. A HEAD request is routed as a GET.
+    """
+    methods = find_methods(event)
+    if methods is None:
+        return not_found(event, context)
+    method = event.get('httpMethod') or 'GET'
+    target = methods.get('GET' if method == 'HEAD' else method)
+    if target is None:
+        return method_not_allowed(event, context)
+    return get_handler(target)(event, context)
+
+
+def get_handler(target):
+    """The handler function for a ``(module, function)`` route target, importing its module the first time"""
+    if target not in _handlers:
+        module_name, function_name = target
+        _handlers[target] = getattr(importlib.import_module(module_name), function_name)
+    return _handlers[target]
+
+
+def preload():
+    """Import the handlers of every route now, for a long-lived server whose first requests should not wait"""
+    for methods in ROUTES.values():
+        for target in methods.values():
+            get_handler(target)
+
+
+def find_methods(event):
+    """
+    The routes of the event's resource, by method, or ``None`` if it has none. The resource template is used as
+    given by API Gateway, falling back to the path, which is all a local server has.
+    """
+    for path in (event.get('resource'), event.get('path')):
+        if path:
+            methods = ROUTES.get(path.rstrip('/') or '/')
+            if methods is not None:
+                return methods
+    return None
+
+
+@request_log.logged('not_found')
+def not_found(event, context):
+    return responses.make_error_response(404, f"No such resource {event.get('path')}")
+
+
+@request_log.logged('method_not_allowed')
+def method_not_allowed(event, context):
+    methods = find_methods(event)
+    # A HEAD request is answered wherever a GET is
+    methods = sorted([*methods, 'HEAD'] if 'GET' in methods else methods)
+    return responses.make_error_response(405, f"Method {event.get('httpMethod')} is not allowed, use "
+                                              + " or ".join(methods),
+                                         headers={'Allow': ", ".join(methods)})
@@ -0,0 +1,204 @@
+"""
+Serve the API over HTTP without AWS, for a long-lived container or for load testing locally:
+
+    python server.py                                # http://127.0.0.1:8080
+    python server.py --host 0.0.0.0 --workers 32    # in a container
+
+Each request is turned into an API Gateway proxy event for ``router.handler``, so it is validated, cached and
+logged exactly as on Lambda. Every tool is imported at start up rather than on its first request. Connections are
+kept alive between requests and served by a fixed pool of worker threads, and GPX and PurplePen bodies are
+generated and compressed as they are sent, with chunked transfer encoding.
+"""
+import argparse
+import base64
+import os
+import signal
+import sys
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
+import responses
+import router
+
+SERVER_HOST = os.environ.get("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", "8080"))
+# Each open connection has a worker to itself while it is kept alive, so this also limits concurrent connections;
+# further connections wait for a worker
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", "16"))
+# Seconds an idle connection is kept open for another request before its worker is freed
+KEEP_ALIVE_TIMEOUT = float(os.environ.get("KEEP_ALIVE_TIMEOUT", "5"))
+# Largest request body accepted, enough for the biggest batch of PurplePen files
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", str(128 * 1024 * 1024)))
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "1") == "1"
+
+
+def make_event(method: str, target: str, headers, body: bytes, stream: bool = STREAM_RESPONSES) -> dict:
+    """
+    An API Gateway proxy event for a request. As in API Gateway, a repeated query parameter or header takes its
+    last value; header names are lower case, as HTTP/2 clients send them. A body which is not UTF-8 text is base64
+    encoded. The response to a HEAD request is not streamed, so that it has the ``Content-Length`` a GET would.
+    """
+    url = urlsplit(target)
+    event = {
+        'httpMethod': method,
+        'path': url.path,
+        'queryStringParameters': dict(parse_qsl(url.query, keep_blank_values=True)) or None,
+        'headers': {name.lower(): value for name, value in headers.items()},
+        'body': None,
+        'isBase64Encoded': False,
+        'streamBody': stream and method != 'HEAD',
+    }
+    if body:
+        try:
+            event['body'] = body.decode('utf8')
+        except UnicodeDecodeError:
+            event['body'] = base64.b64encode(body).decode('ascii')
+            event['isBase64Encoded'] = True
+    return event
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "drongo-gpx"
+    # Read by StreamRequestHandler as the socket timeout, which ends an idle kept-alive connection
+    timeout = KEEP_ALIVE_TIMEOUT
+
+    def do_GET(self):
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.send_error_response(411, "Request body must have a Content-Length")
+            return
+        # Digits only, as a sign or anything else is not a valid length and a negative one would read until timeout
+        length = self.headers.get('Content-Length', '').strip() or '0'
+        if not (length.isascii() and length.isdigit()):
+            self.send_error_response(400, "Content-Length must be a whole number of bytes")
+            return
+        length = int(length)
+        if length > MAX_REQUEST_BYTES:
+            self.send_error_response(413, f"Request body must be at most {MAX_REQUEST_BYTES} bytes")
+            return
+        body = self.rfile.read(length) if length else b''
+
+        event = make_event(self.command, self.path, self.headers, body)
+        try:
+            response = router.handler(event, SimpleNamespace(aws_request_id=str(uuid.uuid4())))
+        except Exception:
+            # The request log already has the error, as on Lambda the traceback goes to the output
+            traceback.print_exc()
+            response = responses.make_error_response(500, "Internal server error")
+        self.send_api_response(response)
+
+    do_HEAD = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_GET
+
+    def send_error_response(self, status_code: int, message: str):
+        # The body may not have been read, so the connection cannot be used for another request
+        self.close_connection = True
+        response = responses.make_error_response(status_code, message, headers={'Connection': 'close'})
+        self.send_api_response(response)
+
+    def send_api_response(self, response: dict):
+        status_code = response['statusCode']
+        self.send_response(status_code)
+        for name, value in (response.get('headers') or {}).items():
+            self.send_header(name, value)
+        has_body = self.command != 'HEAD' and status_code >= 200 and status_code not in (204, 304)
+
+        if 'bodyChunks' in response:
+            self.send_streamed_body(response['bodyChunks'], has_body)
+            return
+        body = response.get('body') or ''
+        data = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode('utf8')
+        if status_code not in (204, 304):
+            self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if has_body:
+            self.wfile.write(data)
+
+    def send_streamed_body(self, chunks, has_body: bool):
+        """Send a body as it is generated, chunked if the client understands it and otherwise until closing"""
+        chunked = self.request_version != 'HTTP/1.0'
+        try:
+            if not has_body:
+                self.end_headers()
+                return
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            self.end_headers()
+            for chunk in chunks:
+                if chunk:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        finally:
+            # Stop generating the body if it was not all sent, which also finishes its request log
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    def log_request(self, code='-', size='-'):
+        # Each request is already logged as a JSON line by request_log
+        pass
+
+    def log_error(self, format, *args):
+        # An idle kept-alive connection timing out is how it is meant to end
+        if not format.startswith("Request timed out"):
+            super().log_error(format, *args)
+
+
+class PooledHTTPServer(HTTPServer):
+    """An HTTP server which handles each connection on one of a fixed pool of worker threads"""
+    def __init__(self, server_address, handler_class, workers: int):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='drongo-server')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_in_worker, request, client_address)
+
+    def process_request_in_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except ConnectionError:
+            # The client went away, which the request log of a response it did not wait for already records
+            pass
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=SERVER_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS,
+                        help="worker threads, which is also the most connections served at once")
+    parser.add_argument("--keep-alive", type=float, default=KEEP_ALIVE_TIMEOUT,
+                        help="seconds to keep an idle connection open for another request")
+    args = parser.parse_args()
+
+    RequestHandler.timeout = args.keep_alive
+    router.preload()
+    server = PooledHTTPServer((args.host, args.port), RequestHandler, args.workers)
+    # Let in-flight requests finish when a container is stopped
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import os
+import re
+import sys
+from array import array
+
+# Each shape is stored as <name>.f64 in this directory: little-endian float64 values, lat and lon interleaved
+SHAPES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shapes")
+SHAPE_FILE_EXTENSION = ".f64"
+DEFAULT_SHAPE = "drongo"
+
+_available_shapes = None
+
+
+def available_shapes() -> frozenset:
+    """Names of all shapes in the store, read from the directory listing once per process"""
+    global _available_shapes
+    if _available_shapes is None:
+        _available_shapes = frozenset(
+            f[:-len(SHAPE_FILE_EXTENSION)] for f in os.listdir(SHAPES_DIR) if f.endswith(SHAPE_FILE_EXTENSION)
+        )
+    return _available_shapes
+
+
+def shape_path(name: str) -> str:
+    return os.path.join(SHAPES_DIR, name + SHAPE_FILE_EXTENSION)
+
+
+def load_lat_lons(name: str):
+    """Load the ``[lat, lon]`` vertices of the shape called ``name`` from the store"""
+    if name not in available_shapes():
+        raise KeyError(f"Unknown shape {name}")
+    values = array('d')
+    with open(shape_path(name), 'rb') as f:
+        values.frombytes(f.read())
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return [[values[i], values[i + 1]] for i in range(0, len(values), 2)]
+
+
+def save_lat_lons(name: str, lat_lons):
+    """Compile a list of ``[lat, lon]`` vertices into the store as the shape called ``name``"""
+    values = array('d', (v for lat_lon in lat_lons for v in lat_lon))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    with open(shape_path(name), 'wb') as f:
+        values.tofile(f)
+    global _available_shapes
+    _available_shapes = None
+
+
+_TRKPT_RE = re.compile(r'<trkpt\s+lat="(-?[\d\.]+)"\s+lon="(-?[\d\.]+)"')
+
+
+def lat_lons_from_gpx(gpx_xml: str):
+    """Extract the trackpoint coordinates from a GPX document, to use as a new shape"""
+    return [[float(lat), float(lon)] for lat, lon in _TRKPT_RE.findall(gpx_xml)]
+
+
+if __name__ == "__main__":
+    # Usage: python shapes.py <shape name> <track.gpx>
+    shape_name, gpx_file = sys.argv[1:3]
+    with open(gpx_file, 'r') as f:
+        save_lat_lons(shape_name, lat_lons_from_gpx(f.read()))
+    print(f"Saved {shape_name} to {shape_path(shape_name)}")
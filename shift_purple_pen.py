@@ -1,50 +1,305 @@
-import xml.etree.ElementTree as ET
+from __future__ import annotations
 import re
-import json
-from typing import Match, Tuple
-from multipart_decoder import MultipartDecoder
+import io
+import os
+import xml.etree.ElementTree as ET
+import zlib
+from itertools import chain
+from multipart_decoder import ImproperBodyPartContentException, NonMultipartContentTypeException, \
+    StreamingMultipartDecoder
+import compression
+import parameters
+import request_log
+import response_cache
+import responses
+from parameters import Parameter, one_of
+from responses import make_bad_request_response
 
 
+@request_log.logged('shift_purple_pen')
 def handler(event, context):
-    print(json.dumps(event))
-
-    content_type = event['headers']['content-type']
-    content: str = event['body']
-    multipart_data = MultipartDecoder(content.encode('utf8'), content_type)
-
-    control_code = None
-    ppen_xml_original = None
-    ppen_xml_shifted = None
-    for part in multipart_data.parts:
-        for h in part.headers:
-            for h_part in h:
-                if b'name="controlcode"' in h_part:
-                    control_code = part.text
-                if b'name="originalfile"' in h_part:
-                    ppen_xml_original = part.text
-                if b'name="shiftedfile"' in h_part:
-                    ppen_xml_shifted = part.text
-
-    # parameter: controlcode
-    if control_code is None:
-        return make_bad_request_response("Missing required parameter controlcode")
-
-    # ppen_xml
-    if ppen_xml_original is None:
-        return make_bad_request_response("Missing file upload for original file")
-    if ppen_xml_shifted is None:
-        return make_bad_request_response("Missing file upload for shifted file")
-
-    shifted_ppen = shift_ppen_from_files(ppen_xml_original, ppen_xml_shifted, control_code)
-
-    return {
-        'statusCode': 200,
-        'body': shifted_ppen,
-        'headers': {
-            'Content-Type': 'application/xml',
-            'Content-Disposition': "attachment; filename=what-a-pengalucious-course.ppen"
-        }
-    }
+    try:
+        with request_log.stage('decode'):
+            parts = read_form(event, SHIFT_FIELDS)
+    except InvalidFormException as e:
+        return make_bad_request_response(str(e))
+
+    # The fields are hashed as the bytes that were uploaded, which are only decoded if the response is not cached
+    key_parts = ['shiftpurplepen', *[parts[name].content if name in parts else None for name in SHIFT_FIELDS]]
+    return response_cache.respond(event, key_parts, lambda: make_shift_response(event, parts))
+
+
+def make_shift_response(event, parts: dict) -> dict:
+    try:
+        with request_log.stage('decode'):
+            fields = {name: read_text(name, part.content) for name, part in parts.items()}
+    except UnreadableFileException as e:
+        return make_bad_request_response(str(e))
+    with request_log.stage('shift'):
+        transform, errors = parse_shift_fields(fields)
+    if errors:
+        return make_bad_request_response("; ".join(errors), errors)
+    # The shifted file is generated as the response is compressed or sent. Its first chunk is generated here, which
+    # for all but the largest files checks every coordinate, so that one which cannot be read is a bad request.
+    chunks = _timed_chunks(iter_transformed_ppen(fields['originalfile'], transform))
+    try:
+        first_chunk = next(chunks)
+        with request_log.stage('serialization'):
+            return compression.make_response(event, chain((first_chunk,), chunks), {
+                'Content-Type': 'application/xml',
+                'Content-Disposition': "attachment; filename=what-a-pengalucious-course.ppen"
+            })
+    except InvalidCoordinateException as e:
+        return make_bad_request_response(str(e))
+
+
+def _timed_chunks(chunks):
+    """Generate ``chunks`` with the time spent generating each counted towards the rewrite stage"""
+    chunks = iter(chunks)
+    while True:
+        with request_log.stage('rewrite'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+MAX_BATCH_FILES = 200
+# Uncompressed, as ZIP uploads are counted by what they expand to. A request and its response are each limited
+# to 6MB on Lambda, base64 encoded, and PurplePen files compress at least threefold, so the shifted files of a
+# batch this big still fit in the response.
+MAX_BATCH_BYTES = 12 * 1024 * 1024
+
+
+@request_log.logged('shift_purple_pen_batch')
+def batch_handler(event, context):
+    """
+    Shift many PurplePen files by the transform between one reference pair. Besides the fields of a single shift,
+    the request has any number of ``files`` parts, each a ``.ppen`` file or a ZIP of them, and the response is a
+    ZIP of the shifted files.
+    """
+    with request_log.stage('decode'):
+        try:
+            form = read_form(event)
+        except InvalidFormException as e:
+            return make_bad_request_response(str(e))
+
+        fields = {}
+        uploads = []
+        for part in form:
+            name = part.name
+            if name == 'files':
+                uploads.append((part.filename or 'course.ppen', part.content))
+            elif name in SHIFT_FIELDS and name not in fields:
+                try:
+                    fields[name] = read_text(name, part.content)
+                except UnreadableFileException as e:
+                    return make_bad_request_response(str(e))
+
+    with request_log.stage('shift'):
+        transform, errors = parse_shift_fields(fields)
+    if errors:
+        return make_bad_request_response("; ".join(errors), errors)
+
+    import zipfile
+    try:
+        files = list(iter_batch_files(uploads))
+    except zipfile.BadZipFile as e:
+        return make_bad_request_response(f"Could not read ZIP upload: {e}")
+    except (BatchTooLargeException, UnreadableFileException) as e:
+        return make_bad_request_response(str(e))
+    if len(files) == 0:
+        return make_bad_request_response("Missing file uploads for files to shift")
+    request_log.count('files', len(files))
+
+    sink = io.BytesIO()
+    try:
+        with request_log.stage('serialization'):
+            write_shifted_zip(sink, files, transform)
+    except (InvalidCoordinateException, UnreadableFileException) as e:
+        return make_bad_request_response(str(e))
+
+    return responses.make_zip_response(sink.getvalue(), "a-pengalucious-series.zip")
+
+
+# Form fields of a shift request which are read as text
+SHIFT_FIELDS = ('controlcode', 'originalfile', 'shiftedfile', 'transform')
+
+
+class InvalidFormException(Exception):
+    pass
+
+
+def read_form(event, names=None):
+    """
+    The parts of the multipart form a request uploads: the first part of each field in ``names``, by name, or a
+    list of every part if ``names`` is not given. Raises ``InvalidFormException`` if the request is not a
+    multipart form or its body cannot be split into parts.
+    """
+    content_type = compression.get_header(event, 'content-type')
+    if not content_type:
+        raise InvalidFormException("Request must have a multipart/form-data Content-Type")
+    content = responses.get_body(event)
+    request_log.count('upload_bytes', len(content))
+    try:
+        decoder = StreamingMultipartDecoder(content, content_type)
+        if decoder.boundary is None:
+            raise InvalidFormException("The multipart/form-data Content-Type must have a boundary")
+        return decoder.get_parts(names) if names is not None else list(decoder.iter_parts())
+    except NonMultipartContentTypeException:
+        raise InvalidFormException(f"Request must be a multipart/form-data upload, not {content_type}")
+    except ImproperBodyPartContentException as e:
+        raise InvalidFormException(f"Could not read the multipart form: {e}")
+
+
+TRANSLATE = 'translate'
+SIMILARITY = 'similarity'
+AFFINE = 'affine'
+# Kinds of transform that can be fitted to the reference controls, and how many controls each needs
+MIN_CONTROLS = {TRANSLATE: 1, SIMILARITY: 2, AFFINE: 3}
+
+
+def parse_control_codes(value: str):
+    """The comma separated control codes, each once in the order first given"""
+    return list(dict.fromkeys(c.strip() for c in value.split(',') if c.strip()))
+
+
+def _check_enough_controls(values: dict):
+    kind = values['transform']
+    if len(values['controlcode']) < MIN_CONTROLS[kind]:
+        return f"Fitting a {kind} transform needs at least {MIN_CONTROLS[kind]} control codes"
+
+
+SHIFT_PARAMETERS = parameters.compile_schema([
+    Parameter('controlcode', parse_control_codes, required=True,
+              checks=[(bool, "one or more comma separated control codes")]),
+    Parameter('originalfile', required=True, missing_message="Missing file upload for original file"),
+    Parameter('shiftedfile', required=True, missing_message="Missing file upload for shifted file"),
+    Parameter('transform', str.strip, default=TRANSLATE, checks=[one_of(MIN_CONTROLS)]),
+], rules=[_check_enough_controls])
+
+
+def parse_shift_fields(fields: dict):
+    """
+    Validate the form fields of a shift request and fit the transform from the original to the shifted file.
+    Returns ``(transform, [])``, or ``(None, errors)`` with a message for each problem.
+    """
+    values, errors = SHIFT_PARAMETERS(fields)
+    if errors:
+        return None, errors
+    control_codes = values['controlcode']
+    try:
+        if len(control_codes) == 1:
+            x_original, y_original = parse_upload('originalfile', values, get_control_location, control_codes[0])
+            x_shifted, y_shifted = parse_upload('shiftedfile', values, get_control_location, control_codes[0])
+            return Transform.translation(x_shifted - x_original, y_shifted - y_original), []
+        original = parse_upload('originalfile', values, read_reference_document, control_codes)
+        shifted = parse_upload('shiftedfile', values, read_reference_document, control_codes)
+        return fit_control_transform(original, shifted, control_codes, values['transform']), []
+    except (ControlNotFoundException, InconsistentShiftException, UnreadableFileException) as e:
+        return None, [str(e)]
+
+
+def parse_upload(name: str, values: dict, parse, *args):
+    """
+    ``parse`` of the uploaded file ``name``, raising ``UnreadableFileException`` naming it if it is not XML or a
+    reference control's location cannot be read
+    """
+    try:
+        return parse(values[name], *args)
+    except ET.ParseError as e:
+        raise UnreadableFileException(f"{name} is not a valid PurplePen file: {e}")
+    except InvalidCoordinateException as e:
+        raise UnreadableFileException(f"{name}: {e}")
+
+
+def read_reference_document(ppen_xml: str, control_codes) -> 'PurplePenDocument':
+    """The parsed document, checking that the location of each of ``control_codes`` it has can be read"""
+    document = PurplePenDocument(ppen_xml)
+    for code in control_codes:
+        if code in document.unreadable_controls:
+            raise InvalidCoordinateException(document.unreadable_controls[code])
+    return document
+
+
+class BatchTooLargeException(Exception):
+    pass
+
+
+class UnreadableFileException(Exception):
+    pass
+
+
+def read_text(name: str, content) -> str:
+    """The text of an uploaded file or form field, raising ``UnreadableFileException`` naming it if not UTF-8"""
+    try:
+        return str(content, 'utf8')
+    except UnicodeDecodeError as e:
+        raise UnreadableFileException(f"{name} is not UTF-8 text: {e.reason} at byte {e.start}")
+
+
+def iter_batch_files(uploads):
+    """
+    Yield ``(name, content)`` for each PurplePen file in ``uploads``, a list of ``(filename, content)``, where an
+    upload may be a ZIP containing ``.ppen`` files. Sizes of ZIP members are checked before they are extracted,
+    and a member which cannot be extracted raises ``UnreadableFileException`` naming it.
+    """
+    import zipfile
+    count = 0
+    total_bytes = 0
+    for filename, content in uploads:
+        if filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(io.BytesIO(content)) as archive:
+                members = [(info.filename, info.file_size, lambda i=info: archive.read(i))
+                           for info in archive.infolist()
+                           if not info.is_dir() and info.filename.lower().endswith('.ppen')]
+                for name, size, read in members:
+                    count, total_bytes = _check_batch_size(count + 1, total_bytes + size)
+                    try:
+                        member = read()
+                    except (zipfile.BadZipFile, zlib.error, NotImplementedError, RuntimeError, EOFError,
+                            OSError) as e:
+                        # Corrupt or truncated data, an unsupported compression method or an encrypted member
+                        raise UnreadableFileException(f"Could not extract {name} from {filename}: {e}")
+                    yield os.path.basename(name), member
+        else:
+            count, total_bytes = _check_batch_size(count + 1, total_bytes + len(content))
+            yield os.path.basename(filename), bytes(content)
+
+
+def _check_batch_size(count: int, total_bytes: int):
+    if count > MAX_BATCH_FILES:
+        raise BatchTooLargeException(f"At most {MAX_BATCH_FILES} files can be shifted at once")
+    if total_bytes > MAX_BATCH_BYTES:
+        raise BatchTooLargeException(f"At most {MAX_BATCH_BYTES // (1024 * 1024)}MB of files can be shifted at once")
+    return count, total_bytes
+
+
+def write_shifted_zip(sink, files, transform: 'Transform', max_workers: int = responses.BATCH_WORKERS,
+                      executor_class=None):
+    """
+    Write a ZIP archive to ``sink`` of each of ``files``, ``(name, content)`` pairs, with ``transform`` applied,
+    shifting them in a pool of workers as ``responses.write_zip`` does. Names are kept, except that repeated names
+    are made unique with a numeric prefix.
+    """
+    def unique_names():
+        used_names = set()
+        for i, (name, content) in enumerate(files):
+            if name in used_names:
+                name = "{0:03d}-{1}".format(i + 1, name)
+            used_names.add(name)
+            yield name, (name, content, transform)
+    responses.write_zip(sink, unique_names(), shift_file, max_workers, executor_class)
+
+
+def shift_file(name: str, content: bytes, transform: 'Transform') -> bytes:
+    """Shift one file of a batch, with ``name`` in the message of any exception for a file that cannot be read"""
+    ppen_xml = read_text(name, content)
+    try:
+        with request_log.stage('rewrite'):
+            return transform_ppen(ppen_xml, transform).encode('utf8')
+    except InvalidCoordinateException as e:
+        raise InvalidCoordinateException(f"{name}: {e}")
 
 
 def shift_ppen_from_files(xml_original: str, xml_shifted: str, control_code: str) -> str:
@@ -52,54 +307,394 @@ def shift_ppen_from_files(xml_original: str, xml_shifted: str, control_code: str
     return shift_ppen(xml_original, x_shift, y_shift)
 
 
-def get_x_y_shift(original: str, shifted: str, control_code: str) -> Tuple[float, float]:
+def get_x_y_shift(original: str, shifted: str, control_code: str) -> tuple[float, float]:
     x_original, y_original = get_control_location(original, control_code)
     x_shifted, y_shifted = get_control_location(shifted, control_code)
     return x_shifted - x_original, y_shifted - y_original
 
 
-def get_control_location(ppen_xml: str, control_code: str) -> Tuple[float, float]:
+class ControlNotFoundException(Exception):
+    pass
+
+
+class InconsistentShiftException(Exception):
+    pass
+
+
+# Largest distance, in map millimetres, by which any reference control may miss the fitted transform in x or y
+SHIFT_TOLERANCE = 0.1
+
+
+class Transform:
+    """The 2D affine transform ``x' = a x + b y + c``, ``y' = d x + e y + f``"""
+    def __init__(self, a: float, b: float, c: float, d: float, e: float, f: float):
+        self.a, self.b, self.c, self.d, self.e, self.f = a, b, c, d, e, f
+
+    @classmethod
+    def translation(cls, x_shift: float, y_shift: float) -> 'Transform':
+        return cls(1.0, 0.0, x_shift, 0.0, 1.0, y_shift)
+
+    def is_translation(self) -> bool:
+        return self.a == 1 and self.b == 0 and self.d == 0 and self.e == 1
+
+    def apply(self, x: float, y: float) -> tuple[float, float]:
+        return self.a * x + self.b * y + self.c, self.d * x + self.e * y + self.f
+
+
+def fit_transform(points_from, points_to, kind: str = TRANSLATE) -> Transform:
+    """
+    Least-squares fit of a transform of the given ``kind`` taking ``points_from`` to ``points_to``, both lists of
+    ``(x, y)``. A similarity transform is a rotation, uniform scale and translation; an affine transform may also
+    shear and scale each axis differently. Closed-form solutions over sums of the points are used, as there are
+    only ever a handful of reference controls.
+    """
+    n = len(points_from)
+    mx_from = sum(x for x, _ in points_from) / n
+    my_from = sum(y for _, y in points_from) / n
+    mx_to = sum(x for x, _ in points_to) / n
+    my_to = sum(y for _, y in points_to) / n
+    if kind == TRANSLATE:
+        return Transform.translation(mx_to - mx_from, my_to - my_from)
+
+    # Work relative to the centroids, so the translation drops out of the fit
+    p = [(x - mx_from, y - my_from) for x, y in points_from]
+    q = [(x - mx_to, y - my_to) for x, y in points_to]
+
+    if kind == SIMILARITY:
+        norm = sum(px * px + py * py for px, py in p)
+        if norm == 0:
+            raise InconsistentShiftException("Reference controls must not all be at the same place")
+        scale_cos = sum(px * qx + py * qy for (px, py), (qx, qy) in zip(p, q)) / norm
+        scale_sin = sum(px * qy - py * qx for (px, py), (qx, qy) in zip(p, q)) / norm
+        a, b, d, e = scale_cos, -scale_sin, scale_sin, scale_cos
+    elif kind == AFFINE:
+        sxx = sum(px * px for px, _ in p)
+        sxy = sum(px * py for px, py in p)
+        syy = sum(py * py for _, py in p)
+        det = sxx * syy - sxy * sxy
+        if abs(det) <= 1e-12 * max(sxx * syy, 1e-300):
+            raise InconsistentShiftException("Reference controls for an affine transform must not all be in a line")
+        # Solve the 2x2 normal equations for each output coordinate
+        sxu = sum(px * qx for (px, _), (qx, _) in zip(p, q))
+        syu = sum(py * qx for (_, py), (qx, _) in zip(p, q))
+        sxv = sum(px * qy for (px, _), (_, qy) in zip(p, q))
+        syv = sum(py * qy for (_, py), (_, qy) in zip(p, q))
+        a = (sxu * syy - syu * sxy) / det
+        b = (syu * sxx - sxu * sxy) / det
+        d = (sxv * syy - syv * sxy) / det
+        e = (syv * sxx - sxv * sxy) / det
+    else:
+        raise ValueError(f"Unknown transform {kind}")
+
+    return Transform(a, b, mx_to - (a * mx_from + b * my_from), d, e, my_to - (d * mx_from + e * my_from))
+
+
+def fit_control_transform(original: 'PurplePenDocument', shifted: 'PurplePenDocument', control_codes,
+                          kind: str = TRANSLATE, tolerance: float = SHIFT_TOLERANCE) -> Transform:
+    """
+    Fit a transform of the given ``kind`` to how the reference controls moved between two documents. Raises
+    ``InconsistentShiftException`` if any control misses the fitted transform by more than ``tolerance`` in either
+    direction. A repeated control code is only used once.
+    """
+    control_codes = list(dict.fromkeys(control_codes))
+    points_from = list(original.control_locations(control_codes).values())
+    points_to = list(shifted.control_locations(control_codes).values())
+    transform = fit_transform(points_from, points_to, kind)
+
+    misfits = []
+    for code, (x, y), (x_to, y_to) in zip(control_codes, points_from, points_to):
+        x_fit, y_fit = transform.apply(x, y)
+        if abs(x_to - x_fit) > tolerance or abs(y_to - y_fit) > tolerance:
+            misfits.append(f"{code} ({x_to - x_fit:+.3f}, {y_to - y_fit:+.3f})")
+    if misfits:
+        raise InconsistentShiftException(
+            f"Controls do not all fit one {kind} transform to within {tolerance}mm; these are off by: "
+            f"{', '.join(misfits)}")
+    return transform
+
+
+class PurplePenDocument:
+    """
+    A parsed PurplePen file with its controls indexed by code, so that any number of controls can be looked up
+    without parsing the file again. Only the control locations are kept, not the element tree.
+    """
+    def __init__(self, ppen_xml: str):
+        start_idx = ppen_xml.find('<')
+        root = ET.fromstring(ppen_xml[start_idx:])
+
+        #: Location of each control, by code
+        self.controls: dict[str, tuple[float, float]] = {}
+        #: Why the location of each control which has no readable location cannot be read, by code
+        self.unreadable_controls: dict[str, str] = {}
+        for c in root:
+            if c.tag != 'control':
+                continue
+            codes = [p.text for p in c if p.tag == 'code']
+            if len(codes) != 1 or codes[0] in self.controls or codes[0] in self.unreadable_controls:
+                continue
+            try:
+                self.controls[codes[0]] = read_control_location(codes[0], c)
+            except InvalidCoordinateException as e:
+                self.unreadable_controls[codes[0]] = str(e)
+
+    def control_location(self, control_code: str) -> tuple[float, float]:
+        """
+        Raises ``ControlNotFoundException`` if there is no control with the code, or ``InvalidCoordinateException``
+        if its location cannot be read
+        """
+        if control_code in self.unreadable_controls:
+            raise InvalidCoordinateException(self.unreadable_controls[control_code])
+        if control_code not in self.controls:
+            raise ControlNotFoundException(f"Control {control_code} not found in file")
+        return self.controls[control_code]
+
+    def control_locations(self, control_codes) -> dict[str, tuple[float, float]]:
+        return {code: self.control_location(code) for code in control_codes}
+
+    def bounding_box(self, control_codes=None) -> tuple[float, float, float, float]:
+        """``(left, bottom, right, top)`` of the given controls, or of all controls"""
+        locations = list(self.controls.values() if control_codes is None
+                         else self.control_locations(control_codes).values())
+        if not locations:
+            raise ControlNotFoundException("No controls found in file")
+        xs = [x for x, _ in locations]
+        ys = [y for _, y in locations]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def shifts_from(self, original: 'PurplePenDocument', control_codes=None) -> dict[str, tuple[float, float]]:
+        """
+        How far each control moved between ``original`` and this document, for the given codes or for every code
+        in both documents
+        """
+        if control_codes is None:
+            control_codes = [code for code in original.controls if code in self.controls]
+        shifts = {}
+        for code in control_codes:
+            x_original, y_original = original.control_location(code)
+            x_shifted, y_shifted = self.control_location(code)
+            shifts[code] = x_shifted - x_original, y_shifted - y_original
+        return shifts
+
+
+PARSE_CHUNK_SIZE = 16 * 1024
+
+
+def get_control_location(ppen_xml: str, control_code: str) -> tuple[float, float]:
+    """
+    Find the location of the control with code ``control_code``. The document is parsed incrementally and parsing
+    stops as soon as the control is found, discarding each control that has been checked along the way. Raises
+    ``ET.ParseError`` if the document is not well formed up to the control, or ends before it is complete.
+    """
     start_idx = ppen_xml.find('<')
-    root = ET.fromstring(ppen_xml[start_idx:])
-
-    controls = [c for c in root if c.tag == 'control']
-    for c in controls:
-        codes = [p.text for p in c if p.tag == 'code']
-        if len(codes) == 1:
-            if codes[0] == control_code:
-                location = [p.attrib for p in c if p.tag == 'location'][0]
-                return float(location['x']), float(location['y'])
-    raise Exception(f"Control {control_code} not found in file")
-
-
-def make_bad_request_response(message: str) -> dict:
-    return {
-        'statusCode': 400,
-        'body': json.dumps({"message": message}),
-        'headers': {
-            'Content-Type': 'application/json'
-        }
-    }
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    depth = 0
+    for chunk_start in range(start_idx, len(ppen_xml), PARSE_CHUNK_SIZE):
+        parser.feed(ppen_xml[chunk_start:chunk_start + PARSE_CHUNK_SIZE])
+        for event, c in parser.read_events():
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if c.tag == 'control':
+                codes = [p.text for p in c if p.tag == 'code']
+                if len(codes) == 1:
+                    if codes[0] == control_code:
+                        return read_control_location(control_code, c)
+            c.clear()
+    # Reports a document which ends before it is complete, rather than the control not being found
+    parser.close()
+    raise ControlNotFoundException(f"Control {control_code} not found in file")
+
+
+class InvalidCoordinateException(Exception):
+    pass
+
+
+def read_control_location(control_code: str, control: ET.Element) -> tuple[float, float]:
+    """
+    The x and y of the first location of a control element, raising ``InvalidCoordinateException`` naming the
+    control if it has no location or either coordinate is missing or not a number
+    """
+    location = control.find('location')
+    if location is None:
+        raise InvalidCoordinateException(f"Control {control_code} has no location")
+    coordinates = []
+    for name in ('x', 'y'):
+        value = location.get(name)
+        if value is None:
+            raise InvalidCoordinateException(f"Control {control_code} has no {name} coordinate")
+        try:
+            coordinates.append(float(value))
+        except ValueError:
+            raise InvalidCoordinateException(f"Control {control_code} has an unreadable {name} coordinate {value!r}")
+    return coordinates[0], coordinates[1]
+
+
+# How each coordinate-bearing element of the PurplePen schema moves with the map
+POINT = 'point'          # x, y: a position on the map, such as a control, a leg bend or a corner of a special object
+VECTOR = 'vector'        # x, y: an offset from another position, such as a control number from its control circle
+RECTANGLE = 'rectangle'  # left, top, right, bottom: an area of the map, such as the area printed for a course
+
+COORDINATE_ELEMENTS = {
+    'location': POINT,
+    'number-location': VECTOR,
+    'print-area': RECTANGLE,
+    'part-print-area': RECTANGLE,
+}
+
+# Almost every coordinate is a location written in PurplePen's own layout, which the first branch picks out so
+# that its values can be transformed a whole column at a time. The second branch finds any coordinate-bearing
+# element in any other layout, whose attributes are then read in whatever order they come. The third branch
+# matches comments, so that any element inside one is kept as written rather than being transformed. Every
+# branch starts after the same '<', which lets the search skip quickly to the next one.
+COORDINATE_TAG_RE = re.compile(
+    r'<(?:location x="([^"]*)" y="([^"]*)" />|(%s)(?=[\s/>])([^>]*)>|(!--.*?--)>)'
+    % '|'.join(sorted(COORDINATE_ELEMENTS, key=len, reverse=True)), re.DOTALL)
+ATTRIBUTE_RE = re.compile(r'([\w.:-]+)(\s*=\s*)(?:"([^"]*)"|\'([^\']*)\')')
 
 
 def shift_ppen(ppen_xml: str, x_shift: float, y_shift: float) -> str:
-    p = re.compile(r'<location x="(-?[\d\.]+)" y="(-?[\d\.]+)" />')
-    shifted_string, num_replacements = p.subn(lambda m: shift_coords(m, x_shift, y_shift), ppen_xml)
+    return transform_ppen(ppen_xml, Transform.translation(x_shift, y_shift))
+
+
+def transform_ppen(ppen_xml: str, transform: Transform) -> str:
+    """The whole of ``ppen_xml`` with ``transform`` applied, as generated by ``iter_transformed_ppen``"""
+    return ''.join(iter_transformed_ppen(ppen_xml, transform))
+
+
+# Coordinate-bearing elements rewritten together, and so text yielded at a time, by iter_transformed_ppen
+TRANSFORM_BATCH_SIZE = 4096
+
+
+def iter_transformed_ppen(ppen_xml: str, transform: Transform, batch_size: int = None):
+    """
+    Apply ``transform`` to every coordinate-bearing element in one pass over the text, without building an element
+    tree, yielding the rewritten text a chunk at a time so that only the input and one chunk of output are held at
+    once. Only the coordinate values are rewritten, so everything else in the file is kept exactly as written.
+    Comments are kept as written, along with any elements inside them. Matches are rewritten ``batch_size`` at a
+    time, by default ``TRANSFORM_BATCH_SIZE``, so that the values of the common location layout can still be
+    transformed a whole column at a time.
+    """
+    batch_size = batch_size or TRANSFORM_BATCH_SIZE
+    position = 0
+    batch = []
+    for match in COORDINATE_TAG_RE.finditer(ppen_xml):
+        batch.append(match)
+        if len(batch) == batch_size:
+            yield _transform_batch(ppen_xml, position, batch, transform)
+            position = batch[-1].end()
+            batch = []
+    if batch:
+        yield _transform_batch(ppen_xml, position, batch, transform)
+        position = batch[-1].end()
+    yield ppen_xml[position:]
+
+
+def _transform_batch(ppen_xml: str, position: int, matches, transform: Transform) -> str:
+    """The text from ``position`` to the end of the last of ``matches``, with each match rewritten"""
+    groups = [m.groups() for m in matches]
+    xs = [g[0] for g in groups]
+    ys = [g[1] for g in groups]
+    others = [i for i, x in enumerate(xs) if x is None]
+    for i in others:
+        # Placeholders, so that the columns can be transformed together; these matches are rewritten below
+        xs[i] = ys[i] = '0'
+
+    try:
+        xs, ys = transform_columns(xs, ys, transform)
+        tags = ['<location x="' + x + '" y="' + y + '" />' for x, y in zip(xs, ys)]
+        num_comments = 0
+        for i in others:
+            _, _, name, attributes, comment = groups[i]
+            if comment is not None:
+                tags[i] = '<' + comment + '>'
+                num_comments += 1
+            else:
+                tags[i] = transform_element(name, attributes, transform)
+    except ValueError as e:
+        raise InvalidCoordinateException(f"Could not read a coordinate in the file: {e}")
+
+    request_log.count('locations', len(tags) - num_comments)
+    result = [None] * (2 * len(tags))
+    for i, (start, end) in enumerate([m.span() for m in matches]):
+        result[2 * i] = ppen_xml[position:start]
+        position = end
+    result[1::2] = tags
+    return ''.join(result)
+
+
+def transform_columns(xs, ys, transform: Transform):
+    """
+    Transform lists of x and y coordinate strings. For a translation each column is shifted on its own, and kept
+    exactly as written if its shift is zero.
+    """
+    if transform.is_translation():
+        return shift_values(xs, transform.c), shift_values(ys, transform.f)
+    points = [transform.apply(float(x), float(y)) for x, y in zip(xs, ys)]
+    return ['%.6f' % x for x, _ in points], ['%.6f' % y for _, y in points]
+
+
+def shift_values(values, shift: float):
+    """Shift a list of coordinate strings, keeping them exactly as written if the shift is zero"""
+    if shift == 0:
+        return values
+    return ['%.6f' % (float(v) + shift) for v in values]
+
+
+def transform_element(name: str, attributes: str, transform: Transform) -> str:
+    """Rewrite one coordinate-bearing start tag, with its attributes in any order"""
+    values = {m.group(1): m.group(3) if m.group(3) is not None else m.group(4)
+              for m in ATTRIBUTE_RE.finditer(attributes)}
+    kind = COORDINATE_ELEMENTS[name]
+    if kind == RECTANGLE:
+        new_values = transform_rectangle(values, transform)
+    elif kind == VECTOR:
+        new_values = transform_vector(values, transform)
+    elif 'x' in values and 'y' in values:
+        xs, ys = transform_columns([values['x']], [values['y']], transform)
+        new_values = {'x': xs[0], 'y': ys[0]}
+    else:
+        new_values = {}
+
+    def replace(match: re.Match):
+        value = new_values.get(match.group(1))
+        if value is None:
+            return match.group(0)
+        quote = '"' if match.group(3) is not None else "'"
+        return match.group(1) + match.group(2) + quote + value + quote
 
-    p = re.compile(r'left="(-?[\d\.]+)" top="(-?[\d\.]+)" right="(-?[\d\.]+)" bottom="(-?[\d\.]+)"')
-    shifted_string, num_replacements = p.subn(lambda m: shift_print_area(m, x_shift, y_shift), shifted_string)
+    return '<' + name + ATTRIBUTE_RE.sub(replace, attributes) + '>'
 
-    return shifted_string
 
+def transform_vector(values: dict, transform: Transform) -> dict:
+    """An offset is unchanged by a translation, and otherwise only rotated, scaled or sheared"""
+    if transform.is_translation() or 'x' not in values or 'y' not in values:
+        return {}
+    x, y = float(values['x']), float(values['y'])
+    return {'x': '%.6f' % (transform.a * x + transform.b * y), 'y': '%.6f' % (transform.d * x + transform.e * y)}
 
-def shift_coords(match: Match, x_shift: float, y_shift: float):
-    x, y = [float(x) for x in match.groups()]
-    return f'<location x="{x + x_shift:.6f}" y="{y + y_shift:.6f}" />'
 
+def transform_rectangle(values: dict, transform: Transform) -> dict:
+    """
+    A rectangle is shifted by a translation. Otherwise it is no longer axis-aligned, so it is replaced by the
+    bounding box of its transformed corners, keeping which way round its sides were.
+    """
+    if any(side not in values for side in ('left', 'top', 'right', 'bottom')):
+        return {}
+    if transform.is_translation():
+        (left, right), (top, bottom) = (shift_values([values['left'], values['right']], transform.c),
+                                        shift_values([values['top'], values['bottom']], transform.f))
+        return {'left': left, 'top': top, 'right': right, 'bottom': bottom}
 
-def shift_print_area(match: Match, x_shift: float, y_shift: float):
-    left, top, right, bottom = [float(x) for x in match.groups()]
-    return f'left="{left + x_shift:.6f}" top="{top + y_shift:.6f}" right="{right + x_shift:.6f}" bottom="{bottom + y_shift:.6f}"'
+    left, top, right, bottom = [float(values[side]) for side in ('left', 'top', 'right', 'bottom')]
+    corners = [transform.apply(x, y) for x in (left, right) for y in (top, bottom)]
+    xs = [x for x, _ in corners]
+    ys = [y for _, y in corners]
+    left, right = (min(xs), max(xs)) if left <= right else (max(xs), min(xs))
+    bottom, top = (min(ys), max(ys)) if bottom <= top else (max(ys), min(ys))
+    return {'left': '%.6f' % left, 'top': '%.6f' % top, 'right': '%.6f' % right, 'bottom': '%.6f' % bottom}
 
 
 if __name__ == "__main__":
@@ -117,10 +712,15 @@ if __name__ == "__main__":
     with open('output.ppen', 'w') as f:
         f.write(result)
 
+    # The example files as a browser would upload them, built here rather than written out as a literal which
+    # every cold start would have to compile
+    boundary = "----WebKitFormBoundaryW0wKf7e6Tkruhksr"
+    parts = [("controlcode", None, "31"), ("originalfile", "example_ppen.ppen", file_as_string),
+             ("shiftedfile", "example_ppen_31_shifted.ppen", file_as_string_2)]
     event = {
-        'headers': {
-            'content-type': "multipart/form-data; boundary=----WebKitFormBoundaryW0wKf7e6Tkruhksr"
-        },
-        'body': "------WebKitFormBoundaryW0wKf7e6Tkruhksr\r\nContent-Disposition: form-data; name=\"controlcode\"\r\n\r\n45\r\n------WebKitFormBoundaryW0wKf7e6Tkruhksr\r\nContent-Disposition: form-data; name=\"originalfile\"; filename=\"Quad Match 2020.ppen\"\r\nContent-Type: application/octet-stream\r\n\r\n﻿<course-scribe-event>\r\n  <event id=\"1\">\r\n    <title>Quad Match 2020</title>\r\n    <map kind=\"OCAD\" scale=\"10000\" ignore-missing-fonts=\"false\" absolute-path=\"C:\\Users\\BenJW\\Dropbox\\BenWindsor\\Documents\\Interests\\Orienteering\\Events\\2020-05 Epping Quad Match\\EE Nov 2019 ISOM OCAD 2019 v4.ocd\">EE Nov 2019 ISOM OCAD 2019 v4.ocd</map>\r\n    <standards map=\"2017\" description=\"2018\" />\r\n    <all-controls print-scale=\"10000\" description-kind=\"symbols\" />\r\n    <print-area automatic=\"false\" restrict-to-page-size=\"true\" left=\"-74.15886\" top=\"195.8901\" right=\"127.771149\" bottom=\"-92.9079\" page-width=\"827\" page-height=\"1169\" page-margins=\"16\" page-landscape=\"false\" />\r\n    <numbering start=\"31\" disallow-invertible=\"false\" />\r\n    <punch-card rows=\"3\" columns=\"8\" left-to-right=\"true\" top-to-bottom=\"false\" />\r\n    <course-appearance scale-sizes=\"RelativeTo15000\" scale-sizes-circle-gaps=\"true\" auto-leg-gap-size=\"3.5\" blend-purple=\"true\" />\r\n    <descriptions lang=\"en-GB\" color=\"black\" />\r\n    <ocad overprint-colors=\"false\" />\r\n  </event>\r\n  <control id=\"1\" kind=\"start\">\r\n    <location x=\"85.63277\" y=\"147.492142\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n  </control>\r\n  <control id=\"2\" kind=\"finish\">\r\n    <location x=\"88.31481\" y=\"153.8992\" />\r\n    <description box=\"all\" iof-2004-ref=\"14.3\" />\r\n  </control>\r\n  <control id=\"3\" kind=\"normal\">\r\n    <code>31</code>\r\n    <location x=\"81.64763\" y=\"139.239853\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"F\" iof-2004-ref=\"10.2\" />\r\n  </control>\r\n  <control id=\"10\" kind=\"normal\">\r\n    <code>32</code>\r\n    <location x=\"72.2580261\" y=\"100.883858\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.10\" />\r\n  </control>\r\n  <control id=\"43\" kind=\"normal\">\r\n    <code>33</code>\r\n    <location x=\"69.94294\" y=\"55.38756\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"F\" iof-2004-ref=\"10.1\" />\r\n  </control>\r\n  <control id=\"12\" kind=\"normal\">\r\n    <code>34</code>\r\n    <location x=\"42.7933121\" y=\"88.06778\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n  </control>\r\n  <control id=\"13\" kind=\"normal\">\r\n    <code>35</code>\r\n    <location x=\"52.6457634\" y=\"106.277084\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"E\" iof-2004-ref=\"3.6\" />\r\n    <description box=\"F\" iof-2004-ref=\"10.1\" />\r\n  </control>\r\n  <control id=\"14\" kind=\"normal\">\r\n    <code>36</code>\r\n    <location x=\"64.98082\" y=\"129.350067\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"F\" iof-2004-ref=\"11.7\" />\r\n  </control>\r\n  <control id=\"15\" kind=\"normal\">\r\n    <code>37</code>\r\n    <location x=\"71.8275\" y=\"139.9188\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"E\" iof-2004-ref=\"3.6\" />\r\n    <description box=\"F\" iof-2004-ref=\"10.1\" />\r\n  </control>\r\n  <control id=\"42\" kind=\"normal\">\r\n    <code>38</code>\r\n    <location x=\"80.2943\" y=\"148.285324\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n  </control>\r\n  <control id=\"17\" kind=\"normal\">\r\n    <code>39</code>\r\n    <location x=\"34.5140839\" y=\"91.05244\" />\r\n    <description box=\"D\" iof-2004-ref=\"4.4\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.2NE\" />\r\n  </control>\r\n  <control id=\"23\" kind=\"normal\">\r\n    <code>40</code>\r\n    <location x=\"91.96569\" y=\"138.6052\" />\r\n    <description box=\"C\" iof-2004-ref=\"0.1S\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.13\" />\r\n  </control>\r\n  <control id=\"24\" kind=\"normal\">\r\n    <code>41</code>\r\n    <location x=\"110.713646\" y=\"126.764252\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.10\" />\r\n  </control>\r\n  <control id=\"25\" kind=\"normal\">\r\n    <code>42</code>\r\n    <location x=\"78.51836\" y=\"84.8133545\" />\r\n    <description box=\"D\" iof-2004-ref=\"4.4\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.1SE\" />\r\n  </control>\r\n  <control id=\"26\" kind=\"normal\">\r\n    <code>43</code>\r\n    <location x=\"84.85482\" y=\"77.8665543\" />\r\n    <description box=\"D\" iof-2004-ref=\"4.4\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.1SE\" />\r\n  </control>\r\n  <control id=\"27\" kind=\"normal\">\r\n    <code>44</code>\r\n    <location x=\"62.1889343\" y=\"51.8967438\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.10\" />\r\n  </control>\r\n  <control id=\"28\" kind=\"normal\">\r\n    <code>45</code>\r\n    <location x=\"39.7934532\" y=\"49.7193756\" />\r\n    <description box=\"D\" iof-2004-ref=\"4.4\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.2E\" />\r\n  </control>\r\n  <control id=\"29\" kind=\"normal\">\r\n    <code>46</code>\r\n    <location x=\"31.3751926\" y=\"78.75542\" />\r\n    <description box=\"C\" iof-2004-ref=\"0.1S\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.3\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.10\" />\r\n  </control>\r\n  <control id=\"30\" kind=\"normal\">\r\n    <code>47</code>\r\n    <location x=\"20.9663963\" y=\"132.004959\" />\r\n    <description box=\"C\" iof-2004-ref=\"0.5\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.13\" />\r\n  </control>\r\n  <control id=\"31\" kind=\"normal\">\r\n    <code>48</code>\r\n    <location x=\"19.7433376\" y=\"144.740021\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.12\" />\r\n  </control>\r\n  <control id=\"32\" kind=\"normal\">\r\n    <code>49</code>\r\n    <location x=\"34.4861946\" y=\"119.050323\" />\r\n    <description box=\"C\" iof-2004-ref=\"0.5\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.10\" />\r\n  </control>\r\n  <control id=\"34\" kind=\"normal\">\r\n    <code>50</code>\r\n    <location x=\"50.3374939\" y=\"139.197769\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.3\" />\r\n  </control>\r\n  <control id=\"35\" kind=\"normal\">\r\n    <code>51</code>\r\n    <location x=\"124.112724\" y=\"135.494186\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.3\" />\r\n  </control>\r\n  <control id=\"36\" kind=\"normal\">\r\n    <code>52</code>\r\n    <location x=\"110.187263\" y=\"154.594147\" />\r\n    <description box=\"D\" iof-2004-ref=\"3.7\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.1N\" />\r\n  </control>\r\n  <control id=\"37\" kind=\"normal\">\r\n    <code>53</code>\r\n    <location x=\"90.23759\" y=\"127.063721\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.13\" />\r\n  </control>\r\n  <control id=\"38\" kind=\"normal\">\r\n    <code>54</code>\r\n    <location x=\"102.013763\" y=\"101.303635\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.3\" />\r\n  </control>\r\n  <control id=\"39\" kind=\"normal\">\r\n    <code>55</code>\r\n    <location x=\"39.1706238\" y=\"109.763283\" />\r\n    <description box=\"C\" iof-2004-ref=\"0.2SW\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.3\" />\r\n  </control>\r\n  <control id=\"40\" kind=\"normal\">\r\n    <code>56</code>\r\n    <location x=\"30.0110168\" y=\"66.014534\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.6\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.8N\" />\r\n  </control>\r\n  <control id=\"41\" kind=\"normal\">\r\n    <code>57</code>\r\n    <location x=\"67.74276\" y=\"84.97686\" />\r\n    <description box=\"D\" iof-2004-ref=\"4.5\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.1N\" />\r\n  </control>\r\n  <control id=\"44\" kind=\"normal\">\r\n    <code>58</code>\r\n    <location x=\"60.1512337\" y=\"41.4735374\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"F\" iof-2004-ref=\"11.7\" />\r\n  </control>\r\n  <control id=\"45\" kind=\"normal\">\r\n    <code>59</code>\r\n    <location x=\"45.58684\" y=\"65.6313553\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"F\" iof-2004-ref=\"11.7\" />\r\n  </control>\r\n  <course id=\"1\" kind=\"normal\" order=\"1\">\r\n    <name>Yellow</name>\r\n    <labels label-kind=\"sequence\" />\r\n    <first course-control=\"1\" />\r\n    <print-area automatic=\"false\" restrict-to-page-size=\"true\" left=\"-74.15886\" top=\"195.8901\" right=\"127.771149\" bottom=\"-92.9079\" page-width=\"827\" page-height=\"1169\" page-margins=\"16\" page-landscape=\"false\" />\r\n    <options print-scale=\"10000\" description-kind=\"symbols\" />\r\n  </course>\r\n  <course id=\"2\" kind=\"normal\" order=\"2\">\r\n    <name>Green</name>\r\n    <labels label-kind=\"sequence\" />\r\n    <first course-control=\"3\" />\r\n    <print-area automatic=\"false\" restrict-to-page-size=\"true\" left=\"-74.15886\" top=\"195.8901\" right=\"127.771149\" bottom=\"-92.9079\" page-width=\"827\" page-height=\"1169\" page-margins=\"16\" page-landscape=\"false\" />\r\n    <options print-scale=\"10000\" description-kind=\"symbols\" />\r\n  </course>\r\n  <course id=\"4\" kind=\"normal\" order=\"3\">\r\n    <name>Blue</name>\r\n    <labels label-kind=\"sequence\" />\r\n    <first course-control=\"45\" />\r\n    <print-area automatic=\"false\" restrict-to-page-size=\"true\" left=\"-74.15886\" top=\"195.8901\" right=\"127.771149\" bottom=\"-92.9079\" page-width=\"827\" page-height=\"1169\" page-margins=\"16\" page-landscape=\"false\" />\r\n    <options print-scale=\"10000\" description-kind=\"symbols\" />\r\n  </course>\r\n  <course-control id=\"1\" control=\"1\">\r\n    <next course-control=\"7\" />\r\n  </course-control>\r\n  <course-control id=\"2\" control=\"2\" />\r\n  <course-control id=\"3\" control=\"1\">\r\n    <next course-control=\"28\" />\r\n  </course-control>\r\n  <course-control id=\"4\" control=\"2\" />\r\n  <course-control id=\"7\" control=\"3\">\r\n    <next course-control=\"14\" />\r\n  </course-control>\r\n  <course-control id=\"14\" control=\"10\">\r\n    <next course-control=\"68\" />\r\n  </course-control>\r\n  <course-control id=\"68\" control=\"43\">\r\n    <next course-control=\"69\" />\r\n  </course-control>\r\n  <course-control id=\"16\" control=\"12\">\r\n    <next course-control=\"17\" />\r\n  </course-control>\r\n  <course-control id=\"17\" control=\"13\">\r\n    <next course-control=\"18\" />\r\n  </course-control>\r\n  <course-control id=\"18\" control=\"14\">\r\n    <next course-control=\"19\" />\r\n  </course-control>\r\n  <course-control id=\"19\" control=\"15\">\r\n    <next course-control=\"2\" />\r\n  </course-control>\r\n  <course-control id=\"70\" control=\"45\">\r\n    <next course-control=\"16\" />\r\n  </course-control>\r\n  <course-control id=\"69\" control=\"44\">\r\n    <next course-control=\"70\" />\r\n  </course-control>\r\n  <course-control id=\"28\" control=\"23\">\r\n    <next course-control=\"29\" />\r\n  </course-control>\r\n  <course-control id=\"29\" control=\"24\">\r\n    <next course-control=\"42\" />\r\n  </course-control>\r\n  <course-control id=\"44\" control=\"25\">\r\n    <next course-control=\"32\" />\r\n  </course-control>\r\n  <course-control id=\"31\" control=\"26\">\r\n    <next course-control=\"44\" />\r\n  </course-control>\r\n  <course-control id=\"32\" control=\"27\">\r\n    <next course-control=\"33\" />\r\n  </course-control>\r\n  <course-control id=\"33\" control=\"28\">\r\n    <next course-control=\"34\" />\r\n  </course-control>\r\n  <course-control id=\"34\" control=\"29\">\r\n    <next course-control=\"35\" />\r\n  </course-control>\r\n  <course-control id=\"35\" control=\"17\">\r\n    <next course-control=\"36\" />\r\n  </course-control>\r\n  <course-control id=\"36\" control=\"30\">\r\n    <next course-control=\"37\" />\r\n  </course-control>\r\n  <course-control id=\"37\" control=\"31\">\r\n    <next course-control=\"38\" />\r\n  </course-control>\r\n  <course-control id=\"38\" control=\"32\">\r\n    <next course-control=\"41\" />\r\n  </course-control>\r\n  <course-control id=\"41\" control=\"34\">\r\n    <next course-control=\"40\" />\r\n  </course-control>\r\n  <course-control id=\"40\" control=\"15\">\r\n    <next course-control=\"4\" />\r\n  </course-control>\r\n  <course-control id=\"42\" control=\"35\">\r\n    <next course-control=\"43\" />\r\n  </course-control>\r\n  <course-control id=\"43\" control=\"36\">\r\n    <next course-control=\"31\" />\r\n  </course-control>\r\n  <course-control id=\"45\" control=\"1\">\r\n    <next course-control=\"46\" />\r\n  </course-control>\r\n  <course-control id=\"46\" control=\"23\">\r\n    <next course-control=\"47\" />\r\n  </course-control>\r\n  <course-control id=\"47\" control=\"24\">\r\n    <next course-control=\"48\" />\r\n  </course-control>\r\n  <course-control id=\"48\" control=\"35\">\r\n    <next course-control=\"49\" />\r\n  </course-control>\r\n  <course-control id=\"49\" control=\"36\">\r\n    <next course-control=\"50\" />\r\n  </course-control>\r\n  <course-control id=\"50\" control=\"26\">\r\n    <next course-control=\"51\" />\r\n  </course-control>\r\n  <course-control id=\"51\" control=\"25\">\r\n    <next course-control=\"65\" />\r\n  </course-control>\r\n  <course-control id=\"66\" control=\"27\">\r\n    <next course-control=\"67\" />\r\n  </course-control>\r\n  <course-control id=\"53\" control=\"28\">\r\n    <next course-control=\"66\" />\r\n  </course-control>\r\n  <course-control id=\"54\" control=\"29\">\r\n    <next course-control=\"55\" />\r\n  </course-control>\r\n  <course-control id=\"55\" control=\"17\">\r\n    <next course-control=\"56\" />\r\n  </course-control>\r\n  <course-control id=\"56\" control=\"30\">\r\n    <next course-control=\"57\" />\r\n  </course-control>\r\n  <course-control id=\"57\" control=\"31\">\r\n    <next course-control=\"58\" />\r\n  </course-control>\r\n  <course-control id=\"58\" control=\"32\">\r\n    <next course-control=\"62\" />\r\n  </course-control>\r\n  <course-control id=\"59\" control=\"34\">\r\n    <next course-control=\"60\" />\r\n  </course-control>\r\n  <course-control id=\"60\" control=\"15\">\r\n    <next course-control=\"61\" />\r\n  </course-control>\r\n  <course-control id=\"61\" control=\"2\" />\r\n  <course-control id=\"62\" control=\"37\">\r\n    <next course-control=\"63\" />\r\n  </course-control>\r\n  <course-control id=\"63\" control=\"38\">\r\n    <next course-control=\"64\" />\r\n  </course-control>\r\n  <course-control id=\"64\" control=\"39\">\r\n    <next course-control=\"59\" />\r\n  </course-control>\r\n  <course-control id=\"65\" control=\"40\">\r\n    <next course-control=\"53\" />\r\n  </course-control>\r\n  <course-control id=\"67\" control=\"41\">\r\n    <next course-control=\"54\" />\r\n  </course-control>\r\n  <special-object id=\"1\" kind=\"descriptions\">\r\n    <appearance columns=\"2\" />\r\n    <location x=\"-1.00035858\" y=\"2.0887146\" />\r\n    <location x=\"5.084303\" y=\"2.0887146\" />\r\n    <courses all=\"true\" />\r\n  </special-object>\r\n  <special-object id=\"2\" kind=\"text\">\r\n    <text>$(CourseName)</text>\r\n    <font name=\"Roboto\" bold=\"true\" italic=\"false\" />\r\n    <appearance color=\"purple\" />\r\n    <location x=\"102.2344\" y=\"2.537117\" />\r\n    <location x=\"157.146332\" y=\"-20.954422\" />\r\n    <courses all=\"true\" />\r\n  </special-object>\r\n  <special-object id=\"3\" kind=\"text\">\r\n    <text>Courses close 20:00</text>\r\n    <font name=\"Roboto\" bold=\"true\" italic=\"false\" />\r\n    <appearance color=\"purple\" />\r\n    <location x=\"102.5395\" y=\"-17.9026871\" />\r\n    <location x=\"157.146332\" y=\"-26.14064\" />\r\n    <courses all=\"true\" />\r\n  </special-object>\r\n</course-scribe-event>\r\n------WebKitFormBoundaryW0wKf7e6Tkruhksr\r\nContent-Disposition: form-data; name=\"shiftedfile\"; filename=\"Quad Match 2020 Shifted.ppen\"\r\nContent-Type: application/octet-stream\r\n\r\n﻿<course-scribe-event>\r\n  <event id=\"1\">\r\n    <title>Quad Match 2020</title>\r\n    <map kind=\"OCAD\" scale=\"10000\" ignore-missing-fonts=\"false\" absolute-path=\"C:\\Users\\BenJW\\Dropbox\\BenWindsor\\Documents\\Interests\\Orienteering\\Events\\2020-05 Epping Quad Match\\EE Nov 2019 ISOM OCAD 2019 v4.ocd\">EE Nov 2019 ISOM OCAD 2019 v4.ocd</map>\r\n    <standards map=\"2017\" description=\"2018\" />\r\n    <all-controls print-scale=\"10000\" description-kind=\"symbols\" />\r\n    <print-area automatic=\"false\" restrict-to-page-size=\"true\" left=\"-74.15886\" top=\"195.8901\" right=\"127.771149\" bottom=\"-92.9079\" page-width=\"827\" page-height=\"1169\" page-margins=\"16\" page-landscape=\"false\" />\r\n    <numbering start=\"31\" disallow-invertible=\"false\" />\r\n    <punch-card rows=\"3\" columns=\"8\" left-to-right=\"true\" top-to-bottom=\"false\" />\r\n    <course-appearance scale-sizes=\"RelativeTo15000\" scale-sizes-circle-gaps=\"true\" auto-leg-gap-size=\"3.5\" blend-purple=\"true\" />\r\n    <descriptions lang=\"en-GB\" color=\"black\" />\r\n    <ocad overprint-colors=\"false\" />\r\n  </event>\r\n  <control id=\"1\" kind=\"start\">\r\n    <location x=\"85.63277\" y=\"147.492142\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n  </control>\r\n  <control id=\"2\" kind=\"finish\">\r\n    <location x=\"88.31481\" y=\"153.8992\" />\r\n    <description box=\"all\" iof-2004-ref=\"14.3\" />\r\n  </control>\r\n  <control id=\"3\" kind=\"normal\">\r\n    <code>31</code>\r\n    <location x=\"81.64763\" y=\"139.239853\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"F\" iof-2004-ref=\"10.2\" />\r\n  </control>\r\n  <control id=\"10\" kind=\"normal\">\r\n    <code>32</code>\r\n    <location x=\"72.2580261\" y=\"100.883858\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.10\" />\r\n  </control>\r\n  <control id=\"43\" kind=\"normal\">\r\n    <code>33</code>\r\n    <location x=\"69.94294\" y=\"55.38756\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"F\" iof-2004-ref=\"10.1\" />\r\n  </control>\r\n  <control id=\"12\" kind=\"normal\">\r\n    <code>34</code>\r\n    <location x=\"42.7933121\" y=\"88.06778\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n  </control>\r\n  <control id=\"13\" kind=\"normal\">\r\n    <code>35</code>\r\n    <location x=\"52.6457634\" y=\"106.277084\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"E\" iof-2004-ref=\"3.6\" />\r\n    <description box=\"F\" iof-2004-ref=\"10.1\" />\r\n  </control>\r\n  <control id=\"14\" kind=\"normal\">\r\n    <code>36</code>\r\n    <location x=\"64.98082\" y=\"129.350067\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"F\" iof-2004-ref=\"11.7\" />\r\n  </control>\r\n  <control id=\"15\" kind=\"normal\">\r\n    <code>37</code>\r\n    <location x=\"71.8275\" y=\"139.9188\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"E\" iof-2004-ref=\"3.6\" />\r\n    <description box=\"F\" iof-2004-ref=\"10.1\" />\r\n  </control>\r\n  <control id=\"42\" kind=\"normal\">\r\n    <code>38</code>\r\n    <location x=\"80.2943\" y=\"148.285324\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n  </control>\r\n  <control id=\"17\" kind=\"normal\">\r\n    <code>39</code>\r\n    <location x=\"34.5140839\" y=\"91.05244\" />\r\n    <description box=\"D\" iof-2004-ref=\"4.4\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.2NE\" />\r\n  </control>\r\n  <control id=\"23\" kind=\"normal\">\r\n    <code>40</code>\r\n    <location x=\"91.96569\" y=\"138.6052\" />\r\n    <description box=\"C\" iof-2004-ref=\"0.1S\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.13\" />\r\n  </control>\r\n  <control id=\"24\" kind=\"normal\">\r\n    <code>41</code>\r\n    <location x=\"110.713646\" y=\"126.764252\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.10\" />\r\n  </control>\r\n  <control id=\"25\" kind=\"normal\">\r\n    <code>42</code>\r\n    <location x=\"78.51836\" y=\"84.8133545\" />\r\n    <description box=\"D\" iof-2004-ref=\"4.4\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.1SE\" />\r\n  </control>\r\n  <control id=\"26\" kind=\"normal\">\r\n    <code>43</code>\r\n    <location x=\"84.85482\" y=\"77.8665543\" />\r\n    <description box=\"D\" iof-2004-ref=\"4.4\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.1SE\" />\r\n  </control>\r\n  <control id=\"27\" kind=\"normal\">\r\n    <code>44</code>\r\n    <location x=\"62.1889343\" y=\"51.8967438\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.10\" />\r\n  </control>\r\n  <control id=\"28\" kind=\"normal\">\r\n    <code>45</code>\r\n    <location x=\"8.112461\" y=\"43.03646\" />\r\n    <description box=\"D\" iof-2004-ref=\"4.4\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.2E\" />\r\n  </control>\r\n  <control id=\"29\" kind=\"normal\">\r\n    <code>46</code>\r\n    <location x=\"31.3751926\" y=\"78.75542\" />\r\n    <description box=\"C\" iof-2004-ref=\"0.1S\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.3\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.10\" />\r\n  </control>\r\n  <control id=\"30\" kind=\"normal\">\r\n    <code>47</code>\r\n    <location x=\"20.9663963\" y=\"132.004959\" />\r\n    <description box=\"C\" iof-2004-ref=\"0.5\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.13\" />\r\n  </control>\r\n  <control id=\"31\" kind=\"normal\">\r\n    <code>48</code>\r\n    <location x=\"19.7433376\" y=\"144.740021\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.12\" />\r\n  </control>\r\n  <control id=\"32\" kind=\"normal\">\r\n    <code>49</code>\r\n    <location x=\"34.4861946\" y=\"119.050323\" />\r\n    <description box=\"C\" iof-2004-ref=\"0.5\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.10\" />\r\n  </control>\r\n  <control id=\"34\" kind=\"normal\">\r\n    <code>50</code>\r\n    <location x=\"50.3374939\" y=\"139.197769\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.3\" />\r\n  </control>\r\n  <control id=\"35\" kind=\"normal\">\r\n    <code>51</code>\r\n    <location x=\"124.112724\" y=\"135.494186\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.3\" />\r\n  </control>\r\n  <control id=\"36\" kind=\"normal\">\r\n    <code>52</code>\r\n    <location x=\"110.187263\" y=\"154.594147\" />\r\n    <description box=\"D\" iof-2004-ref=\"3.7\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.1N\" />\r\n  </control>\r\n  <control id=\"37\" kind=\"normal\">\r\n    <code>53</code>\r\n    <location x=\"90.23759\" y=\"127.063721\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.13\" />\r\n  </control>\r\n  <control id=\"38\" kind=\"normal\">\r\n    <code>54</code>\r\n    <location x=\"102.013763\" y=\"101.303635\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.3\" />\r\n  </control>\r\n  <control id=\"39\" kind=\"normal\">\r\n    <code>55</code>\r\n    <location x=\"39.1706238\" y=\"109.763283\" />\r\n    <description box=\"C\" iof-2004-ref=\"0.2SW\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.3\" />\r\n  </control>\r\n  <control id=\"40\" kind=\"normal\">\r\n    <code>56</code>\r\n    <location x=\"30.0110168\" y=\"66.014534\" />\r\n    <description box=\"D\" iof-2004-ref=\"1.6\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.8N\" />\r\n  </control>\r\n  <control id=\"41\" kind=\"normal\">\r\n    <code>57</code>\r\n    <location x=\"67.74276\" y=\"84.97686\" />\r\n    <description box=\"D\" iof-2004-ref=\"4.5\" />\r\n    <description box=\"G\" iof-2004-ref=\"11.1N\" />\r\n  </control>\r\n  <control id=\"44\" kind=\"normal\">\r\n    <code>58</code>\r\n    <location x=\"60.1512337\" y=\"41.4735374\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"F\" iof-2004-ref=\"11.7\" />\r\n  </control>\r\n  <control id=\"45\" kind=\"normal\">\r\n    <code>59</code>\r\n    <location x=\"45.58684\" y=\"65.6313553\" />\r\n    <description box=\"D\" iof-2004-ref=\"5.2\" />\r\n    <description box=\"F\" iof-2004-ref=\"11.7\" />\r\n  </control>\r\n  <course id=\"1\" kind=\"normal\" order=\"1\">\r\n    <name>Yellow</name>\r\n    <labels label-kind=\"sequence\" />\r\n    <first course-control=\"1\" />\r\n    <print-area automatic=\"false\" restrict-to-page-size=\"true\" left=\"-74.15886\" top=\"195.8901\" right=\"127.771149\" bottom=\"-92.9079\" page-width=\"827\" page-height=\"1169\" page-margins=\"16\" page-landscape=\"false\" />\r\n    <options print-scale=\"10000\" description-kind=\"symbols\" />\r\n  </course>\r\n  <course id=\"2\" kind=\"normal\" order=\"2\">\r\n    <name>Green</name>\r\n    <labels label-kind=\"sequence\" />\r\n    <first course-control=\"3\" />\r\n    <print-area automatic=\"false\" restrict-to-page-size=\"true\" left=\"-74.15886\" top=\"195.8901\" right=\"127.771149\" bottom=\"-92.9079\" page-width=\"827\" page-height=\"1169\" page-margins=\"16\" page-landscape=\"false\" />\r\n    <options print-scale=\"10000\" description-kind=\"symbols\" />\r\n  </course>\r\n  <course id=\"4\" kind=\"normal\" order=\"3\">\r\n    <name>Blue</name>\r\n    <labels label-kind=\"sequence\" />\r\n    <first course-control=\"45\" />\r\n    <print-area automatic=\"false\" restrict-to-page-size=\"true\" left=\"-74.15886\" top=\"195.8901\" right=\"127.771149\" bottom=\"-92.9079\" page-width=\"827\" page-height=\"1169\" page-margins=\"16\" page-landscape=\"false\" />\r\n    <options print-scale=\"10000\" description-kind=\"symbols\" />\r\n  </course>\r\n  <course-control id=\"1\" control=\"1\">\r\n    <next course-control=\"7\" />\r\n  </course-control>\r\n  <course-control id=\"2\" control=\"2\" />\r\n  <course-control id=\"3\" control=\"1\">\r\n    <next course-control=\"28\" />\r\n  </course-control>\r\n  <course-control id=\"4\" control=\"2\" />\r\n  <course-control id=\"7\" control=\"3\">\r\n    <next course-control=\"14\" />\r\n  </course-control>\r\n  <course-control id=\"14\" control=\"10\">\r\n    <next course-control=\"68\" />\r\n  </course-control>\r\n  <course-control id=\"68\" control=\"43\">\r\n    <next course-control=\"69\" />\r\n  </course-control>\r\n  <course-control id=\"16\" control=\"12\">\r\n    <next course-control=\"17\" />\r\n  </course-control>\r\n  <course-control id=\"17\" control=\"13\">\r\n    <next course-control=\"18\" />\r\n  </course-control>\r\n  <course-control id=\"18\" control=\"14\">\r\n    <next course-control=\"19\" />\r\n  </course-control>\r\n  <course-control id=\"19\" control=\"15\">\r\n    <next course-control=\"2\" />\r\n  </course-control>\r\n  <course-control id=\"70\" control=\"45\">\r\n    <next course-control=\"16\" />\r\n  </course-control>\r\n  <course-control id=\"69\" control=\"44\">\r\n    <next course-control=\"70\" />\r\n  </course-control>\r\n  <course-control id=\"28\" control=\"23\">\r\n    <next course-control=\"29\" />\r\n  </course-control>\r\n  <course-control id=\"29\" control=\"24\">\r\n    <next course-control=\"42\" />\r\n  </course-control>\r\n  <course-control id=\"44\" control=\"25\">\r\n    <next course-control=\"32\" />\r\n  </course-control>\r\n  <course-control id=\"31\" control=\"26\">\r\n    <next course-control=\"44\" />\r\n  </course-control>\r\n  <course-control id=\"32\" control=\"27\">\r\n    <next course-control=\"33\" />\r\n  </course-control>\r\n  <course-control id=\"33\" control=\"28\">\r\n    <next course-control=\"34\" />\r\n  </course-control>\r\n  <course-control id=\"34\" control=\"29\">\r\n    <next course-control=\"35\" />\r\n  </course-control>\r\n  <course-control id=\"35\" control=\"17\">\r\n    <next course-control=\"36\" />\r\n  </course-control>\r\n  <course-control id=\"36\" control=\"30\">\r\n    <next course-control=\"37\" />\r\n  </course-control>\r\n  <course-control id=\"37\" control=\"31\">\r\n    <next course-control=\"38\" />\r\n  </course-control>\r\n  <course-control id=\"38\" control=\"32\">\r\n    <next course-control=\"41\" />\r\n  </course-control>\r\n  <course-control id=\"41\" control=\"34\">\r\n    <next course-control=\"40\" />\r\n  </course-control>\r\n  <course-control id=\"40\" control=\"15\">\r\n    <next course-control=\"4\" />\r\n  </course-control>\r\n  <course-control id=\"42\" control=\"35\">\r\n    <next course-control=\"43\" />\r\n  </course-control>\r\n  <course-control id=\"43\" control=\"36\">\r\n    <next course-control=\"31\" />\r\n  </course-control>\r\n  <course-control id=\"45\" control=\"1\">\r\n    <next course-control=\"46\" />\r\n  </course-control>\r\n  <course-control id=\"46\" control=\"23\">\r\n    <next course-control=\"47\" />\r\n  </course-control>\r\n  <course-control id=\"47\" control=\"24\">\r\n    <next course-control=\"48\" />\r\n  </course-control>\r\n  <course-control id=\"48\" control=\"35\">\r\n    <next course-control=\"49\" />\r\n  </course-control>\r\n  <course-control id=\"49\" control=\"36\">\r\n    <next course-control=\"50\" />\r\n  </course-control>\r\n  <course-control id=\"50\" control=\"26\">\r\n    <next course-control=\"51\" />\r\n  </course-control>\r\n  <course-control id=\"51\" control=\"25\">\r\n    <next course-control=\"65\" />\r\n  </course-control>\r\n  <course-control id=\"66\" control=\"27\">\r\n    <next course-control=\"67\" />\r\n  </course-control>\r\n  <course-control id=\"53\" control=\"28\">\r\n    <next course-control=\"66\" />\r\n  </course-control>\r\n  <course-control id=\"54\" control=\"29\">\r\n    <next course-control=\"55\" />\r\n  </course-control>\r\n  <course-control id=\"55\" control=\"17\">\r\n    <next course-control=\"56\" />\r\n  </course-control>\r\n  <course-control id=\"56\" control=\"30\">\r\n    <next course-control=\"57\" />\r\n  </course-control>\r\n  <course-control id=\"57\" control=\"31\">\r\n    <next course-control=\"58\" />\r\n  </course-control>\r\n  <course-control id=\"58\" control=\"32\">\r\n    <next course-control=\"62\" />\r\n  </course-control>\r\n  <course-control id=\"59\" control=\"34\">\r\n    <next course-control=\"60\" />\r\n  </course-control>\r\n  <course-control id=\"60\" control=\"15\">\r\n    <next course-control=\"61\" />\r\n  </course-control>\r\n  <course-control id=\"61\" control=\"2\" />\r\n  <course-control id=\"62\" control=\"37\">\r\n    <next course-control=\"63\" />\r\n  </course-control>\r\n  <course-control id=\"63\" control=\"38\">\r\n    <next course-control=\"64\" />\r\n  </course-control>\r\n  <course-control id=\"64\" control=\"39\">\r\n    <next course-control=\"59\" />\r\n  </course-control>\r\n  <course-control id=\"65\" control=\"40\">\r\n    <next course-control=\"53\" />\r\n  </course-control>\r\n  <course-control id=\"67\" control=\"41\">\r\n    <next course-control=\"54\" />\r\n  </course-control>\r\n  <special-object id=\"1\" kind=\"descriptions\">\r\n    <appearance columns=\"2\" />\r\n    <location x=\"-1.00035858\" y=\"2.0887146\" />\r\n    <location x=\"5.084303\" y=\"2.0887146\" />\r\n    <courses all=\"true\" />\r\n  </special-object>\r\n  <special-object id=\"2\" kind=\"text\">\r\n    <text>$(CourseName)</text>\r\n    <font name=\"Roboto\" bold=\"true\" italic=\"false\" />\r\n    <appearance color=\"purple\" />\r\n    <location x=\"102.2344\" y=\"2.537117\" />\r\n    <location x=\"157.146332\" y=\"-20.954422\" />\r\n    <courses all=\"true\" />\r\n  </special-object>\r\n  <special-object id=\"3\" kind=\"text\">\r\n    <text>Courses close 20:00</text>\r\n    <font name=\"Roboto\" bold=\"true\" italic=\"false\" />\r\n    <appearance color=\"purple\" />\r\n    <location x=\"102.5395\" y=\"-17.9026871\" />\r\n    <location x=\"157.146332\" y=\"-26.14064\" />\r\n    <courses all=\"true\" />\r\n  </special-object>\r\n</course-scribe-event>\r\n------WebKitFormBoundaryW0wKf7e6Tkruhksr--\r\n"
+        'headers': {'content-type': "multipart/form-data; boundary=" + boundary},
+        'body': "".join(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\""
+                        + (f"; filename=\"{filename}\"\r\nContent-Type: application/octet-stream" if filename else "")
+                        + f"\r\n\r\n{value}\r\n" for name, filename, value in parts) + f"--{boundary}--\r\n",
     }
     handler(event, None)
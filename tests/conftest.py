@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The handlers are top-level modules, deployed side by side rather than installed as a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
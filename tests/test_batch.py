@@ -0,0 +1,76 @@
+import base64
+import io
+import json
+import zipfile
+
+import pytest
+
+import make_gpx
+
+# The largest response a synchronously invoked Lambda function can return
+LAMBDA_MAX_RESPONSE_BYTES = 6 * 1024 * 1024
+
+
+def make_batch(queries) -> dict:
+    return make_gpx.batch_handler({'body': json.dumps(queries)}, None)
+
+
+def track_query(**query) -> dict:
+    return dict({'lat': 51.2, 'lon': -1.3, 'start_time': '202001011200', 'minutes': 30}, **query)
+
+
+def test_batch_has_a_file_per_track():
+    response = make_batch([track_query(), track_query(format='csv')])
+    assert response['statusCode'] == 200
+    assert response['headers']['Content-Type'] == 'application/zip'
+    with zipfile.ZipFile(io.BytesIO(base64.b64decode(response['body']))) as archive:
+        assert archive.namelist() == ['001-drongo-202001011200.gpx', '002-drongo-202001011200.csv']
+
+
+@pytest.mark.parametrize('body', ['not json', '{"lat": 1}', '[1, 2]'])
+def test_batch_must_be_a_list_of_tracks(body):
+    assert make_gpx.batch_handler({'body': body}, None)['statusCode'] == 400
+
+
+def test_batch_limits_tracks():
+    assert make_batch([])['statusCode'] == 400
+    response = make_batch([track_query()] * (make_gpx.MAX_BATCH_TRACKS + 1))
+    assert response['statusCode'] == 400
+    assert str(make_gpx.MAX_BATCH_TRACKS) in json.loads(response['body'])['message']
+
+
+def test_batch_limits_points():
+    tracks = make_gpx.MAX_BATCH_POINTS // (48 * 3600) + 1
+    response = make_batch([track_query(minutes=0, hours=48)] * tracks)
+    assert response['statusCode'] == 400
+    assert 'limit is' in json.loads(response['body'])['message']
+
+
+def test_batch_errors_name_the_track():
+    response = make_batch([track_query(), track_query(lat=91)])
+    assert response['statusCode'] == 400
+    assert json.loads(response['body'])['errors'] == ["Track 2: lat must be <= 90"]
+
+
+@pytest.mark.parametrize('output_format', sorted(make_gpx.OUTPUT_FORMATS))
+def test_largest_batch_fits_in_a_lambda_response(output_format):
+    # As many tracks as allowed, sharing the point limit, each long and far from the others so they compress badly
+    points_per_track = make_gpx.MAX_BATCH_POINTS // make_gpx.MAX_BATCH_TRACKS
+    queries = [track_query(lat=-60 + i * 2.4, lon=-170 + i * 6.5, minutes=0, hours=48, length=1000000,
+                           max_points=points_per_track, format=output_format)
+               for i in range(make_gpx.MAX_BATCH_TRACKS)]
+    response = make_batch(queries)
+    assert response['statusCode'] == 200
+    assert len(json.dumps(response)) < LAMBDA_MAX_RESPONSE_BYTES
+
+
+def test_batch_can_be_rendered_in_worker_processes():
+    from concurrent.futures import ProcessPoolExecutor
+    tracks = [make_gpx.parse_gpx_parameters(track_query(format=output_format))[0] for output_format in ('gpx', 'fit')]
+    threads, processes = io.BytesIO(), io.BytesIO()
+    make_gpx.write_gpx_zip(threads, tracks)
+    make_gpx.write_gpx_zip(processes, tracks, max_workers=2, executor_class=ProcessPoolExecutor)
+    with zipfile.ZipFile(threads) as expected, zipfile.ZipFile(processes) as archive:
+        assert archive.namelist() == expected.namelist()
+        for name in expected.namelist():
+            assert archive.read(name) == expected.read(name)
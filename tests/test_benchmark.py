@@ -0,0 +1,36 @@
+import json
+
+import benchmark
+
+
+def test_import_times_over_budget_are_reported(monkeypatch, capsys):
+    # Startup takes 10 ms, so each budget is ten times its multiple in milliseconds
+    times = {'router': 24.0, 'make_gpx': 41.0, 'shift_purple_pen': 45.0}
+    monkeypatch.setattr(benchmark, 'IMPORT_TIME_BUDGETS', {'router': 2.5, 'make_gpx': 4, 'shift_purple_pen': 4.5})
+    monkeypatch.setattr(benchmark, 'measure_import_time', lambda module: (times[module], 10.0))
+    assert benchmark.check_import_times() == ['import make_gpx']
+    lines = capsys.readouterr().out.splitlines()
+    assert [line for line in lines if 'OVER BUDGET' in line] == [
+        line for line in lines if line.startswith('import make_gpx')]
+
+
+def test_import_time_is_measured_against_interpreter_start():
+    ms, startup_ms = benchmark.measure_import_time('parameters', runs=1)
+    assert 0 < ms and 0 < startup_ms
+    assert benchmark.import_time_budget_ms('router', startup_ms) == benchmark.IMPORT_TIME_BUDGETS['router'] * startup_ms
+
+
+def test_cases_slower_than_the_tolerance_are_regressions(capsys):
+    baseline = {'a': {'seconds': 1.0}, 'b': {'seconds': 1.0}}
+    results = {'a': {'seconds': 1.2}, 'b': {'seconds': 1.3}, 'new': {'seconds': 5.0}}
+    assert benchmark.compare(results, baseline, 0.25) == ['b']
+    assert '(not in baseline)' in capsys.readouterr().out
+
+
+def test_committed_baseline_covers_every_quick_case():
+    with open(benchmark.BASELINE_FILE) as f:
+        baseline = json.load(f)
+    names = [name for name, *_ in benchmark.benchmark_cases(quick=True)]
+    assert f"make_gpx/{benchmark.SHORTEST_GPX_DURATION}s" in names
+    # The numpy cases are only run, and so only in the baseline, where numpy is installed
+    assert [name for name in names if name not in baseline and 'numpy' not in name] == []
@@ -0,0 +1,111 @@
+import base64
+import gzip
+
+import pytest
+
+import compression
+
+TEXT = ['<gpx>', 'é' * 1000, '<trk>' * 500, '</gpx>']
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    return pytest.importorskip('brotli').decompress(data)
+
+
+@pytest.mark.parametrize('accept_encoding,expected', [
+    (None, None),
+    ('', None),
+    ('gzip', 'gzip'),
+    ('GZIP', 'gzip'),
+    ('deflate', None),
+    # Equally acceptable codings are chosen in order of preference, otherwise by q-value
+    ('gzip, br', 'br'),
+    ('gzip;q=1.0, br;q=0.5', 'gzip'),
+    ('br;q=0.2, gzip;q=0.8', 'gzip'),
+    ('*', 'br'),
+    ('*;q=0.5, br;q=0.1', 'gzip'),
+    # q=0 refuses a coding, including one only accepted by a wildcard
+    ('gzip;q=0', None),
+    ('br;q=0, *', 'gzip'),
+    ('*;q=0, gzip', 'gzip'),
+    # A client that refuses an uncompressed body is still sent one if none of its codings are supported
+    ('identity;q=0', None),
+    ('deflate, identity;q=0', None),
+    ('gzip;q=x', None),
+])
+def test_choose_encoding_follows_q_values(monkeypatch, accept_encoding, expected):
+    monkeypatch.setattr(compression, 'SUPPORTED_ENCODINGS', ('br', 'gzip'))
+    assert compression.choose_encoding(accept_encoding) == expected
+
+
+def test_choose_encoding_only_picks_supported_encodings(monkeypatch):
+    monkeypatch.setattr(compression, 'SUPPORTED_ENCODINGS', ('gzip',))
+    assert compression.choose_encoding('br') is None
+    assert compression.choose_encoding('br, gzip;q=0.1') == 'gzip'
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'br'])
+@pytest.mark.parametrize('chunks', [TEXT, [chunk.encode('utf8') for chunk in TEXT], []])
+def test_iter_compressed_round_trips_str_and_bytes(encoding, chunks):
+    if encoding == 'br':
+        pytest.importorskip('brotli')
+    data = b''.join(compression.iter_compressed(iter(chunks), encoding))
+    expected = b''.join(chunk if isinstance(chunk, bytes) else chunk.encode('utf8') for chunk in chunks)
+    assert decompress(data, encoding) == expected
+
+
+def test_iter_compressed_encodes_text_as_asked():
+    data = b''.join(compression.iter_compressed(['é'], 'gzip', text_encoding='latin-1'))
+    assert gzip.decompress(data) == b'\xe9'
+
+
+def test_iter_compressed_rejects_unknown_encodings():
+    with pytest.raises(ValueError):
+        list(compression.iter_compressed(TEXT, 'compress'))
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'br'])
+def test_compressed_response_round_trips(monkeypatch, encoding):
+    if encoding == 'br':
+        pytest.importorskip('brotli')
+    monkeypatch.setattr(compression, 'SUPPORTED_ENCODINGS', (encoding,))
+    response = compression.make_response({'headers': {'Accept-Encoding': encoding}}, iter(TEXT),
+                                         {'Content-Type': 'application/gpx+xml'})
+    assert response['statusCode'] == 200 and response['isBase64Encoded']
+    assert response['headers'] == {'Content-Type': 'application/gpx+xml', 'Vary': 'Accept-Encoding',
+                                   'Content-Encoding': encoding}
+    assert decompress(base64.b64decode(response['body']), encoding).decode('utf8') == ''.join(TEXT)
+
+
+def test_uncompressed_response_varies_by_accept_encoding():
+    response = compression.make_response({'headers': {'Accept-Encoding': 'identity'}}, iter(TEXT),
+                                         {'Content-Type': 'application/gpx+xml'})
+    assert response['body'] == ''.join(TEXT) and not response.get('isBase64Encoded')
+    assert response['headers'] == {'Content-Type': 'application/gpx+xml', 'Vary': 'Accept-Encoding'}
+
+
+def test_uncompressed_binary_response_is_base64_encoded():
+    response = compression.make_response({}, [b'\x00\x01', b'\xff'], {}, binary=True)
+    assert response['isBase64Encoded'] and base64.b64decode(response['body']) == b'\x00\x01\xff'
+    assert 'Content-Encoding' not in response['headers']
+
+
+@pytest.mark.parametrize('accept_encoding', [None, 'gzip'])
+def test_streamed_response_is_compressed_as_it_is_sent(accept_encoding):
+    event = {'streamBody': True, 'headers': {'Accept-Encoding': accept_encoding} if accept_encoding else {}}
+    response = compression.make_response(event, iter(TEXT), {'Content-Type': 'application/gpx+xml'})
+    assert 'body' not in response
+    assert response['headers'].get('Content-Encoding') == accept_encoding
+    assert response['headers']['Vary'] == 'Accept-Encoding'
+    body = b''.join(response['bodyChunks'])
+    if accept_encoding is not None:
+        body = gzip.decompress(body)
+    assert body.decode('utf8') == ''.join(TEXT)
+
+
+def test_join_body_base64_encodes_the_streamed_chunks():
+    response = compression.join_body({'statusCode': 200, 'bodyChunks': iter([b'ab', b'c']), 'headers': {}})
+    assert response == {'statusCode': 200, 'body': base64.b64encode(b'abc').decode('ascii'),
+                        'isBase64Encoded': True, 'headers': {}}
@@ -0,0 +1,125 @@
+import datetime
+from array import array
+
+import pytest
+
+import make_gpx
+import request_log
+import shapes
+
+DURATIONS = [datetime.timedelta(minutes=10), datetime.timedelta(hours=2)]
+
+
+@pytest.mark.parametrize('duration', DURATIONS)
+def test_numpy_and_python_backends_agree(duration):
+    pytest.importorskip('numpy')
+    geometry = make_gpx.get_shape_geometry()
+    python = make_gpx.calculate_coordinates(10000, geometry, 51.2, -1.3, duration, backend="python", cache=False)
+    numpy = make_gpx.calculate_coordinates(10000, geometry, 51.2, -1.3, duration, backend="numpy", cache=False)
+    # The backends can differ in the last bits, but not at the 7 decimal places written out
+    assert len(python) == len(numpy)
+    for python_lat_lon, numpy_lat_lon in zip(python, numpy):
+        assert '{0:.7f},{1:.7f}'.format(*python_lat_lon) == '{0:.7f},{1:.7f}'.format(*numpy_lat_lon)
+
+
+def test_numpy_and_python_backends_resample_along_the_same_total_length():
+    pytest.importorskip('numpy')
+    geometry = make_gpx.get_shape_geometry()
+    # Resampling scans the cumulative lengths up to the total, so it must be exactly where they end
+    assert geometry.total_length == geometry.cumulative_length[-1]
+    python = make_gpx.resample_xy(10000, geometry, 2000, 'python')
+    numpy = make_gpx.resample_xy(10000, geometry, 2000, 'numpy')
+    assert numpy.ravel().tolist() == pytest.approx([c for x_y in python for c in x_y], rel=1e-12, abs=1e-9)
+
+
+def test_shape_geometry_is_built_once_per_process(monkeypatch):
+    geometry = make_gpx.get_shape_geometry()
+    assert make_gpx.get_shape_geometry() is geometry
+
+    def load_lat_lons(name):
+        raise AssertionError(f"{name} loaded again")
+    monkeypatch.setattr(shapes, 'load_lat_lons', load_lat_lons)
+    make_gpx.make_gpx(10000, datetime.datetime(2020, 1, 1), datetime.timedelta(minutes=10), 51.2, -1.3)
+
+
+def test_shape_geometry_gives_the_same_track_as_its_vertices():
+    lat_lons = shapes.load_lat_lons(shapes.DEFAULT_SHAPE)
+    geometry = make_gpx.ShapeGeometry(lat_lons)
+    assert len(geometry.diffs) == len(geometry.cumulative_length) == len(lat_lons) - 1
+    assert geometry.cumulative_length[-1] == geometry.total_length
+    duration = datetime.timedelta(minutes=10)
+    assert make_gpx.calculate_coordinates(10000, geometry, 51.2, -1.3, duration, backend="python", cache=False) == \
+        make_gpx.calculate_coordinates(10000, lat_lons, 51.2, -1.3, duration, backend="python")
+
+
+@pytest.mark.parametrize('interval,max_points', [(1, None), (5, None), (1, 1000)])
+def test_one_coordinate_per_sample(interval, max_points):
+    geometry = make_gpx.get_shape_geometry()
+    duration = datetime.timedelta(hours=2)
+    coordinates = make_gpx.calculate_coordinates(10000, geometry, 51.2, -1.3, duration, backend="python",
+                                                 interval=interval, max_points=max_points, cache=False)
+    assert len(coordinates) == len(make_gpx.sample_offsets(duration, interval, max_points))
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        make_gpx.calculate_coordinates(10000, make_gpx.get_shape_geometry(), 51.2, -1.3,
+                                       datetime.timedelta(minutes=10), backend="fortran")
+
+
+def test_sample_offsets_every_interval_ending_at_the_last_second():
+    assert list(make_gpx.sample_offsets(datetime.timedelta(seconds=10))) == list(range(10))
+    assert list(make_gpx.sample_offsets(datetime.timedelta(seconds=10), interval=4)) == [0, 4, 8, 9]
+    assert list(make_gpx.sample_offsets(datetime.timedelta(seconds=9), interval=4)) == [0, 4, 8]
+
+
+def test_sample_offsets_widen_the_interval_to_stay_within_max_points():
+    offsets = make_gpx.sample_offsets(datetime.timedelta(hours=48), max_points=1000)
+    assert len(offsets) <= 1000
+    assert offsets[0] == 0 and offsets[-1] == 48 * 3600 - 1
+    # A larger interval than max_points needs is kept
+    assert len(make_gpx.sample_offsets(datetime.timedelta(hours=1), interval=60, max_points=1000)) == 61
+
+
+def xy(n: int = 2):
+    return array('d', [0.0] * n)
+
+
+def test_xy_cache_counts_hits_and_misses_in_the_request_log():
+    cache = make_gpx.ResampledXYCache(1000)
+    log = request_log._threads.log = request_log.RequestLog('test', {})
+    try:
+        first = cache.get_or_compute('a', xy)
+        assert cache.get_or_compute('a', xy) is first
+        cache.get_or_compute('b', xy)
+    finally:
+        request_log._threads.log = None
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert log.counters == {'xy_cache_hits': 1, 'xy_cache_misses': 2}
+
+
+def test_xy_cache_evicts_the_least_recently_used():
+    # Each value is 16 bytes, so two fit
+    cache = make_gpx.ResampledXYCache(40)
+    a = cache.get_or_compute('a', xy)
+    cache.get_or_compute('b', xy)
+    cache.get_or_compute('a', xy)
+    cache.get_or_compute('c', xy)
+    assert cache.size_bytes == 32
+    assert cache.get_or_compute('a', xy) is a
+    assert (cache.hits, cache.misses) == (2, 3)
+    cache.get_or_compute('b', xy)
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_xy_cache_does_not_keep_values_over_its_size():
+    cache = make_gpx.ResampledXYCache(40)
+    cache.get_or_compute('a', lambda: xy(10))
+    cache.get_or_compute('a', lambda: xy(10))
+    assert (cache.hits, cache.misses, cache.size_bytes) == (0, 2, 0)
+
+
+def test_xy_cache_keeps_the_packed_value():
+    cache = make_gpx.ResampledXYCache(1000)
+    assert cache.get_or_compute('a', lambda: [1.0, 2.0], pack=lambda value: array('d', value)) == [1.0, 2.0]
+    assert cache.get_or_compute('a', lambda: [1.0, 2.0], pack=lambda value: array('d', value)) == array('d', [1, 2])
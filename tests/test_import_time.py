@@ -0,0 +1,10 @@
+import pytest
+
+import benchmark
+
+
+@pytest.mark.parametrize('module', sorted(benchmark.IMPORT_TIME_BUDGETS))
+def test_import_time_within_budget(module):
+    ms, startup_ms = benchmark.measure_import_time(module)
+    budget_ms = benchmark.import_time_budget_ms(module, startup_ms)
+    assert ms <= budget_ms, f"import {module} took {ms:.2f} ms, over its budget of {budget_ms:.2f} ms"
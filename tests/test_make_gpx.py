@@ -0,0 +1,59 @@
+import datetime
+import xml.etree.ElementTree as ET
+
+import make_gpx
+
+START_TIME = datetime.datetime(2020, 1, 1, 12, 0, 0)
+GPX_NS = {'gpx': 'http://www.topografix.com/GPX/1/1'}
+
+
+def parse_gpx(document: str):
+    return ET.fromstring(document.strip())
+
+
+def test_gpx_chunks_join_to_make_gpx():
+    duration = datetime.timedelta(minutes=30)
+    chunks = list(make_gpx.iter_gpx(10000, START_TIME, duration, 51.2, -1.3))
+    assert len(chunks) > 2
+    assert ''.join(chunks) == make_gpx.make_gpx(10000, START_TIME, duration, 51.2, -1.3)
+
+
+def test_gpx_has_one_trackpoint_per_second():
+    root = parse_gpx(make_gpx.make_gpx(10000, START_TIME, datetime.timedelta(minutes=30), 51.2, -1.3))
+    points = root.findall('.//gpx:trkpt', GPX_NS)
+    assert len(points) == 30 * 60
+    times = [p.find('gpx:time', GPX_NS).text for p in points]
+    assert times[0] == '2020-01-01T12:00:00Z'
+    assert times[61] == '2020-01-01T12:01:01Z'
+    assert times[-1] == '2020-01-01T12:29:59Z'
+    assert root.find('gpx:metadata/gpx:time', GPX_NS).text == '2020-01-01T12:00:00Z'
+
+
+def test_gpx_track_is_near_its_anchor():
+    root = parse_gpx(make_gpx.make_gpx(5000, START_TIME, datetime.timedelta(minutes=30), 51.2, -1.3))
+    for point in root.iterfind('.//gpx:trkpt', GPX_NS):
+        assert abs(float(point.get('lat')) - 51.2) < 0.1
+        assert abs(float(point.get('lon')) + 1.3) < 0.1
+
+
+def test_timestamps_carry_across_minutes_and_days():
+    start = datetime.datetime(2020, 12, 31, 23, 59, 58)
+    assert list(make_gpx.iter_timestamps(start, [0, 1, 2, 62])) == [
+        '2020-12-31T23:59:58Z', '2020-12-31T23:59:59Z', '2021-01-01T00:00:00Z', '2021-01-01T00:01:00Z']
+
+
+def test_timestamps_match_format_date_over_two_days_of_sampled_offsets():
+    # Across a leap day and the end of February, with offsets which skip whole minutes
+    start = datetime.datetime(2020, 2, 28, 23, 58, 31)
+    offsets = make_gpx.sample_offsets(datetime.timedelta(hours=48), interval=67)
+    expected = [make_gpx.format_date(start + datetime.timedelta(seconds=offset)) for offset in offsets]
+    assert list(make_gpx.iter_timestamps(start, offsets)) == expected
+    assert expected[1] == '2020-02-28T23:59:38Z'
+    assert any(timestamp.startswith('2020-02-29T') for timestamp in expected)
+    assert expected[-1] == '2020-03-01T23:58:30Z'
+
+
+def test_timestamps_ignore_microseconds_and_utc_time_zone():
+    start = datetime.datetime(2020, 1, 1, 12, 0, 59, 999999, tzinfo=datetime.timezone.utc)
+    assert list(make_gpx.iter_timestamps(start, [0, 1])) == ['2020-01-01T12:00:59Z', '2020-01-01T12:01:00Z']
+    assert make_gpx.format_date(start) == '2020-01-01T12:00:59Z'
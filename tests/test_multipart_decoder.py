@@ -0,0 +1,65 @@
+import pytest
+
+from multipart_decoder import ImproperBodyPartContentException, MultipartDecoder, \
+    NonMultipartContentTypeException, StreamingMultipartDecoder
+
+BOUNDARY = 'drongo-boundary'
+CONTENT_TYPE = f'multipart/form-data; boundary="{BOUNDARY}"'
+
+
+def make_body(parts, preamble: bytes = b'', end: bytes = b'--\r\n') -> bytes:
+    """A multipart body of ``(disposition, content)`` parts"""
+    body = preamble
+    for disposition, content in parts:
+        body += f'--{BOUNDARY}\r\nContent-Disposition: form-data; {disposition}\r\n\r\n'.encode('utf8')
+        body += content + b'\r\n'
+    return body + f'--{BOUNDARY}'.encode('utf8') + end
+
+
+FORM = [
+    ('name="controlcode"', b'31'),
+    # The file name comes first and has "name=" in it, and the content has line breaks and a near-boundary
+    ('filename="name=x.ppen"; name="originalfile"', b'<a>\r\n\r\n--drongo\r\n</a>'),
+    ('name="empty"', b''),
+    ('name="controlcode"', b'32'),
+]
+
+
+def test_streaming_decoder_reads_the_same_parts_as_the_buffering_decoder():
+    buffered = MultipartDecoder(make_body(FORM), CONTENT_TYPE).parts
+    # Unlike the buffering decoder, the streaming decoder skips a preamble before the first part
+    streamed = list(StreamingMultipartDecoder(make_body(FORM, preamble=b'preamble\r\n'), CONTENT_TYPE).iter_parts())
+    assert [bytes(part.content) for part in streamed] == [part.content for part in buffered] == \
+        [content for _, content in FORM]
+    assert [part.name for part in streamed] == ['controlcode', 'originalfile', 'empty', 'controlcode']
+    assert streamed[1].filename == 'name=x.ppen' and streamed[0].filename is None
+    assert isinstance(streamed[1].content, memoryview)
+
+
+def test_first_of_a_repeated_field_is_used():
+    decoder = StreamingMultipartDecoder(make_body(FORM), CONTENT_TYPE)
+    assert decoder.get_fields(('controlcode', 'missing')) == {'controlcode': '31'}
+
+
+def test_parsing_stops_once_every_field_is_found():
+    body = make_body(FORM[:2], end=b'\r\nno headers here')
+    with pytest.raises(ImproperBodyPartContentException):
+        list(StreamingMultipartDecoder(body, CONTENT_TYPE).iter_parts())
+    assert StreamingMultipartDecoder(body, CONTENT_TYPE).get_fields(('controlcode',)) == {'controlcode': '31'}
+
+
+def test_body_without_a_closing_delimiter_ends_its_last_part_at_the_end():
+    body = make_body(FORM[:1])[:-len(f'\r\n--{BOUNDARY}--\r\n')]
+    assert StreamingMultipartDecoder(body, CONTENT_TYPE).get_fields(('controlcode',)) == {'controlcode': '31'}
+
+
+def test_body_without_the_boundary_has_no_parts():
+    assert list(StreamingMultipartDecoder(b'just text', CONTENT_TYPE).iter_parts()) == []
+
+
+def test_content_type_must_be_multipart_and_may_omit_the_boundary():
+    with pytest.raises(NonMultipartContentTypeException):
+        StreamingMultipartDecoder(b'', 'application/json')
+    assert StreamingMultipartDecoder(b'', 'Multipart/Form-Data').boundary is None
+    assert StreamingMultipartDecoder(b'', f'multipart/form-data; Boundary={BOUNDARY}').boundary == \
+        BOUNDARY.encode('utf8')
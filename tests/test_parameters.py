@@ -0,0 +1,89 @@
+import datetime
+
+import pytest
+
+import make_gpx
+import parameters
+
+QUERY = {'lat': '51.2', 'lon': '-1.3', 'start_time': '202001011200', 'minutes': '30'}
+
+
+def gpx_errors(**query):
+    return make_gpx.parse_gpx_parameters(dict(QUERY, **query))[1]
+
+
+def test_valid_query_gives_track_arguments():
+    params, errors = make_gpx.parse_gpx_parameters(dict(QUERY, start_time='20200101123456', length='5000'))
+    assert errors == []
+    assert params == {'length_metres': 5000, 'start_time': datetime.datetime(2020, 1, 1, 12, 34, 56),
+                      'duration': datetime.timedelta(minutes=30), 'lat': 51.2, 'lon': -1.3, 'shape': 'drongo',
+                      'interval': 1, 'max_points': None, 'output_format': 'gpx'}
+
+
+def test_missing_parameters_are_each_reported():
+    _, errors = make_gpx.parse_gpx_parameters({'minutes': '30'})
+    assert errors == ["Missing required parameter lat", "Missing required parameter lon",
+                      "Missing required parameter start_time"]
+
+
+@pytest.mark.parametrize('name,value,error', [
+    ('lat', 'north', "lat must be a number"),
+    ('lat', '90.5', "lat must be <= 90"),
+    ('lon', '-181', "lon must be >= -180"),
+    ('start_time', '2020-01-01', "start_time format does not match YYYYMMDDHHMM or YYYYMMDDHHSS"),
+    ('start_time', '202013011200', "start_time format does not match YYYYMMDDHHMM or YYYYMMDDHHSS"),
+    ('length', '0', "length must be > 0"),
+    ('length', '1000001', "length must be <= 1000000"),
+    ('minutes', '61', "minutes must be <= 60"),
+    ('interval', '0', "interval must be >= 1"),
+    ('shape', 'emu', "shape must be one of drongo"),
+    ('format', 'kml', "format must be one of gpx, fit, geojson, csv"),
+])
+def test_invalid_parameter(name, value, error):
+    assert gpx_errors(**{name: value}) == [error]
+
+
+def test_length_limits_are_inclusive():
+    assert gpx_errors(length='1000000') == []
+    assert gpx_errors(length='1') == []
+
+
+@pytest.mark.parametrize('duration,error', [
+    ({'minutes': '0', 'seconds': '9'}, "Total duration (hours+minutes+seconds) must be at least 10 seconds"),
+    ({'minutes': '0', 'hours': '49'}, "Total activity duration should be <= 48 hours"),
+])
+def test_duration_limits(duration, error):
+    assert gpx_errors(**duration) == [error]
+
+
+def test_track_needs_enough_points_for_its_shape():
+    min_points = make_gpx.get_shape_geometry().min_points
+    smallest = make_gpx.smallest_max_points(datetime.timedelta(minutes=30), 1, min_points)
+    assert gpx_errors(max_points=str(min_points - 1)) == [
+        f"max_points must be >= {smallest} for the drongo shape, which needs at least {min_points} points"]
+    assert gpx_errors(max_points=str(smallest)) == []
+    assert gpx_errors(minutes='5')[0].startswith("Track would only have 300 points")
+
+
+def test_rules_only_run_once_every_parameter_is_valid():
+    calls = []
+    validate = parameters.compile_schema([parameters.Parameter('n', int, "must be an integer")],
+                                         rules=[lambda values: calls.append(values)])
+    assert validate({'n': 'x'}) == ({}, ["n must be an integer"])
+    assert calls == []
+    assert validate({'n': '3'}) == ({'n': 3}, [])
+    assert calls == [{'n': 3}]
+
+
+def test_max_points_above_the_shape_minimum_can_still_give_too_few_points():
+    # An interval of 6 seconds would give 601 points, so 600 allows no more than the 516 of a 7 second interval
+    duration = datetime.timedelta(hours=1)
+    min_points = make_gpx.get_shape_geometry().min_points
+    assert len(make_gpx.sample_offsets(duration, max_points=600)) == 516 < min_points < 600
+    smallest = make_gpx.smallest_max_points(duration, 1, min_points)
+    assert len(make_gpx.sample_offsets(duration, max_points=smallest)) >= min_points
+    assert len(make_gpx.sample_offsets(duration, max_points=smallest - 1)) < min_points
+    assert gpx_errors(minutes='0', hours='1', max_points='600') == [
+        f"max_points must be >= {smallest} for the drongo shape, which needs at least {min_points} points"]
+    # Without enough seconds for the shape, max_points cannot help
+    assert make_gpx.smallest_max_points(datetime.timedelta(minutes=5), 1, min_points) is None
@@ -0,0 +1,220 @@
+import json
+import sys
+import threading
+import time
+
+import pytest
+
+import request_log
+
+
+def run_in_threads(fn, num_threads: int = 8):
+    threads = [threading.Thread(target=request_log.bind(fn)) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_batch_workers_add_to_the_request_log_without_losing_updates():
+    def work():
+        for _ in range(5000):
+            request_log.count('files')
+            with request_log.stage('rewrite'):
+                pass
+
+    log = request_log._threads.log = request_log.RequestLog('test', {})
+    interval = sys.getswitchinterval()
+    # Switch threads as often as possible, so that unsynchronised updates would be lost
+    sys.setswitchinterval(1e-6)
+    try:
+        run_in_threads(work)
+    finally:
+        sys.setswitchinterval(interval)
+        request_log._threads.log = None
+    assert log.counters == {'files': 8 * 5000}
+    assert list(log.stages) == ['rewrite']
+
+
+def make_handler(response=None, error: Exception = None):
+    @request_log.logged('test')
+    def handler(event, context):
+        with request_log.stage('work'):
+            request_log.count('points', 3)
+        if error is not None:
+            raise error
+        return response
+    return handler
+
+
+def log_lines(capsys) -> list:
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_only_failed_requests_are_logged_when_sampled_out(monkeypatch, capsys):
+    monkeypatch.setattr(request_log, 'LOG_SAMPLE_RATE', 0.0)
+    make_handler({'statusCode': 200, 'body': 'ok'})({}, None)
+    assert log_lines(capsys) == []
+    make_handler({'statusCode': 400, 'body': 'bad'})({}, None)
+    assert [line['response'] for line in log_lines(capsys)] == [{'status': 400, 'body_length': 3}]
+    with pytest.raises(ValueError):
+        make_handler(error=ValueError('broken'))({}, None)
+    assert [line['error'] for line in log_lines(capsys)] == ['ValueError: broken']
+
+
+def test_sensitive_headers_are_redacted_and_long_values_truncated(monkeypatch):
+    monkeypatch.setattr(request_log, 'LOG_MAX_VALUE_LENGTH', 5)
+    event = {'httpMethod': 'GET', 'path': '/gpx', 'queryStringParameters': {'shape': 'drongo-long'},
+             'headers': {'Authorization': 'Bearer secret', 'X-Api-Key': 'key', 'Accept': 'text/html'},
+             'body': 'abc'}
+    assert request_log.summarise_event(event) == {
+        'method': 'GET', 'path': '/gpx', 'query': {'shape': 'drong...'},
+        'headers': {'Authorization': '[redacted]', 'X-Api-Key': '[redacted]', 'Accept': 'text/...'},
+        'body_length': 3, 'base64': False,
+    }
+
+
+def test_long_lines_drop_the_headers_and_then_the_query(monkeypatch):
+    fields = {'handler': 'test', 'request': {'query': {'q': 'x' * 50}, 'headers': {'h': 'y' * 50}}}
+    monkeypatch.setattr(request_log, 'LOG_MAX_LINE_LENGTH', 150)
+    assert json.loads(request_log.format_line(fields))['request'] == {'query': {'q': 'x' * 50},
+                                                                      'headers': '[truncated]'}
+    monkeypatch.setattr(request_log, 'LOG_MAX_LINE_LENGTH', 100)
+    assert json.loads(request_log.format_line(fields))['request'] == {'query': '[truncated]',
+                                                                      'headers': '[truncated]'}
+
+
+def test_metric_headers_are_added_when_the_request_asks(monkeypatch):
+    monkeypatch.setattr(request_log, 'METRICS', frozenset())
+    handler = make_handler({'statusCode': 200, 'body': 'ok', 'headers': {'Content-Type': 'text/plain'}})
+    assert handler({}, None)['headers'] == {'Content-Type': 'text/plain'}
+    headers = handler({'headers': {'X-Drongo-Metrics': '1'}}, None)['headers']
+    assert headers['Content-Type'] == 'text/plain'
+    assert headers['Server-Timing'].startswith('work;dur=')
+    assert headers['X-Metrics'] == 'points=3'
+
+
+def test_emf_line_has_the_stages_and_counters(monkeypatch, capsys):
+    monkeypatch.setattr(request_log, 'METRICS', frozenset(['emf']))
+    make_handler({'statusCode': 200, 'body': 'ok'})({}, None)
+    line, emf = log_lines(capsys)
+    metrics = emf['_aws']['CloudWatchMetrics'][0]
+    assert metrics['Dimensions'] == [['handler']]
+    assert metrics['Metrics'] == [{'Name': 'work_ms', 'Unit': 'Milliseconds'},
+                                  {'Name': 'duration_ms', 'Unit': 'Milliseconds'},
+                                  {'Name': 'points', 'Unit': 'Count'},
+                                  {'Name': 'response_bytes', 'Unit': 'Bytes'}]
+    assert emf['handler'] == 'test'
+    assert emf['duration_ms'] == line['duration_ms']
+    assert emf['work_ms'] == line['stages_ms']['work']
+    assert emf['points'] == 3 and emf['response_bytes'] == 2
+
+
+def test_streamed_body_is_logged_once_sent(capsys):
+    response = make_handler({'statusCode': 200, 'bodyChunks': iter([b'ab', b'cde'])})({}, None)
+    assert log_lines(capsys) == []
+    assert b''.join(response['bodyChunks']) == b'abcde'
+    [line] = log_lines(capsys)
+    assert line['response'] == {'status': 200, 'body_length': 5}
+    assert line['counters'] == {'points': 3, 'response_bytes': 5}
+    assert set(line['stages_ms']) == {'work', 'streaming'}
+    assert 'body_incomplete' not in line
+
+
+def test_streamed_body_is_logged_when_abandoned(capsys):
+    response = make_handler({'statusCode': 200, 'bodyChunks': iter([b'ab', b'cde'])})({}, None)
+    chunks = response['bodyChunks']
+    assert next(chunks) == b'ab'
+    chunks.close()
+    [line] = log_lines(capsys)
+    assert line['response'] == {'status': 200, 'body_length': 2}
+    assert line['body_incomplete'] is True
+
+
+def test_streamed_body_is_joined_when_profiled(monkeypatch, capsys):
+    monkeypatch.setattr(request_log, 'PROFILE', 'cpu')
+    response = make_handler({'statusCode': 200, 'bodyChunks': iter([b'ab', b'cde'])})({}, None)
+    assert 'bodyChunks' not in response and response['isBase64Encoded']
+    profile, line = log_lines(capsys)
+    assert profile['profile'] == 'cpu' and 'function calls' in profile['report']
+    assert line['response'] == {'status': 200, 'body_length': len(response['body'])}
+
+
+@pytest.mark.parametrize('allow,expected', [(False, None), (True, 'memory')])
+def test_profile_header_is_only_followed_when_allowed(monkeypatch, allow, expected):
+    monkeypatch.setattr(request_log, 'ALLOW_PROFILE_HEADER', allow)
+    assert request_log.profile_mode({'headers': {'X-Drongo-Profile': 'memory'}}) == expected
+    assert request_log.profile_mode({'headers': {'X-Drongo-Profile': 'everything'}}) is None
+
+
+def test_memory_profile_reports_the_peak():
+    with request_log.Profile('memory') as profile:
+        data = [bytes(1000) for _ in range(100)]
+    assert profile.peak_memory_bytes >= 100 * 1000
+    assert profile.report
+    del data
+
+
+def test_memory_profiles_of_concurrent_requests_do_not_interfere(monkeypatch, capsys):
+    monkeypatch.setattr(request_log, 'PROFILE', 'memory')
+    errors = []
+
+    @request_log.logged('test')
+    def handler(event, context):
+        data = [bytes(1000) for _ in range(100)]
+        # Stay inside the profile long enough for the other requests to start theirs
+        time.sleep(0.02)
+        return {'statusCode': 200, 'body': str(len(data))}
+
+    def work():
+        # Each thread handles its own request, so it starts outside the log of the test
+        request_log._threads.log = None
+        try:
+            handler({}, None)
+        except Exception as e:
+            errors.append(e)
+
+    run_in_threads(work)
+    assert errors == []
+    peaks = [line['counters']['peak_memory_bytes'] for line in log_lines(capsys) if 'counters' in line]
+    assert len(peaks) == 8 and all(peak >= 100 * 1000 for peak in peaks)
+
+
+def test_no_profile_does_nothing():
+    with request_log.Profile(None) as profile:
+        pass
+    assert profile.report is None and profile.peak_memory_bytes is None
+
+
+def test_body_is_only_logged_as_its_length(capsys):
+    event = {'httpMethod': 'POST', 'path': '/shiftpurplepen', 'body': 'secret course', 'isBase64Encoded': False,
+             'headers': {'COOKIE': 'session=1', 'authorization': 'Basic x', 'x-API-key': 'k'}}
+    make_handler({'statusCode': 200, 'body': 'ok'})(event, type('Context', (), {'aws_request_id': 'abc'})())
+    output = capsys.readouterr().out
+    assert 'secret' not in output and 'session=1' not in output and 'Basic' not in output
+    [line] = [json.loads(line) for line in output.splitlines()]
+    assert line['request_id'] == 'abc'
+    assert line['request']['body_length'] == len('secret course')
+    assert line['request']['headers'] == {'COOKIE': '[redacted]', 'authorization': '[redacted]',
+                                          'x-API-key': '[redacted]'}
+
+
+def test_values_are_truncated_beyond_the_limit_only(monkeypatch):
+    monkeypatch.setattr(request_log, 'LOG_MAX_VALUE_LENGTH', 5)
+    assert request_log.truncate('abcde') == 'abcde'
+    assert request_log.truncate('abcdef') == 'abcde...'
+    assert request_log.truncate(123456) == '12345...'
+    assert request_log.truncate('abcdef', max_length=10) == 'abcdef'
+
+
+def test_errors_are_truncated(monkeypatch, capsys):
+    monkeypatch.setattr(request_log, 'LOG_MAX_VALUE_LENGTH', 20)
+    with pytest.raises(ValueError):
+        make_handler(error=ValueError('x' * 100))({}, None)
+    [line] = log_lines(capsys)
+    assert line['error'] == 'ValueError: xxxxxxxx...'
+
+
+def test_short_lines_are_logged_whole():
+    fields = {'handler': 'test', 'request': {'query': {'q': 'x'}, 'headers': {'h': 'y'}}}
+    assert json.loads(request_log.format_line(fields)) == fields
@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+import make_gpx
+import response_cache
+import shift_purple_pen
+from test_shift_purple_pen import make_ppen, make_request, shift_fields
+
+QUERY = {'lat': '51.2', 'lon': '-1.3', 'start_time': '202001011200', 'minutes': '30'}
+
+
+def get_gpx(query=QUERY, **headers) -> dict:
+    return make_gpx.handler({'httpMethod': 'GET', 'queryStringParameters': dict(query), 'headers': headers}, None)
+
+
+def test_etag_identifies_the_track():
+    etag = get_gpx()['headers']['ETag']
+    assert etag.startswith('"') and etag.endswith('"')
+    assert get_gpx()['headers']['ETag'] == etag
+    # Equivalent query strings are normalised to the same parameters
+    assert get_gpx(dict(QUERY, lat='51.20', hours='0'))['headers']['ETag'] == etag
+    assert get_gpx(dict(QUERY, lat='51.3'))['headers']['ETag'] != etag
+    # A compressed body is another representation
+    assert get_gpx(**{'accept-encoding': 'gzip'})['headers']['ETag'] != etag
+
+
+def test_matching_if_none_match_is_not_modified():
+    response = get_gpx()
+    etag = response['headers']['ETag']
+    assert response['statusCode'] == 200
+    assert response['headers']['Cache-Control'] == make_gpx.GPX_CACHE_CONTROL
+    for if_none_match in (etag, 'W/' + etag, '"other", ' + etag, '*'):
+        not_modified = get_gpx(**{'if-none-match': if_none_match})
+        assert not_modified['statusCode'] == 304
+        assert not_modified['body'] == ''
+        assert not_modified['headers']['ETag'] == etag
+    assert get_gpx(**{'if-none-match': '"other"'})['statusCode'] == 200
+
+
+def test_only_successful_responses_get_an_etag():
+    response = get_gpx(dict(QUERY, lat='91'))
+    assert response['statusCode'] == 400
+    assert 'ETag' not in response['headers']
+
+
+def test_etag_matching():
+    assert response_cache.etag_matches('"a", W/"b"', '"b"')
+    assert not response_cache.etag_matches('"a"', '"b"')
+    assert not response_cache.etag_matches(None, '"b"')
+
+
+def test_memory_cache_evicts_the_least_recently_used():
+    response = {'statusCode': 200, 'body': 'x' * 100, 'headers': {}}
+    cache = response_cache.MemoryResponseCache(250)
+    cache.put('"a"', response)
+    cache.put('"b"', response)
+    assert cache.get('"a"') is response
+    cache.put('"c"', response)
+    assert cache.get('"b"') is None
+    assert cache.get('"a"') is response and cache.get('"c"') is response
+
+
+def test_disk_cache_keeps_responses_as_files(tmp_path):
+    response = {'statusCode': 200, 'body': 'x' * 100, 'headers': {'ETag': '"a"'}}
+    cache = response_cache.DiskResponseCache(str(tmp_path), 1000)
+    cache.put('"a"', response)
+    assert response_cache.DiskResponseCache(str(tmp_path), 1000).get('"a"') == response
+    assert cache.get('"b"') is None
+
+
+def test_disk_cache_counts_a_response_put_twice_once(tmp_path):
+    response = {'statusCode': 200, 'body': 'x' * 100, 'headers': {'ETag': '"a"'}}
+    cache = response_cache.DiskResponseCache(str(tmp_path), 1000)
+    cache.put('"a"', response)
+    size_bytes = cache.size_bytes
+    cache.put('"a"', response)
+    assert cache.size_bytes == size_bytes == (tmp_path / 'a.json').stat().st_size
+
+
+def test_shift_etag_is_the_hash_of_the_uploaded_bytes():
+    response = shift_purple_pen.handler(make_request(shift_fields('31')), None)
+    etag = response['headers']['ETag']
+    assert response['statusCode'] == 200
+    assert shift_purple_pen.handler(make_request(shift_fields('31')), None)['headers']['ETag'] == etag
+    assert shift_purple_pen.handler(make_request(shift_fields('31', shifted=make_ppen(1.5, -2.4))),
+                                    None)['headers']['ETag'] != etag
+    assert shift_purple_pen.handler(make_request(shift_fields('31', transform='translate')),
+                                    None)['headers']['ETag'] != etag
+
+
+def test_shift_with_a_file_which_is_not_utf8_is_rejected():
+    event = make_request(dict(shift_fields('31'), shiftedfile=make_ppen().encode('utf16')))
+    response = shift_purple_pen.handler(event, None)
+    assert response['statusCode'] == 400
+    assert json.loads(response['body'])['message'].startswith("shiftedfile is not UTF-8 text")
+
+
+@pytest.mark.parametrize('encoding', [None, 'gzip', 'br'])
+def test_each_encoding_has_its_own_etag_and_304(encoding):
+    if encoding == 'br':
+        pytest.importorskip('brotli')
+    headers = {'accept-encoding': encoding} if encoding else {}
+    response = get_gpx(**headers)
+    assert response['statusCode'] == 200
+    assert response['headers'].get('Content-Encoding') == encoding
+    etag = response['headers']['ETag']
+    # A second request is answered from the cache with the same ETag
+    assert get_gpx(**headers)['headers']['ETag'] == etag
+
+    not_modified = get_gpx(**headers, **{'if-none-match': etag})
+    assert not_modified['statusCode'] == 304
+    assert not_modified['headers'] == {'ETag': etag, 'Cache-Control': make_gpx.GPX_CACHE_CONTROL,
+                                       'Vary': 'Accept-Encoding'}
+    # The ETag of another encoding is another representation, so it is sent in full
+    other = {'accept-encoding': 'gzip' if encoding is None else 'identity'}
+    assert get_gpx(**other, **{'if-none-match': etag})['statusCode'] == 200
+
+
+def test_if_none_match_is_ignored_for_other_methods():
+    etag = get_gpx()['headers']['ETag']
+    event = {'httpMethod': 'POST', 'queryStringParameters': dict(QUERY), 'headers': {'if-none-match': etag}}
+    assert make_gpx.handler(event, None)['statusCode'] == 200
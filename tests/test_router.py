@@ -0,0 +1,70 @@
+import ast
+import json
+import os
+import re
+
+import pytest
+
+import router
+
+QUERY = {'lat': '51.2', 'lon': '-1.3', 'start_time': '202001011200', 'minutes': '30'}
+
+
+def request(method: str, path: str, resource: str = None, query=None) -> dict:
+    event = {'httpMethod': method, 'path': path, 'queryStringParameters': query, 'headers': {}}
+    if resource is not None:
+        event['resource'] = resource
+    return router.handler(event, None)
+
+
+@pytest.mark.parametrize('path', ['/', '/gpxx', '/gpx/batch/extra'])
+def test_unknown_path_is_not_found(path):
+    response = request('GET', path)
+    assert response['statusCode'] == 404
+    assert json.loads(response['body'])['message'] == f"No such resource {path}"
+
+
+def test_wrong_method_is_not_allowed():
+    response = request('POST', '/gpx')
+    assert response['statusCode'] == 405
+    assert response['headers']['Allow'] == "GET, HEAD"
+    assert json.loads(response['body'])['message'] == "Method POST is not allowed, use GET or HEAD"
+
+    response = request('GET', '/shiftpurplepen/batch')
+    assert response['statusCode'] == 405
+    assert response['headers']['Allow'] == "POST"
+
+
+def test_routes_by_resource_then_path():
+    assert request('GET', '/prod/gpx', resource='/gpx', query=QUERY)['statusCode'] == 200
+    assert request('GET', '/gpx/', query=QUERY)['statusCode'] == 200
+
+
+def test_head_is_routed_as_get():
+    response = request('HEAD', '/gpx', query=QUERY)
+    assert response['statusCode'] == 200
+    assert response['headers']['Content-Type'] == 'application/gpx+xml'
+
+
+def test_every_route_has_a_handler():
+    for methods in router.ROUTES.values():
+        for target in methods.values():
+            assert callable(router.get_handler(target))
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_lambda_package_has_every_module_the_routes_import():
+    with open(os.path.join(ROOT, 'infrastructure', 'lambda.tf')) as f:
+        listed = re.search(r'lambda_modules = \[(.*?)\]', f.read(), re.DOTALL).group(1)
+    packaged = set(re.findall(r'"(\w+)\.py"', listed))
+    assert {'router'} | {module for methods in router.ROUTES.values() for module, _ in methods.values()} <= packaged
+    for module in sorted(packaged):
+        with open(os.path.join(ROOT, module + '.py')) as f:
+            tree = ast.parse(f.read())
+        imported = {alias.name for node in ast.walk(tree) if isinstance(node, ast.Import) for alias in node.names}
+        imported |= {node.module for node in ast.walk(tree) if isinstance(node, ast.ImportFrom) and node.module}
+        # Modules of the repository, rather than the standard library or optional dependencies
+        local = {name for name in imported if os.path.exists(os.path.join(ROOT, name + '.py'))}
+        assert local <= packaged, f"{module} imports {local - packaged}, which is not packaged"
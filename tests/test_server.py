@@ -0,0 +1,94 @@
+import http.client
+import threading
+
+import pytest
+
+import response_cache
+import server
+
+QUERY = '/gpx?lat=51.2&lon=-1.3&start_time=202001011200&minutes=30'
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    # A cached response is sent whole, so without the cache every body is generated as it is sent
+    monkeypatch.setattr(response_cache, '_cache', None)
+    httpd = server.PooledHTTPServer(('127.0.0.1', 0), server.RequestHandler, 2)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    connection = http.client.HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=10)
+    try:
+        yield connection
+    finally:
+        connection.close()
+        httpd.shutdown()
+        httpd.server_close()
+        thread.join()
+
+
+def test_event_takes_the_last_of_repeated_values_and_base64_encodes_binary_bodies():
+    event = server.make_event('POST', '/gpx?shape=a&shape=b&empty=', {'X-Drongo-Metrics': '1'}, b'\xff\x00')
+    assert event['path'] == '/gpx'
+    assert event['queryStringParameters'] == {'shape': 'b', 'empty': ''}
+    assert event['headers'] == {'x-drongo-metrics': '1'}
+    assert event['body'] == '/wA=' and event['isBase64Encoded']
+
+
+def test_generated_body_is_chunked_and_the_connection_kept_alive(connection):
+    connection.request('GET', QUERY)
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader('Transfer-Encoding') == 'chunked'
+    assert response.getheader('Content-Length') is None
+    body = response.read()
+    assert body.strip().startswith(b'<?xml') and body.strip().endswith(b'</gpx>')
+    sock = connection.sock
+
+    connection.request('GET', '/nowhere')
+    response = connection.getresponse()
+    assert response.status == 404
+    response.read()
+    assert connection.sock is sock
+
+
+def test_head_has_the_length_of_the_get_without_a_body(connection):
+    connection.request('GET', QUERY, headers={'Accept-Encoding': 'identity'})
+    body = connection.getresponse().read()
+    connection.request('HEAD', QUERY)
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader('Content-Length') == str(len(body))
+    assert response.read() == b''
+
+
+def test_chunked_request_body_needs_a_length(connection):
+    # The server answers without reading the body, so only the headers are sent
+    connection.putrequest('POST', '/shiftpurplepen')
+    connection.putheader('Transfer-Encoding', 'chunked')
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 411
+    assert response.getheader('Connection') == 'close'
+    assert b'Content-Length' in response.read()
+
+
+def test_request_body_over_the_limit_is_rejected_unread(connection, monkeypatch):
+    monkeypatch.setattr(server, 'MAX_REQUEST_BYTES', 10)
+    connection.putrequest('POST', '/shiftpurplepen')
+    connection.putheader('Content-Length', '11')
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 413
+    assert response.getheader('Connection') == 'close'
+    assert b'at most 10 bytes' in response.read()
+
+
+@pytest.mark.parametrize('length', ['ten', '-5', '+5', '1.5'])
+def test_request_body_length_which_is_not_a_whole_number_is_rejected(connection, length):
+    connection.putrequest('POST', '/shiftpurplepen')
+    connection.putheader('Content-Length', length)
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 400
+    assert response.getheader('Connection') == 'close'
+    assert b'Content-Length' in response.read()
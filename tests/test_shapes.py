@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+import make_gpx
+import shapes
+
+SQUARE = [[51.0, -1.0], [51.001, -1.0], [51.001, -0.999], [51.0, -0.999], [51.0, -1.0]]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """An empty shape store, with no shapes loaded from it yet"""
+    monkeypatch.setattr(shapes, 'SHAPES_DIR', str(tmp_path))
+    monkeypatch.setattr(shapes, '_available_shapes', None)
+    monkeypatch.setattr(make_gpx, '_shape_geometries', {})
+    return tmp_path
+
+
+def test_saved_shape_loads_back_exactly(store):
+    shapes.save_lat_lons('square', SQUARE)
+    assert (store / 'square.f64').stat().st_size == len(SQUARE) * 2 * 8
+    assert shapes.available_shapes() == frozenset(['square'])
+    assert shapes.load_lat_lons('square') == SQUARE
+
+
+def test_shapes_are_only_loaded_when_first_requested(store, monkeypatch):
+    shapes.save_lat_lons('square', SQUARE)
+    shapes.save_lat_lons('other', SQUARE[::-1])
+    loaded = []
+    load_lat_lons = shapes.load_lat_lons
+    monkeypatch.setattr(shapes, 'load_lat_lons', lambda name: loaded.append(name) or load_lat_lons(name))
+    assert make_gpx.get_shape_geometry('square') is make_gpx.get_shape_geometry('square')
+    assert loaded == ['square']
+
+
+def test_unknown_shape_cannot_be_loaded(store):
+    with pytest.raises(KeyError):
+        shapes.load_lat_lons('square')
+
+
+def test_unknown_shape_is_a_bad_request():
+    response = make_gpx.handler({'httpMethod': 'GET', 'queryStringParameters': {
+        'lat': '51.2', 'lon': '-1.3', 'start_time': '202001011200', 'minutes': '30', 'shape': 'dragon'}}, None)
+    assert response['statusCode'] == 400
+    assert json.loads(response['body'])['errors'] == ['shape must be one of drongo']
+
+
+def test_lat_lons_are_read_from_gpx_trackpoints():
+    gpx = ('<trkseg><trkpt lat="51.5" lon="-0.25"><time>t</time></trkpt>\n'
+           '<trkpt  lat="-33.9"\n lon="151.2"></trkpt></trkseg>')
+    assert shapes.lat_lons_from_gpx(gpx) == [[51.5, -0.25], [-33.9, 151.2]]
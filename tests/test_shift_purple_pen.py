@@ -0,0 +1,325 @@
+import base64
+import io
+import json
+import struct
+import zipfile
+
+import pytest
+
+import shift_purple_pen
+
+# Control code: location in the original file
+CONTROLS = {'31': (10.0, 20.0), '32': (-40.0, 5.0), '33': (25.0, -30.0), '34': (0.0, 60.0)}
+
+
+def make_ppen(x_shift: float = 0.0, y_shift: float = 0.0, controls=CONTROLS) -> str:
+    lines = ['<?xml version="1.0" encoding="utf-8"?>', '<course-scribe-event>']
+    for i, (code, (x, y)) in enumerate(controls.items()):
+        lines += [f'  <control id="{i + 1}" kind="normal">',
+                  f'    <code>{code}</code>',
+                  f'    <location x="{x + x_shift:.6f}" y="{y + y_shift:.6f}" />',
+                  '  </control>']
+    lines.append('</course-scribe-event>')
+    return '\n'.join(lines) + '\n'
+
+
+BOUNDARY = 'drongoboundary'
+
+
+def make_request(fields: dict, files=()) -> dict:
+    """A base64 encoded multipart form event with text or bytes ``fields`` and ``(filename, bytes)`` ``files``"""
+    body = b''
+    for name, value in fields.items():
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n').encode('utf8')
+        body += (value if isinstance(value, bytes) else value.encode('utf8')) + b'\r\n'
+    for filename, content in files:
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n').encode('utf8') + content + b'\r\n'
+    body += f'--{BOUNDARY}--\r\n'.encode('utf8')
+    return {'httpMethod': 'POST', 'headers': {'content-type': f'multipart/form-data; boundary={BOUNDARY}'},
+            'body': base64.b64encode(body).decode('ascii'), 'isBase64Encoded': True}
+
+
+def make_zip(files) -> bytes:
+    sink = io.BytesIO()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+    return sink.getvalue()
+
+
+def error_message(response: dict) -> str:
+    assert response['statusCode'] == 400
+    return json.loads(response['body'])['message']
+
+
+def shift_fields(controlcode: str, transform: str = None, shifted: str = None) -> dict:
+    fields = {'controlcode': controlcode, 'originalfile': make_ppen(),
+              'shiftedfile': shifted if shifted is not None else make_ppen(1.5, -2.5)}
+    if transform is not None:
+        fields['transform'] = transform
+    return fields
+
+
+def test_control_codes_are_trimmed_and_deduplicated_in_order():
+    assert shift_purple_pen.parse_control_codes(" 33, 31,,33 ,32,31") == ['33', '31', '32']
+
+
+@pytest.mark.parametrize('controlcode,transform', [('31,31,31', 'affine'), ('31, 31', 'similarity')])
+def test_repeated_controls_do_not_count_towards_the_minimum(controlcode, transform):
+    transform_fit, errors = shift_purple_pen.parse_shift_fields(shift_fields(controlcode, transform))
+    assert transform_fit is None
+    assert errors == [f"Fitting a {transform} transform needs at least "
+                      f"{shift_purple_pen.MIN_CONTROLS[transform]} control codes"]
+
+
+@pytest.mark.parametrize('transform', ['translate', 'similarity', 'affine'])
+def test_fitted_transform_moves_the_controls(transform):
+    fitted, errors = shift_purple_pen.parse_shift_fields(shift_fields('31,32,33', transform))
+    assert errors == []
+    x, y = fitted.apply(*CONTROLS['34'])
+    assert x == pytest.approx(1.5) and y == pytest.approx(57.5)
+
+
+def test_misfits_name_each_control_once():
+    shifted = dict(CONTROLS, **{'33': (CONTROLS['33'][0] + 5, CONTROLS['33'][1])})
+    original = shift_purple_pen.PurplePenDocument(make_ppen())
+    with pytest.raises(shift_purple_pen.InconsistentShiftException) as e:
+        shift_purple_pen.fit_control_transform(original, shift_purple_pen.PurplePenDocument(make_ppen(
+            controls=shifted)), ['31', '31', '32', '33'])
+    # The repeated control is neither weighted twice in the fit nor reported twice
+    assert str(e.value).endswith("off by: 31 (-1.667, +0.000), 32 (-1.667, +0.000), 33 (+3.333, +0.000)")
+
+
+def test_batch_shifts_every_file():
+    more = make_zip([('b.ppen', make_ppen(1, 1)), ('notes.txt', 'x')])
+    event = make_request(shift_fields('31'), [('a.ppen', make_ppen().encode('utf8')), ('more.zip', more)])
+    response = shift_purple_pen.batch_handler(event, None)
+    assert response['statusCode'] == 200
+    with zipfile.ZipFile(io.BytesIO(base64.b64decode(response['body']))) as archive:
+        assert archive.namelist() == ['a.ppen', 'b.ppen']
+        assert archive.read('a.ppen').decode('utf8') == make_ppen(1.5, -2.5)
+
+
+def test_batch_rejects_a_file_which_is_not_utf8():
+    utf16 = make_ppen().encode('utf16')
+    event = make_request(shift_fields('31'), [('a.ppen', make_ppen().encode('utf8')),
+                                              ('courses.zip', make_zip([('wide.ppen', utf16)]))])
+    assert error_message(shift_purple_pen.batch_handler(event, None)).startswith("wide.ppen is not UTF-8 text")
+
+
+def test_batch_rejects_a_reference_file_which_is_not_utf8():
+    fields = dict(shift_fields('31'), originalfile=make_ppen().encode('utf16'))
+    event = make_request(fields, [('a.ppen', make_ppen().encode('utf8'))])
+    assert error_message(shift_purple_pen.batch_handler(event, None)).startswith("originalfile is not UTF-8 text")
+
+
+def test_batch_limits_the_expanded_size_of_zip_uploads():
+    too_big = ' ' * (shift_purple_pen.MAX_BATCH_BYTES // 2 + 1)
+    event = make_request(shift_fields('31'), [('courses.zip', make_zip([('a.ppen', too_big), ('b.ppen', too_big)]))])
+    assert error_message(shift_purple_pen.batch_handler(event, None)).startswith("At most 12MB")
+
+
+def test_batch_makes_repeated_names_unique():
+    event = make_request(shift_fields('31'), [('a.ppen', make_ppen().encode('utf8'))] * 2)
+    response = shift_purple_pen.batch_handler(event, None)
+    with zipfile.ZipFile(io.BytesIO(base64.b64decode(response['body']))) as archive:
+        assert archive.namelist() == ['a.ppen', '002-a.ppen']
+
+
+@pytest.mark.parametrize('handler', [shift_purple_pen.handler, shift_purple_pen.batch_handler])
+@pytest.mark.parametrize('headers,body,message', [
+    ({}, 'x', "Request must have a multipart/form-data Content-Type"),
+    ({'Content-Type': 'text/plain'}, 'x', "Request must be a multipart/form-data upload, not text/plain"),
+    ({'content-type': 'multipart/form-data'}, 'x', "The multipart/form-data Content-Type must have a boundary"),
+    ({'content-type': f'multipart/form-data; boundary={BOUNDARY}'},
+     f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="controlcode"\r\n31',
+     "Could not read the multipart form: content does not contain CR-LF-CR-LF"),
+])
+def test_upload_which_is_not_a_multipart_form_is_rejected(handler, headers, body, message):
+    response = handler({'httpMethod': 'POST', 'headers': headers, 'body': body}, None)
+    assert error_message(response) == message
+
+
+def test_field_name_which_is_not_utf8_matches_no_field():
+    body = f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="'.encode('utf8') + b'\xff"\r\n\r\n31\r\n' + \
+        f'--{BOUNDARY}--\r\n'.encode('utf8')
+    event = dict(make_request({}), body=base64.b64encode(body).decode('ascii'))
+    assert error_message(shift_purple_pen.handler(event, None)).startswith("Missing required parameter controlcode")
+
+
+def corrupt_deflate(archive: bytearray):
+    # Just after the local file header of the first member, which is 30 bytes and its name
+    archive[36:46] = b'\xff' * 10
+
+
+def unsupported_method(archive: bytearray):
+    struct.pack_into('<H', archive, 8, 99)
+    struct.pack_into('<H', archive, archive.find(b'PK\x01\x02') + 10, 99)
+
+
+@pytest.mark.parametrize('corrupt', [corrupt_deflate, unsupported_method])
+def test_batch_rejects_a_zip_member_which_cannot_be_extracted(corrupt):
+    archive = bytearray(make_zip([('a.ppen', make_ppen())]))
+    corrupt(archive)
+    event = make_request(shift_fields('31'), [('courses.zip', bytes(archive))])
+    assert error_message(shift_purple_pen.batch_handler(event, None)).startswith(
+        "Could not extract a.ppen from courses.zip: ")
+
+
+TRANSLATE = shift_purple_pen.Transform.translation(1.5, -2.0)
+# A quarter turn anticlockwise about the origin: (x, y) -> (-y, x)
+ROTATE = shift_purple_pen.Transform(0.0, -1.0, 0.0, 1.0, 0.0, 0.0)
+
+
+@pytest.mark.parametrize('transform,ppen,expected', [
+    (TRANSLATE, '<location x="1" y="2" />', '<location x="2.500000" y="0.000000" />'),
+    (ROTATE, '<location x="1" y="2" />', '<location x="-2.000000" y="1.000000" />'),
+    # Attributes in another order, spacing or quoting are read by name and keep their layout
+    (TRANSLATE, '<location y="2" x="1"/>', '<location y="0.000000" x="2.500000"/>'),
+    (TRANSLATE, "<location x='1' y = '2'></location>", "<location x='2.500000' y = '0.000000'></location>"),
+    (ROTATE, '<location\n  y="2"\n  x="1" />', '<location\n  y="1.000000"\n  x="-2.000000" />'),
+    # A control number's offset from its circle is unchanged by a translation, and turns with a rotation
+    (TRANSLATE, '<number-location x="1" y="2" />', '<number-location x="1" y="2" />'),
+    (ROTATE, "<number-location y='2' x='1' />", "<number-location y='1.000000' x='-2.000000' />"),
+])
+def test_transform_ppen_rewrites_each_kind_of_coordinate(transform, ppen, expected):
+    assert shift_purple_pen.transform_ppen(ppen, transform) == expected
+
+
+@pytest.mark.parametrize('name', ['print-area', 'part-print-area'])
+def test_transform_ppen_moves_print_areas(name):
+    ppen = f'<{name} automatic="false" left="0" top="10" right="20" bottom="0" page-landscape="true" />'
+    assert shift_purple_pen.transform_ppen(ppen, TRANSLATE) == (
+        f'<{name} automatic="false" left="1.500000" top="8.000000" right="21.500000" bottom="-2.000000" '
+        f'page-landscape="true" />')
+    # A rotated rectangle is replaced by the bounding box of its corners
+    assert shift_purple_pen.transform_ppen(ppen, ROTATE) == (
+        f'<{name} automatic="false" left="-10.000000" top="20.000000" right="0.000000" bottom="0.000000" '
+        f'page-landscape="true" />')
+
+
+@pytest.mark.parametrize('ppen', [
+    '<location x="1" />',
+    '<number-location y="2" />',
+    '<print-area left="0" top="10" right="20" />',
+    '<location-name>x="1" y="2"</location-name>',
+])
+def test_transform_ppen_leaves_incomplete_elements_untouched(ppen):
+    assert shift_purple_pen.transform_ppen(ppen, ROTATE) == ppen
+
+
+def test_transform_ppen_leaves_unreadable_values_it_does_not_move_untouched():
+    transform = shift_purple_pen.Transform.translation(1.5, 0.0)
+    ppen = '<location x="1" y="north" /><print-area left="0" top="?" right="20" bottom="" />'
+    assert shift_purple_pen.transform_ppen(ppen, transform) == (
+        '<location x="2.500000" y="north" /><print-area left="1.500000" top="?" right="21.500000" bottom="" />')
+
+
+@pytest.mark.parametrize('ppen', ['<location x="1" y="north" />',
+                                  "<print-area left='0' top='?' right='1' bottom='0'/>"])
+def test_transform_ppen_rejects_unreadable_values_it_would_move(ppen):
+    with pytest.raises(shift_purple_pen.InvalidCoordinateException):
+        shift_purple_pen.transform_ppen(ppen, ROTATE)
+
+
+def test_transform_ppen_keeps_comments_as_written():
+    ppen = ('<!-- <location x="1" y="2" /> moved from\n<print-area left="0" top="1" right="1" bottom="0" /> -->\n'
+            '<location x="1" y="2" /><!---->')
+    assert shift_purple_pen.transform_ppen(ppen, TRANSLATE) == (
+        '<!-- <location x="1" y="2" /> moved from\n<print-area left="0" top="1" right="1" bottom="0" /> -->\n'
+        '<location x="2.500000" y="0.000000" /><!---->')
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 1000])
+def test_transformed_ppen_is_the_same_whatever_the_batch_size(batch_size):
+    ppen = make_ppen() + '<!-- <location x="1" y="2" /> -->\n<print-area left="0" top="1" right="1" bottom="0" />\n'
+    chunks = list(shift_purple_pen.iter_transformed_ppen(ppen, TRANSLATE, batch_size))
+    assert ''.join(chunks) == shift_purple_pen.transform_ppen(ppen, TRANSLATE)
+    # One chunk for each batch of the 6 matches, and the text after the last
+    assert len(chunks) == -(-6 // batch_size) + 1
+
+
+def test_unreadable_coordinate_after_the_first_chunk_is_a_bad_request(monkeypatch):
+    monkeypatch.setattr(shift_purple_pen, 'TRANSFORM_BATCH_SIZE', 1)
+    monkeypatch.setattr(shift_purple_pen.response_cache, '_cache', None)
+    fields = shift_fields('31')
+    fields['originalfile'] += '<location x="1" y="north" />\n'
+    message = error_message(shift_purple_pen.handler(make_request(fields), None))
+    assert message.startswith("Could not read a coordinate in the file")
+
+
+def test_shifted_file_is_streamed_when_the_event_asks(monkeypatch):
+    monkeypatch.setattr(shift_purple_pen, 'TRANSFORM_BATCH_SIZE', 1)
+    monkeypatch.setattr(shift_purple_pen.response_cache, '_cache', None)
+    event = dict(make_request(shift_fields('31')), streamBody=True)
+    response = shift_purple_pen.handler(event, None)
+    assert response['statusCode'] == 200
+    assert b''.join(response['bodyChunks']).decode('utf8') == make_ppen(1.5, -2.5)
+
+
+@pytest.mark.parametrize('controlcode', ['31', '31,32'])
+def test_truncated_reference_file_is_a_bad_request_naming_it(monkeypatch, controlcode):
+    monkeypatch.setattr(shift_purple_pen.response_cache, '_cache', None)
+    fields = shift_fields(controlcode)
+    # Cut off inside the first control, so parsing runs out of text before it finds one
+    fields['originalfile'] = fields['originalfile'][:fields['originalfile'].index('<code>')]
+    message = error_message(shift_purple_pen.handler(make_request(fields), None))
+    assert message.startswith("originalfile is not a valid PurplePen file: ")
+
+
+@pytest.mark.parametrize('controlcode', ['31', '31,32'])
+@pytest.mark.parametrize('location,problem', [
+    ('<location x="abc" y="20.000000" />', "an unreadable x coordinate 'abc'"),
+    ('<location y="20.000000" />', "no x coordinate"),
+    ('', "no location"),
+])
+def test_unreadable_reference_control_location_is_a_bad_request(monkeypatch, controlcode, location, problem):
+    monkeypatch.setattr(shift_purple_pen.response_cache, '_cache', None)
+    fields = shift_fields(controlcode)
+    fields['shiftedfile'] = fields['shiftedfile'].replace('<location x="11.500000" y="17.500000" />', location)
+    message = error_message(shift_purple_pen.handler(make_request(fields), None))
+    assert message == f"shiftedfile: Control 31 has {problem}"
+
+
+def test_unreadable_location_of_a_control_not_used_is_ignored():
+    ppen = make_ppen().replace('<location x="0.000000" y="60.000000" />', '<location x="abc" y="60.000000" />')
+    transform, errors = shift_purple_pen.parse_shift_fields(dict(shift_fields('31,32'), originalfile=ppen))
+    assert errors == [] and transform.apply(0.0, 0.0) == pytest.approx((1.5, -2.5))
+
+
+def test_control_location_parsing_stops_once_the_control_is_found(monkeypatch):
+    monkeypatch.setattr(shift_purple_pen, 'PARSE_CHUNK_SIZE', 64)
+    ppen = make_ppen()
+    # Nothing after the control is parsed, so text which is not XML there does not matter
+    broken = ppen[:ppen.index('<code>32</code>')] + '<<not xml'
+    assert shift_purple_pen.get_control_location(broken, '31') == CONTROLS['31']
+    assert shift_purple_pen.get_control_location(ppen, '34') == CONTROLS['34']
+
+
+def test_control_location_is_only_read_from_top_level_controls_with_one_code():
+    ppen = ('<course-scribe-event>'
+            '<control id="1"><code>31</code><code>32</code><location x="1" y="1" /></control>'
+            '<course><control id="2"><code>31</code><location x="2" y="2" /></control></course>'
+            '<control id="3"><code>31</code><location x="3" y="3" /></control>'
+            '</course-scribe-event>')
+    assert shift_purple_pen.get_control_location(ppen, '31') == (3.0, 3.0)
+    with pytest.raises(shift_purple_pen.ControlNotFoundException):
+        shift_purple_pen.get_control_location(ppen, '32')
+
+
+def test_zero_shift_keeps_each_column_exactly_as_written():
+    ppen = ('<location x="1.5" y="-2.25000000001" /><location x="1e3" y="007" />'
+            '<print-area left="0.1" top="20" right="30.000" bottom="-0" />')
+    assert shift_purple_pen.shift_ppen(ppen, 0.0, 0.0) == ppen
+    # Only the column which moves is rewritten
+    assert shift_purple_pen.shift_ppen(ppen, 0.0, 1.0) == (
+        '<location x="1.5" y="-1.250000" /><location x="1e3" y="8.000000" />'
+        '<print-area left="0.1" top="21.000000" right="30.000" bottom="1.000000" />')
+
+
+def test_columns_are_shifted_to_six_decimal_places():
+    xs, ys = shift_purple_pen.transform_columns(['1', '-0.0000004', '2.5e1'], ['0', '0', '0'],
+                                                shift_purple_pen.Transform.translation(0.1, 0.0))
+    assert xs == ['1.100000', '0.100000', '25.100000'] and ys == ['0', '0', '0']
+    assert shift_purple_pen.shift_values(['1'], 0) == ['1']
@@ -0,0 +1,105 @@
+import csv
+import datetime
+import io
+import json
+import struct
+
+import pytest
+
+import make_gpx
+import track_formats
+
+START_TIME = datetime.datetime(2020, 1, 1, 12, 0, 0)
+
+
+def make_track(output_format: str, lat: float = 51.2, lon: float = -1.3, start_time=START_TIME,
+               duration=datetime.timedelta(minutes=30)):
+    chunks = list(make_gpx.iter_track(10000, start_time, duration, lat, lon, output_format=output_format))
+    return b''.join(chunks) if make_gpx.OUTPUT_FORMATS[output_format][2] else ''.join(chunks)
+
+
+def read_fit(data: bytes):
+    """The header fields and the data messages of a FIT file, as ``(global number, {field: value})``"""
+    size, protocol, profile, data_size, signature, header_crc = struct.unpack_from('<BBHI4sH', data)
+    assert size == 14 and signature == b'.FIT'
+    assert header_crc == track_formats.fit_crc(data[:12])
+    assert len(data) == size + data_size + 2
+    assert struct.unpack_from('<H', data, len(data) - 2)[0] == track_formats.fit_crc(data[:-2])
+
+    formats = {0x00: 'B', 0x84: 'H', 0x85: 'i', 0x86: 'I', 0x8C: 'I'}
+    definitions = {}
+    messages = []
+    position = size
+    while position < size + data_size:
+        record_header = data[position]
+        position += 1
+        if record_header & 0x40:
+            _, _, global_number, num_fields = struct.unpack_from('<BBHB', data, position)
+            position += 5
+            fields = [struct.unpack_from('<BBB', data, position + 3 * i) for i in range(num_fields)]
+            position += 3 * num_fields
+            definitions[record_header & 0x0F] = (global_number, [number for number, _, _ in fields],
+                                                 struct.Struct('<' + ''.join(formats[t] for _, _, t in fields)))
+        else:
+            global_number, numbers, layout = definitions[record_header & 0x0F]
+            messages.append((global_number, dict(zip(numbers, layout.unpack_from(data, position)))))
+            position += layout.size
+    return protocol, profile, messages
+
+
+def test_fit_records_every_trackpoint():
+    _, _, messages = read_fit(make_track('fit'))
+    records = [fields for number, fields in messages if number == 20]
+    assert len(records) == 30 * 60
+    start = int((START_TIME - track_formats.FIT_EPOCH).total_seconds())
+    assert [r[253] for r in records] == list(range(start, start + 30 * 60))
+    assert abs(records[0][0] * 180 / 2 ** 31 - 51.2) < 0.01
+    assert abs(records[0][1] * 180 / 2 ** 31 + 1.3) < 0.01
+    distances = [r[5] for r in records]
+    assert distances == sorted(distances) and 900000 < distances[-1] < 1100000
+    session = next(fields for number, fields in messages if number == 18)
+    assert session[7] == (30 * 60 - 1) * 1000 and session[9] == distances[-1]
+
+
+@pytest.mark.parametrize('lat,lon', [(0, 180), (0, -180), (90, 0), (-90, 0), (90, 180), (-90, -180)])
+def test_fit_positions_at_the_edges_of_the_world(lat, lon):
+    _, _, messages = read_fit(make_track('fit', lat, lon))
+    records = [fields for number, fields in messages if number == 20]
+    assert len(records) == 30 * 60
+    assert all(-2 ** 30 <= r[0] <= 2 ** 30 for r in records)
+    assert abs(records[0][0] * 180 / 2 ** 31 - lat) < 0.01
+    # 180 degrees east may be written as 180 degrees west
+    assert abs((records[0][1] * 180 / 2 ** 31 - lon + 180) % 360 - 180) < 0.01
+
+
+def test_fit_rejects_times_it_cannot_write():
+    query = {'lat': '51.2', 'lon': '-1.3', 'start_time': '198001011200', 'minutes': '30'}
+    assert make_gpx.parse_gpx_parameters(query)[1] == []
+    _, errors = make_gpx.parse_gpx_parameters(dict(query, format='fit'))
+    assert errors == ["FIT activities must be between 1989-12-31 and 2126-02-06: change start_time or the format"]
+    _, errors = make_gpx.parse_gpx_parameters(dict(query, format='fit', start_time='212602060600'))
+    assert len(errors) == 1
+    assert make_gpx.parse_gpx_parameters(dict(query, format='fit', start_time='198912310000'))[1] == []
+
+
+def test_geojson_has_a_time_per_coordinate():
+    feature = json.loads(make_track('geojson'))
+    coordinates = feature['geometry']['coordinates']
+    times = feature['properties']['coordTimes']
+    assert feature['geometry']['type'] == 'LineString'
+    assert len(coordinates) == len(times) == 30 * 60
+    assert abs(coordinates[0][0] + 1.3) < 0.01 and abs(coordinates[0][1] - 51.2) < 0.01
+    assert times[0] == '2020-01-01T12:00:00Z' and times[-1] == '2020-01-01T12:29:59Z'
+
+
+def test_csv_has_a_row_per_trackpoint():
+    rows = list(csv.DictReader(io.StringIO(make_track('csv'))))
+    assert len(rows) == 30 * 60
+    assert rows[0]['time'] == '2020-01-01T12:00:00Z' and rows[-1]['time'] == '2020-01-01T12:29:59Z'
+    assert abs(float(rows[0]['lat']) - 51.2) < 0.01 and abs(float(rows[0]['lon']) + 1.3) < 0.01
+
+
+def test_formats_have_the_same_coordinates():
+    feature = json.loads(make_track('geojson'))
+    rows = list(csv.DictReader(io.StringIO(make_track('csv'))))
+    assert [[float(row['lon']), float(row['lat'])] for row in rows] == feature['geometry']['coordinates']
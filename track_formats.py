@@ -0,0 +1,156 @@
+import math
+import struct
+import datetime
+
+EARTH_CIRCUM_M = 40000 * 1000
+
+
+def iter_csv(lat_lons, timestamps):
+    """Generate a flat CSV of the track as string chunks, one row per trackpoint"""
+    yield "time,lat,lon\n"
+    for ts, lat_lon in zip(timestamps, lat_lons):
+        yield "{0},{1:.7f},{2:.7f}\n".format(ts, lat_lon[0], lat_lon[1])
+
+
+def iter_geojson(lat_lons, timestamps):
+    """
+    Generate a GeoJSON Feature with a LineString geometry as string chunks. The time of each coordinate is in the
+    parallel ``coordTimes`` property, as used by tools converting GPX to GeoJSON.
+    """
+    yield '{"type":"Feature","geometry":{"type":"LineString","coordinates":['
+    separator = ''
+    for lat_lon in lat_lons:
+        yield '{0}[{1:.7f},{2:.7f}]'.format(separator, lat_lon[1], lat_lon[0])
+        separator = ','
+    yield ']},"properties":{"coordTimes":['
+    separator = ''
+    for ts in timestamps:
+        yield '{0}"{1}"'.format(separator, ts)
+        separator = ','
+    yield ']}}'
+
+
+# FIT activity files, see the FIT protocol and profile in the Garmin FIT SDK
+FIT_EPOCH = datetime.datetime(1989, 12, 31)
+# Timestamps are unsigned 32 bit seconds since FIT_EPOCH, so only these times can be written
+FIT_LATEST = FIT_EPOCH + datetime.timedelta(seconds=2 ** 32 - 1)
+FIT_PROFILE_VERSION = 2093
+FIT_PROTOCOL_VERSION = 0x10
+
+FIT_UINT8 = 0x00  # enums are sent with the same base type size
+FIT_UINT16 = 0x84
+FIT_SINT32 = 0x85
+FIT_UINT32 = 0x86
+FIT_UINT32Z = 0x8C
+
+# (local message type, global message number, [(field number, base type)])
+FIT_FILE_ID = (0, 0, [(0, FIT_UINT8), (1, FIT_UINT16), (2, FIT_UINT16), (3, FIT_UINT32Z), (4, FIT_UINT32)])
+FIT_EVENT = (1, 21, [(253, FIT_UINT32), (0, FIT_UINT8), (1, FIT_UINT8)])
+FIT_RECORD = (2, 20, [(253, FIT_UINT32), (0, FIT_SINT32), (1, FIT_SINT32), (5, FIT_UINT32)])
+FIT_LAP = (3, 19, [(253, FIT_UINT32), (2, FIT_UINT32), (7, FIT_UINT32), (8, FIT_UINT32), (9, FIT_UINT32),
+                   (0, FIT_UINT8), (1, FIT_UINT8)])
+FIT_SESSION = (4, 18, [(253, FIT_UINT32), (2, FIT_UINT32), (7, FIT_UINT32), (8, FIT_UINT32), (9, FIT_UINT32),
+                       (5, FIT_UINT8), (0, FIT_UINT8), (1, FIT_UINT8), (25, FIT_UINT16), (26, FIT_UINT16)])
+FIT_ACTIVITY = (5, 34, [(253, FIT_UINT32), (0, FIT_UINT32), (1, FIT_UINT16), (2, FIT_UINT8), (3, FIT_UINT8),
+                        (4, FIT_UINT8)])
+
+_FIT_FORMATS = {FIT_UINT8: 'B', FIT_UINT16: 'H', FIT_SINT32: 'i', FIT_UINT32: 'I', FIT_UINT32Z: 'I'}
+_FIT_SIZES = {FIT_UINT8: 1, FIT_UINT16: 2, FIT_SINT32: 4, FIT_UINT32: 4, FIT_UINT32Z: 4}
+
+
+def _fit_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_FIT_CRC_TABLE = _fit_crc_table()
+
+
+def fit_crc(data: bytes, crc: int = 0) -> int:
+    """The FIT file CRC, which is CRC-16/ARC computed a byte at a time"""
+    table = _FIT_CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def _fit_definition(message) -> bytes:
+    local_type, global_number, fields = message
+    return struct.pack('<BBBHB', 0x40 | local_type, 0, 0, global_number, len(fields)) + b''.join(
+        struct.pack('<BBB', number, _FIT_SIZES[base_type], base_type) for number, base_type in fields)
+
+
+def _fit_data_struct(message) -> struct.Struct:
+    return struct.Struct('<B' + ''.join(_FIT_FORMATS[base_type] for _, base_type in message[2]))
+
+
+def _fit_timestamp(d: datetime.datetime) -> int:
+    return int((d.replace(microsecond=0, tzinfo=None) - FIT_EPOCH).total_seconds())
+
+
+def _semicircles(degrees: float) -> int:
+    return int(round(degrees * 2 ** 31 / 180))
+
+
+def _lat_semicircles(lat: float) -> int:
+    # A track anchored at a pole goes a little beyond it
+    return _semicircles(max(-90.0, min(90.0, lat)))
+
+
+def _lon_semicircles(lon: float) -> int:
+    # Wrapped into the sint32 range, where 180 degrees east is 180 degrees west, as is a track crossing the
+    # antimeridian or circling a pole
+    return (_semicircles(lon) + 2 ** 31) % 2 ** 32 - 2 ** 31
+
+
+def iter_fit(lat_lons, start_time: datetime.datetime, offsets):
+    """
+    Generate a FIT running activity file as bytes chunks: a file header, one record message per trackpoint with
+    the distance run so far, then the lap, session and activity summaries, and the file CRC. The activity must
+    be between ``FIT_EPOCH`` and ``FIT_LATEST``.
+    """
+    start = _fit_timestamp(start_time)
+    body = [_fit_definition(FIT_FILE_ID),
+            _fit_data_struct(FIT_FILE_ID).pack(FIT_FILE_ID[0], 4, 255, 0, 1, start),
+            _fit_definition(FIT_EVENT),
+            _fit_data_struct(FIT_EVENT).pack(FIT_EVENT[0], start, 0, 0),
+            _fit_definition(FIT_RECORD)]
+
+    record = _fit_data_struct(FIT_RECORD)
+    local_type = FIT_RECORD[0]
+    distance = 0.0
+    previous = None
+    for offset, lat_lon in zip(offsets, lat_lons):
+        lat, lon = lat_lon
+        if previous is not None:
+            # Same local flat-earth approximation as make_gpx uses to lay out the shape
+            dy = (lat - previous[0]) * EARTH_CIRCUM_M / 360
+            dx = (lon - previous[1]) * EARTH_CIRCUM_M * math.cos(0.5 * (lat + previous[0]) * math.pi / 180) / 360
+            distance += math.sqrt(dx * dx + dy * dy)
+        previous = lat_lon
+        body.append(record.pack(local_type, start + offset, _lat_semicircles(lat), _lon_semicircles(lon),
+                                int(round(distance * 100))))
+
+    end = start + offsets[-1]
+    elapsed_ms = offsets[-1] * 1000
+    distance_cm = int(round(distance * 100))
+    body += [_fit_data_struct(FIT_EVENT).pack(FIT_EVENT[0], end, 0, 4),
+             _fit_definition(FIT_LAP),
+             _fit_data_struct(FIT_LAP).pack(FIT_LAP[0], end, start, elapsed_ms, elapsed_ms, distance_cm, 9, 1),
+             _fit_definition(FIT_SESSION),
+             _fit_data_struct(FIT_SESSION).pack(FIT_SESSION[0], end, start, elapsed_ms, elapsed_ms, distance_cm,
+                                                1, 8, 1, 0, 1),
+             _fit_definition(FIT_ACTIVITY),
+             _fit_data_struct(FIT_ACTIVITY).pack(FIT_ACTIVITY[0], end, elapsed_ms, 1, 0, 26, 1)]
+    data = b''.join(body)
+
+    header = struct.pack('<BBHI4s', 14, FIT_PROTOCOL_VERSION, FIT_PROFILE_VERSION, len(data), b'.FIT')
+    header += struct.pack('<H', fit_crc(header))
+    yield header
+    yield data
+    yield struct.pack('<H', fit_crc(data, fit_crc(header)))